@@ -0,0 +1,193 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+from PIL import Image
+from assets import AssetManager, default_assets
+
+# File layout: magic, header length, JSON header, padding to PAGE_ALIGNMENT, then the raw RGBA pixels of every atlas page
+MAGIC = b"ISOBNDL1"
+FORMAT_VERSION = 1
+PAGE_ALIGNMENT = 16
+DEFAULT_BUNDLE_PATH = "assets.bundle"
+
+
+def file_digest(path):
+    """
+    SHA-256 of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_files(specs):
+    """
+    Every image file referenced by a set of asset specs.
+    """
+    files = set()
+    for path, frame_width, frame_height in specs.values():
+        files.update(path if isinstance(path, tuple) else (path,))
+    return sorted(files)
+
+
+def describe_sources(specs, previous=None):
+    """
+    Size, modification time and content hash of every source file.
+
+    :param previous: Descriptions from an earlier bake; files whose size and modification time
+        are unchanged reuse the stored hash instead of being read again
+    :return: Dictionary path -> [size, mtime, sha256]
+    """
+    previous = previous or {}
+    sources = {}
+    for path in source_files(specs):
+        stat = os.stat(path)
+        known = previous.get(path)
+        if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            sources[path] = known
+        else:
+            sources[path] = [stat.st_size, stat.st_mtime_ns, file_digest(path)]
+    return sources
+
+
+def _encode_specs(specs):
+    return {asset_id: [list(path) if isinstance(path, tuple) else path, frame_width, frame_height]
+            for asset_id, (path, frame_width, frame_height) in specs.items()}
+
+
+def read_header(bundle_path):
+    """
+    Read the JSON header of a bundle, or None if the file is missing or not a bundle of this version.
+    """
+    try:
+        with open(bundle_path, 'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                return None
+            (length,) = struct.unpack('<I', file.read(4))
+            header = json.loads(file.read(length))
+    except (OSError, ValueError, struct.error):
+        return None
+    if header.get('version') != FORMAT_VERSION:
+        return None
+    return header
+
+
+def bake_bundle(assets, bundle_path=DEFAULT_BUNDLE_PATH):
+    """
+    Decode and slice every registered asset once and write all frames into one bundle file.
+
+    :param assets: AssetManager whose registered assets are baked (it is left untouched)
+    :param bundle_path: File to write
+    :return: The bundle header
+    """
+    baker = AssetManager(assets.atlas_size, assets.padding)
+    baker.specs = dict(assets.specs)
+    for asset_id in baker.specs:
+        baker.load(asset_id)
+
+    pages = []
+    offset = 0
+    for page in baker.pages:
+        pages.append([offset, page.width, page.height])
+        offset += page.width * page.height * 4
+    header = {
+        'version': FORMAT_VERSION,
+        'specs': _encode_specs(baker.specs),
+        'sources': describe_sources(baker.specs),
+        'frames': baker.frames,
+        'pages': pages
+    }
+    encoded = json.dumps(header).encode('utf-8')
+    data_start = len(MAGIC) + 4 + len(encoded)
+    padding = -data_start % PAGE_ALIGNMENT
+
+    # Write next to the target and swap it in, so a running game never maps a half-written bundle
+    temp_path = bundle_path + ".tmp"
+    with open(temp_path, 'wb') as file:
+        file.write(MAGIC)
+        file.write(struct.pack('<I', len(encoded) + padding))
+        file.write(encoded)
+        file.write(b" " * padding)
+        for page in baker.pages:
+            file.write(page.tobytes())
+    os.replace(temp_path, bundle_path)
+    return header
+
+
+def bundle_is_current(assets, bundle_path=DEFAULT_BUNDLE_PATH, header=None):
+    """
+    Check that a bundle holds exactly the registered assets, baked from unchanged source files.
+    """
+    header = header or read_header(bundle_path)
+    if header is None or header['specs'] != _encode_specs(assets.specs):
+        return False
+    try:
+        sources = describe_sources(assets.specs, header['sources'])
+    except OSError:
+        return False
+    # Only the contents matter: a touched but unchanged file does not force a rebake
+    return {path: source[2] for path, source in sources.items()} == \
+        {path: source[2] for path, source in header['sources'].items()}
+
+
+def load_bundle(assets, bundle_path=DEFAULT_BUNDLE_PATH, header=None):
+    """
+    Memory-map a bundle and hand its atlas pages and frames to an asset manager, without decoding any image.
+    """
+    header = header or read_header(bundle_path)
+    if header is None:
+        raise ValueError(f"{bundle_path} is not an asset bundle")
+    with open(bundle_path, 'rb') as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    data_start = len(MAGIC) + 4 + struct.unpack_from('<I', mapped, len(MAGIC))[0]
+
+    pages = []
+    for offset, width, height in header['pages']:
+        start = data_start + offset
+        # Pages share the mapped memory; pixels are paged in only when a frame is cropped out
+        pages.append(Image.frombuffer('RGBA', (width, height), memoryview(mapped)[start:start + width * height * 4],
+                                      'raw', 'RGBA', 0, 1))
+    frames = {asset_id: [tuple(frame) for frame in asset_frames] for asset_id, asset_frames in header['frames'].items()}
+    assets.adopt(pages, frames, mapped)
+
+
+def ensure_bundle(assets, bundle_path=DEFAULT_BUNDLE_PATH):
+    """
+    Load the bundle into an asset manager, baking it first if it is missing or out of date.
+
+    :return: True if the bundle had to be rebuilt
+    """
+    header = read_header(bundle_path)
+    rebuilt = not bundle_is_current(assets, bundle_path, header)
+    if rebuilt:
+        header = bake_bundle(assets, bundle_path)
+    load_bundle(assets, bundle_path, header)
+    return rebuilt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bake every registered sprite and tile into one asset bundle.")
+    parser.add_argument('--output', default=DEFAULT_BUNDLE_PATH, help="Bundle file to write")
+    parser.add_argument('--force', action='store_true', help="Rebuild even if the bundle is up to date")
+    args = parser.parse_args()
+
+    assets = default_assets()
+    if not args.force and bundle_is_current(assets, args.output):
+        print(f"{args.output} is up to date")
+        return
+
+    start = time.perf_counter()
+    header = bake_bundle(assets, args.output)
+    frames = sum(len(asset_frames) for asset_frames in header['frames'].values())
+    print(f"Baked {len(header['specs'])} assets ({frames} frames, {len(header['pages'])} pages) "
+          f"into {args.output} in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
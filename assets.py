@@ -0,0 +1,298 @@
+import glob
+import json
+import os
+from PIL import Image
+
+# Isometric facings of the critter sprite strips
+FACINGS = ('NE', 'NW', 'SE', 'SW')
+
+# Directories searched for sprite sheets exported by utilities.save_terrain_images (map_generation
+# exports into textures, the utilities command line into textures/sliced)
+EXPORT_DIRECTORIES = ("textures", "textures/sliced")
+
+
+class AssetManager:
+    """
+    Load every sprite and texture once, pack it into shared atlas pages, and hand out shared images.
+
+    Assets are registered under an ID with the file they come from and, for sheets and strips,
+    their frame size. The first time an asset is used its file is decoded and its frames are
+    shelf-packed into large RGBA atlas pages; the source image is then dropped. PhotoImages are
+    created per (asset ID, frame) on first `acquire` and shared by every caller, with a reference
+    count so a handle is freed once the last user releases it.
+    """
+    def __init__(self, atlas_size=1024, padding=1, photo_factory=None):
+        """
+        :param atlas_size: Width and height of an atlas page in pixels
+        :param padding: Transparent pixels left between packed frames
+        :param photo_factory: Callable turning a PIL image into the handle given out by `acquire`,
+            defaults to ImageTk.PhotoImage (headless runs pass a stand-in that needs no display)
+        """
+        self.atlas_size = atlas_size
+        self.padding = padding
+        self.specs = {} # asset ID -> (path or tuple of paths, frame width, frame height); None sizes mean the whole image
+        self.frames = {} # asset ID -> list of (page, left, top, right, bottom) of every packed frame
+        self.pages = [] # Atlas pages (PIL RGBA images)
+        self.shelf = None # (page, x, y, height) of the shelf currently being filled
+        self.handles = {} # (asset ID, frame) -> [PhotoImage, reference count]
+        self.loads = 0 # Number of image files decoded
+        self.sources = [] # Buffers backing adopted pages
+        self.manifests = {} # Export prefix -> dictionary (row, col) -> asset ID, see register_manifest
+        self.manifest_paths = {} # Export prefix -> manifest file found by find_manifests, registered on first use
+        self.photo_factory = photo_factory
+
+    def __contains__(self, asset_id):
+        return asset_id in self.specs
+
+    def register(self, asset_id, path, frame_width=None, frame_height=None):
+        """
+        Register an image file under an ID. Nothing is loaded until the asset is used.
+
+        :param asset_id: Name the asset is requested by
+        :param path: Image file, or a list of image files holding one frame each
+        :param frame_width: Width of one frame for sheets and strips, sliced left to right then top to bottom
+        :param frame_height: Height of one frame
+        """
+        spec = (tuple(path) if isinstance(path, (list, tuple)) else path, frame_width, frame_height)
+        if self.specs.get(asset_id, spec) != spec:
+            raise ValueError(f"Asset {asset_id!r} is already registered as {self.specs[asset_id]}")
+        self.specs[asset_id] = spec
+
+    def register_directory(self, directory, pattern="*.png", prefix=""):
+        """
+        Register every matching image in a directory under its file name without extension.
+
+        :return: List of the registered asset IDs
+        """
+        asset_ids = []
+        for path in sorted(glob.glob(os.path.join(directory, pattern))):
+            asset_id = prefix + os.path.splitext(os.path.basename(path))[0]
+            self.register(asset_id, path)
+            asset_ids.append(asset_id)
+        return asset_ids
+
+    def register_manifest(self, manifest_path):
+        """
+        Register the tiles exported by utilities.save_terrain_images, one asset per distinct file.
+        The tile lookup is also kept in `manifests` under the export's prefix; a prefix that is already
+        registered (e.g. the same sheet exported to another directory) is not registered again.
+
+        Files are registered under their name without extension, or under their path without
+        extension when another asset already has that name.
+
+        :return: Dictionary (row, col) -> asset ID; duplicate tiles share the ID of their file
+        """
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+        if manifest['prefix'] in self.manifests:
+            return self.manifests[manifest['prefix']]
+        directory = os.path.dirname(manifest_path)
+        asset_ids = {} # file name -> asset ID
+        for file_name in manifest['files']:
+            path = os.path.join(directory, file_name)
+            asset_id = os.path.splitext(file_name)[0]
+            if self.specs.get(asset_id, (path, None, None)) != (path, None, None):
+                asset_id = os.path.splitext(path)[0]
+            self.register(asset_id, path)
+            asset_ids[file_name] = asset_id
+        tiles = {tuple(int(part) for part in key.split(',')): asset_ids[file_name]
+                 for key, file_name in manifest['tiles'].items()}
+        self.manifests[manifest['prefix']] = tiles
+        return tiles
+
+    def find_manifests(self, directory):
+        """
+        Note the manifests of the sprite sheets exported to a directory without registering their tiles,
+        so only the exports that are used end up loaded (and in the baked bundle). See `manifest`.
+        When a prefix is exported to several directories, the first one found is used.
+
+        :return: List of the export prefixes found
+        """
+        suffix = "_manifest.json"
+        prefixes = []
+        for manifest_path in sorted(glob.glob(os.path.join(directory, "*" + suffix))):
+            prefix = os.path.basename(manifest_path)[:-len(suffix)]
+            self.manifest_paths.setdefault(prefix, manifest_path)
+            prefixes.append(prefix)
+        return prefixes
+
+    def manifest(self, prefix):
+        """
+        Get the tile lookup of an exported sprite sheet, registering its tiles on first use.
+
+        :return: Dictionary (row, col) -> asset ID, see register_manifest
+        """
+        tiles = self.manifests.get(prefix)
+        if tiles is None:
+            tiles = self.register_manifest(self.manifest_paths[prefix])
+        return tiles
+
+    def _place(self, width, height):
+        """
+        Find room for a frame on the atlas pages, opening a new shelf or page when the current one is full.
+        """
+        padded_width = width + self.padding
+        padded_height = height + self.padding
+        if padded_width > self.atlas_size or padded_height > self.atlas_size:
+            # Oversized frames get a page of their own
+            self.pages.append(Image.new('RGBA', (width, height)))
+            return len(self.pages) - 1, 0, 0
+
+        if self.shelf is not None:
+            page, x, y, shelf_height = self.shelf
+            if x + padded_width > self.atlas_size:
+                # Start a new shelf below the current one
+                page, x, y, shelf_height = page, 0, y + shelf_height, 0
+            if y + padded_height > self.atlas_size:
+                self.shelf = None
+        if self.shelf is None:
+            self.pages.append(Image.new('RGBA', (self.atlas_size, self.atlas_size)))
+            page, x, y, shelf_height = len(self.pages) - 1, 0, 0, 0
+
+        self.shelf = (page, x + padded_width, y, max(shelf_height, padded_height))
+        return page, x, y
+
+    def load(self, asset_id):
+        """
+        Decode an asset's file and pack its frames into the atlas, once.
+
+        :return: Number of frames in the asset
+        """
+        frames = self.frames.get(asset_id)
+        if frames is None:
+            path, frame_width, frame_height = self.specs[asset_id]
+            frames = []
+            for file_path in (path if isinstance(path, tuple) else (path,)):
+                with Image.open(file_path) as source:
+                    source = source.convert('RGBA')
+                self.loads += 1
+                width = frame_width or source.width
+                height = frame_height or source.height
+                for top in range(0, source.height - height + 1, height):
+                    for left in range(0, source.width - width + 1, width):
+                        page, x, y = self._place(width, height)
+                        self.pages[page].paste(source.crop((left, top, left + width, top + height)), (x, y))
+                        frames.append((page, x, y, x + width, y + height))
+            self.frames[asset_id] = frames
+        return len(frames)
+
+    def adopt(self, pages, frames, source=None):
+        """
+        Take over atlas pages packed elsewhere, e.g. by the offline asset bake (see asset_bundle).
+
+        :param pages: Atlas page images
+        :param frames: Dictionary asset ID -> list of (page, left, top, right, bottom), page indices into `pages`
+        :param source: Object backing the page memory (such as an mmap), kept alive with the pages
+        """
+        first = len(self.pages)
+        self.pages.extend(pages)
+        for asset_id, asset_frames in frames.items():
+            if asset_id not in self.frames:
+                self.frames[asset_id] = [(first + page, left, top, right, bottom)
+                                         for page, left, top, right, bottom in asset_frames]
+        if source is not None:
+            self.sources.append(source)
+
+    def frame_count(self, asset_id):
+        return self.load(asset_id)
+
+    def image(self, asset_id, frame=0):
+        """
+        Get a frame as a PIL image, e.g. for compositing off-screen.
+        """
+        self.load(asset_id)
+        page, left, top, right, bottom = self.frames[asset_id][frame]
+        return self.pages[page].crop((left, top, right, bottom))
+
+    def acquire(self, asset_id, frame=0):
+        """
+        Get the shared PhotoImage of a frame and take a reference to it. Pair with `release`.
+        """
+        key = (asset_id, frame)
+        handle = self.handles.get(key)
+        if handle is None:
+            handle = self.handles[key] = [self._photo(self.image(asset_id, frame)), 0]
+        handle[1] += 1
+        return handle[0]
+
+    def _photo(self, image):
+        if self.photo_factory is None:
+            # Imported on first use so the asset manager itself does not need tkinter
+            from PIL import ImageTk
+            self.photo_factory = ImageTk.PhotoImage
+        return self.photo_factory(image)
+
+    def acquire_frames(self, asset_id):
+        """
+        Take a reference to every frame of an asset.
+
+        :return: List of PhotoImages in frame order
+        """
+        return [self.acquire(asset_id, frame) for frame in range(self.load(asset_id))]
+
+    def release(self, asset_id, frame=0):
+        """
+        Drop a reference taken with `acquire`; the PhotoImage is freed when no references are left.
+        """
+        key = (asset_id, frame)
+        handle = self.handles.get(key)
+        if handle is None:
+            return
+        handle[1] -= 1
+        if handle[1] <= 0:
+            del self.handles[key]
+
+    def release_frames(self, asset_id):
+        for frame in range(len(self.frames.get(asset_id, ()))):
+            self.release(asset_id, frame)
+
+    def stats(self):
+        """
+        Summarize what has been loaded.
+        """
+        return {
+            'registered': len(self.specs),
+            'loaded': len(self.frames),
+            'files_decoded': self.loads,
+            'frames': sum(len(frames) for frames in self.frames.values()),
+            'pages': len(self.pages),
+            'atlas_bytes': sum(page.width * page.height * 4 for page in self.pages),
+            'handles': len(self.handles)
+        }
+
+
+def register_default_assets(assets):
+    """
+    Register the game's map tiles, character and critter sprites.
+
+    Map tiles are registered as 'tile_000' ... 'tile_114'. Critter animations are registered
+    per facing, e.g. 'badger_walk_SW', 'stag_walk_NE' or 'boar_run_SE'. The character sheet is
+    registered under its path, which is how Character looks it up. Sprite sheets that were sliced
+    and exported are only noted; their tiles are registered when first asked for with
+    `assets.manifest(prefix)`, e.g. 'alt_terrain_3_5' from assets.manifest('alt_terrain').
+    """
+    assets.register_directory("textures/map_tiles")
+    for directory in EXPORT_DIRECTORIES:
+        assets.find_manifests(directory)
+    assets.register("character_spritesheet.png", "character_spritesheet.png", 24, 32)
+    for facing in FACINGS:
+        assets.register(f"badger_walk_{facing}", f"spritesheets/critters/badger/critter_badger_{facing}_walk.png", 42, 32)
+        assets.register(f"stag_walk_{facing}", f"spritesheets/critters/stag/critter_stag_{facing}_walk.png", 32, 41)
+        # The boar strips differ in size between facings, so its frames come from the single-frame files
+        assets.register(f"boar_run_{facing}", [f"spritesheets/critters/boar/boar_{facing}_run_{frame}.png" for frame in range(4)])
+    assets.register("wolf_run", "spritesheets/critters/wolf/wolf-run.png", 64, 64)
+    return assets
+
+
+# Manager shared by everything that does not get one passed in
+_default_assets = None
+
+
+def default_assets():
+    """
+    Get the shared asset manager, with the default assets registered.
+    """
+    global _default_assets
+    if _default_assets is None:
+        _default_assets = register_default_assets(AssetManager())
+    return _default_assets
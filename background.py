@@ -0,0 +1,133 @@
+import tkinter as tk
+from PIL import Image, ImageTk
+from tile_map import TERRAIN_TYPES, classify_terrain
+
+
+class BakedBackground:
+    """
+    Draw the terrain as a few large pre-composited images, one per chunk, instead of one item per tile.
+
+    Each chunk's tiles are composited off-screen with PIL at their isometric offsets. The result is
+    cached with the chunk's version and only rebuilt when that chunk's terrain changes.
+    Offers the same render/retile/forget_chunk/clear/item_count interface as ViewportRenderer.
+    """
+    def __init__(self, canvas, chunk_manager, terrain_tiles, tile_width, tile_height):
+        """
+        :param canvas: Canvas to draw on
+        :param chunk_manager: Source of terrain
+        :param terrain_tiles: PIL tile image for each terrain type, see load_terrain_tiles
+        :param tile_width: Isometric tile width in pixels
+        :param tile_height: Isometric tile height in pixels
+        """
+        self.canvas = canvas
+        self.chunk_manager = chunk_manager
+        self.terrain_tiles = terrain_tiles
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.baked = {} # (cx, cy) -> (chunk version, PhotoImage, canvas item)
+
+    def region_origin(self, chunk):
+        """
+        Canvas position of the top-left corner of a chunk's baked image.
+        """
+        last_y = chunk.y0 + chunk.height - 1
+        return (chunk.x0 - last_y) * (self.tile_width // 2), (chunk.x0 + chunk.y0) * (self.tile_height // 2)
+
+    def bake(self, chunk):
+        """
+        Composite every tile of a chunk into one RGBA image.
+
+        :return: PIL image covering the chunk's isometric footprint
+        """
+        half_width = self.tile_width // 2
+        half_height = self.tile_height // 2
+        span = chunk.width + chunk.height - 2
+        image = Image.new('RGBA', (span * half_width + self.tile_width, span * half_height + self.tile_height))
+
+        # Paste row by row, left to right, so nearer tiles overlap farther ones like on the canvas
+        palette = [self.terrain_tiles[terrain_type] for terrain_type in TERRAIN_TYPES]
+        terrain_ids = classify_terrain(chunk.elevation)
+        last_row = chunk.height - 1
+        for y in range(chunk.height):
+            for x in range(chunk.width):
+                tile = palette[terrain_ids[y, x]]
+                image.alpha_composite(tile, ((x - y + last_row) * half_width, (x + y) * half_height))
+        return image
+
+    def chunk_visible(self, chunk, left, top, right, bottom):
+        """
+        Check if a chunk's baked image intersects the given canvas region.
+        """
+        x, y = self.region_origin(chunk)
+        span = chunk.width + chunk.height - 2
+        width = span * (self.tile_width // 2) + self.tile_width
+        height = span * (self.tile_height // 2) + self.tile_height
+        return x < right and x + width > left and y < bottom and y + height > top
+
+    def render(self, force=False):
+        """
+        Show the baked image of every loaded chunk in view, baking the missing or outdated ones.
+
+        :param force: Accepted for the ViewportRenderer interface. Every call already re-checks the view,
+            and images that are hidden (see clear) but up to date are shown again without rebaking.
+        """
+        left = self.canvas.canvasx(0)
+        top = self.canvas.canvasy(0)
+        right = self.canvas.canvasx(self.canvas.winfo_width())
+        bottom = self.canvas.canvasy(self.canvas.winfo_height())
+
+        added = False
+        for key, chunk in list(self.chunk_manager.chunks.items()):
+            entry = self.baked.get(key)
+            if not self.chunk_visible(chunk, left, top, right, bottom):
+                if entry is not None:
+                    self.canvas.itemconfig(entry[2], state=tk.HIDDEN)
+                continue
+
+            if entry is not None and entry[0] == chunk.version:
+                self.canvas.itemconfig(entry[2], state=tk.NORMAL)
+                continue
+
+            photo = ImageTk.PhotoImage(self.bake(chunk))
+            if entry is not None:
+                item = entry[2]
+                self.canvas.itemconfig(item, image=photo, state=tk.NORMAL)
+            else:
+                item = self.canvas.create_image(*self.region_origin(chunk), anchor=tk.NW, image=photo, tags='terrain')
+            self.baked[key] = (chunk.version, photo, item)
+            added = True
+
+        # Keep regions stacked back to front and the decorations and sprites above the terrain
+        if added:
+            for key in sorted(self.baked, key=lambda key: (key[0] + key[1], key[1])):
+                self.canvas.tag_raise(self.baked[key][2])
+            self.canvas.tag_raise('decoration')
+            self.canvas.tag_raise('sprite')
+
+    def retile(self, chunk, coords):
+        """
+        Rebake a chunk whose terrain changed, if it is on screen.
+        """
+        if coords and (chunk.cx, chunk.cy) in self.baked:
+            self.render()
+
+    def forget_chunk(self, chunk):
+        """
+        Drop the baked image of an evicted chunk.
+        """
+        entry = self.baked.pop((chunk.cx, chunk.cy), None)
+        if entry is not None:
+            self.canvas.delete(entry[2])
+
+    def clear(self):
+        """
+        Hide every baked image, e.g. while another renderer draws the terrain. The next render shows them again.
+        """
+        for _, _, item in self.baked.values():
+            self.canvas.itemconfig(item, state=tk.HIDDEN)
+
+    def item_count(self):
+        """
+        Number of canvas items owned by the background.
+        """
+        return len(self.baked)
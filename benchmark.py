@@ -0,0 +1,178 @@
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from terrain_noise import generate_noise_map
+from map_generation import generate_perlin_noise
+from headless import HeadlessGame, HeadlessImage
+from map_generation import load_terrain_tiles
+from zoom import ZOOM_LEVELS, ZoomedTerrain, RegionTerrain, build_mipmaps, terrain_colors
+
+
+def pnoise2_loop(size, scale=10, octaves=6, persistence=0.5, lacunarity=2.0):
+    """
+    The original per-cell terrain generator, kept here as the reference implementation.
+    """
+    from noise import pnoise2
+
+    noise_map = np.zeros((size, size))
+    for y in range(size):
+        for x in range(size):
+            noise_map[y][x] = pnoise2(x / scale,
+                                      y / scale,
+                                      octaves=octaves,
+                                      persistence=persistence,
+                                      lacunarity=lacunarity,
+                                      repeatx=size,
+                                      repeaty=size,
+                                      base=0)
+
+    min_val = np.min(noise_map)
+    max_val = np.max(noise_map)
+    return (noise_map - min_val) / (max_val - min_val)
+
+
+def time_call(func, *args, repeats=3, **kwargs):
+    """
+    Run a function several times and return the best wall-clock time with the last result.
+    """
+    best = float('inf')
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def benchmark_noise(sizes, reference_limit=512, repeats=3):
+    """
+    Compare the vectorized noise engine against the per-cell pnoise2 loop.
+
+    :param sizes: Map sizes to generate
+    :param reference_limit: Largest size the slow reference loop is run for
+    :param repeats: Number of runs per measurement (the best one is reported)
+    """
+    print(f"{'size':>6} {'pnoise2 loop':>14} {'vectorized':>12} {'process pool':>14} {'max diff':>10}")
+    for size in sizes:
+        vectorized_time, vectorized = time_call(generate_noise_map, size, workers=1, repeats=repeats)
+        pool_time, _ = time_call(generate_noise_map, size, repeats=repeats)
+
+        if size <= reference_limit:
+            loop_time, reference = time_call(pnoise2_loop, size, repeats=1)
+            loop_text = f"{loop_time:13.3f}s"
+            diff_text = f"{np.abs(reference - vectorized).max():10.2e}"
+        else:
+            loop_text = f"{'skipped':>14}"
+            diff_text = f"{'-':>10}"
+
+        print(f"{size:>6} {loop_text} {vectorized_time:11.3f}s {pool_time:13.3f}s {diff_text}")
+
+
+def benchmark_lookups(game, count=100000, seed=0):
+    """
+    Time tile and walkability lookups at random coordinates of the loaded chunks.
+
+    :return: (microseconds per tile_at_grid, microseconds per is_walkable)
+    """
+    rng = np.random.default_rng(seed)
+    chunks = list(game.chunks.chunks.values())
+    picks = rng.integers(len(chunks), size=count)
+    coords = [(chunks[i].x0 + int(rng.integers(chunks[i].width)), chunks[i].y0 + int(rng.integers(chunks[i].height)))
+              for i in picks]
+
+    start = time.perf_counter()
+    for x, y in coords:
+        game.tile_index.tile_at_grid(x, y)
+    tile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for x, y in coords:
+        game.chunks.is_walkable(x, y)
+    walkable_time = time.perf_counter() - start
+    return 1e6 * tile_time / count, 1e6 * walkable_time / count
+
+
+def benchmark_engine(sizes, ticks=600, enemies=100, lookups=100000, repeats=1):
+    """
+    Time the headless engine: map generation, tile lookups and simulation ticks, with memory use.
+
+    :param sizes: Map sizes
+    :param ticks: Simulation steps run per size
+    :param enemies: Number of enemies chasing the player
+    :param lookups: Number of random lookups timed
+    :param repeats: Number of map generations per size (the best one is reported)
+    """
+    print(f"{'size':>6} {'generate':>10} {'gen peak':>10} {'tile lookup':>12} {'walkable':>10} "
+          f"{'tick avg':>10} {'tick p95':>10} {'tick max':>10} {'loaded':>10}")
+    for size in sizes:
+        tracemalloc.start()
+        generate_time, _ = time_call(generate_perlin_noise, size, repeats=repeats)
+        _, generate_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        game = HeadlessGame(size, enemy_count=enemies)
+        times = game.simulate(ticks)
+        tile_us, walkable_us = benchmark_lookups(game, lookups)
+        loaded = sum(chunk.elevation.nbytes + chunk.isometric_map.nbytes() for chunk in game.chunks.chunks.values())
+
+        print(f"{size:>6} {generate_time:9.3f}s {generate_peak / 2 ** 20:7.1f}MiB {tile_us:9.2f}us {walkable_us:7.2f}us "
+              f"{1000 * times.mean():8.3f}ms {1000 * np.percentile(times, 95):8.3f}ms {1000 * times.max():8.3f}ms "
+              f"{loaded / 2 ** 20:7.2f}MiB")
+
+
+def benchmark_zoom(size=1024, canvas_width=1024, canvas_height=768):
+    """
+    Time drawing the view over the middle of a world at every zoom level.
+
+    The first render of a zoomed out level builds the regions it shows; the second one is a view
+    moved by a few tiles. Image memory counts the pixels of the aggregated region images.
+    """
+    game = HeadlessGame(size, canvas_width=canvas_width, canvas_height=canvas_height)
+    tiles = load_terrain_tiles(game.assets)
+    mipmaps = build_mipmaps(tiles)
+    colors = terrain_colors(tiles)
+    regions = RegionTerrain(game.chunks)
+    character = game.character
+    character.character_x = character.character_y = size // 2
+    print(f"{'zoom':>7} {'first':>10} {'moved':>10} {'items':>8} {'images':>10}")
+    for zoom in ZOOM_LEVELS:
+        game.viewport.clear()
+        if zoom == 1:
+            renderer = game.viewport
+        else:
+            renderer = ZoomedTerrain(game.canvas, game.chunks, regions, mipmaps, colors,
+                                     game.tile_width, game.tile_height, zoom, photo_factory=HeadlessImage)
+        character.zoom = zoom
+        character.viewport = renderer
+        start = time.perf_counter()
+        character.center_view()
+        first_time = time.perf_counter() - start
+        character.character_x += 3
+        start = time.perf_counter()
+        character.center_view()
+        moved_time = time.perf_counter() - start
+        character.character_x -= 3
+        image_bytes = sum(photo.width() * photo.height() * 4 for photo, _ in getattr(renderer, 'images', {}).values())
+        print(f"{zoom:7.4f} {1000 * first_time:8.2f}ms {1000 * moved_time:8.2f}ms {renderer.item_count():8} "
+              f"{image_bytes / 2 ** 20:7.2f}MiB")
+        renderer.clear()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark terrain generation and the headless engine.")
+    parser.add_argument('--suite', choices=('noise', 'engine', 'zoom', 'all'), default='all')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[60, 256, 512, 1024, 2048, 4096])
+    parser.add_argument('--reference-limit', type=int, default=512,
+                        help="largest map size to run the slow pnoise2 loop for")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--ticks', type=int, default=600, help="simulation steps per size in the engine suite")
+    parser.add_argument('--enemies', type=int, default=100, help="enemies chasing the player in the engine suite")
+    args = parser.parse_args()
+
+    if args.suite in ('noise', 'all'):
+        benchmark_noise(args.sizes, reference_limit=args.reference_limit, repeats=args.repeats)
+    if args.suite in ('engine', 'all'):
+        benchmark_engine(args.sizes, ticks=args.ticks, enemies=args.enemies)
+    if args.suite in ('zoom', 'all'):
+        benchmark_zoom()
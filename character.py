@@ -1,13 +1,17 @@
-import tkinter as tk
-from PIL import Image, ImageTk
+from assets import default_assets
+from sprite_layer import SpriteLayer
+
+# Seconds each animation frame is shown, and how long the walk animation plays after a move
+FRAME_DURATION = 0.1
+ANIMATION_DURATION = 0.8
 
 class Character:
-    def __init__(self, size, tile_size, canvas, isometric_map, terrain, sprite_sheet_path, sprite_width, sprite_height, tile_width, tile_height, start_x=0, start_y=0):
+    def __init__(self, size, tile_size, canvas, chunk_manager, tile_index, sprite_sheet_path, sprite_width, sprite_height, tile_width, tile_height, start_x=0, start_y=0, sprite_layer=None, assets=None):
         self.size = size
         self.tile_size = tile_size
         self.canvas = canvas
-        self.isometric_map = isometric_map
-        self.terrain = terrain
+        self.chunk_manager = chunk_manager # Source of terrain, generated chunk by chunk around the character
+        self.tile_index = tile_index # Lookup of the isometric tiles by grid coordinate
         self.sprite_width = sprite_width
         self.sprite_height = sprite_height
         self.tile_width = tile_width
@@ -17,32 +21,37 @@ class Character:
         self.character_direction = 'down'
         self.current_frame = 0
         self.animation_running = False
-        self.last_position = None
+        self.animation_time_left = 0.0
+        self.frame_time = 0.0
+        self.viewport = None # Renderer that draws the visible terrain, refreshed whenever the view moves
+        self.zoom = 1.0 # Scale of the view's canvas coordinates relative to native tile pixels
+        self.spatial_hash = None # Optional SpatialHash of the actors; tiles other actors stand on block movement
+        self.world_loader = None # Optional WorldLoader streaming the chunks around the character in the background
+        
+        # The character is a single persistent canvas item, moved and re-imaged in place
+        self.sprite_layer = sprite_layer if sprite_layer is not None else SpriteLayer(canvas)
         
         # Inventory system (list to hold items)
         self.inventory = []
         
-        # Load the character sprite sheet and extract 8 frames per direction
+        # Take the 8 frames per direction from the shared asset manager
+        self.assets = assets or default_assets()
         self.character_sprites = self.load_character_sprites(sprite_sheet_path, sprite_width, sprite_height)
 
     def load_character_sprites(self, sprite_sheet_path, sprite_width, sprite_height):
         """
         Load the character sprite sheet and extract 8 frames for each direction (down, left, right, up).
+        The sheet is decoded once by the asset manager and its frames are shared.
         """
-        sprite_sheet = Image.open(sprite_sheet_path)
-        sprites = {
-            'down': [],
-            'up': [],
-            'left': [],
-            'right': []
-        }
-        
-        for i, direction in enumerate(sprites.keys()):
-            for frame in range(8):
-                x = frame * sprite_width
-                y = i * sprite_height
-                sprite = ImageTk.PhotoImage(sprite_sheet.crop((x, y, x + sprite_width, y + sprite_height)))
-                sprites[direction].append(sprite)
+        # The sheet is registered under its path, one row of frames per direction
+        if sprite_sheet_path not in self.assets:
+            self.assets.register(sprite_sheet_path, sprite_sheet_path, sprite_width, sprite_height)
+        frames = self.assets.acquire_frames(sprite_sheet_path)
+        frames_per_row = len(frames) // 4
+        sprites = {}
+        
+        for i, direction in enumerate(('down', 'up', 'left', 'right')):
+            sprites[direction] = frames[i * frames_per_row:i * frames_per_row + 8]
                 
         return sprites
     
@@ -57,67 +66,60 @@ class Character:
     def draw_character(self):
         """
         Draw the character at the current position on the canvas.
+        The change is queued on the sprite layer and reaches the canvas when the layer is flushed.
         """
-        if self.last_position:
-            # Only clear the previous character position
-            last_x, last_y = self.last_position
-            
-            # Find the previous tile's isometric coordinates from the map
-            for tile in self.isometric_map:
-                if tile['x'] == last_x and tile['y'] == last_y:
-                    self.canvas.create_image(tile['x'], tile['y'], anchor=tk.NW, image=tile['image'])
-                    break
-                
-             # Find the current tile's isometric coordinates
-        current_tile = None
-        for tile in self.isometric_map:
-            if tile['x'] == self.character_x and tile['y'] == self.character_y:
-                current_tile = tile
-                break
+        # Find the current tile's isometric coordinates
+        current_tile = self.tile_index.tile_at_grid(self.character_x, self.character_y)
 
         if current_tile:
-            # Draw the character on the canvas at the isometric tile's position
+            # Move the character's sprite to the isometric tile's position and show the current frame
             character_image = self.character_sprites[self.character_direction][self.current_frame]
-            self.canvas.create_image(current_tile['x'], current_tile['y'], anchor='nw', image=character_image)
-            self.last_position = (self.character_x, self.character_y)
+            self.sprite_layer.update('character', character_image, current_tile['x'], current_tile['y'])
             
-    def animate_character(self):
+    def update(self, dt):
         """
-        Animate the character by cycling through frames.
+        Advance the animation by dt seconds. Called by the game loop on every simulation step.
         """
-        self.current_frame = (self.current_frame + 1) % 8 # Cycle through 8 frames
-        self.draw_character()
-        
-        if self.animation_running:
-            self.canvas.after(100, self.animate_character) # 100 ms delay for each frame
+        if not self.animation_running:
+            return
+        
+        # Stop a short while after the last move
+        self.animation_time_left -= dt
+        if self.animation_time_left <= 0:
+            self.stop_animation()
+            return
+        
+        self.frame_time += dt
+        while self.frame_time >= FRAME_DURATION:
+            self.frame_time -= FRAME_DURATION
+            self.current_frame = (self.current_frame + 1) % 8 # Cycle through 8 frames
             
     def start_animation(self):
         """
         Start the animation and ensure it stops after a short duration
         """
         if not self.animation_running:
-            self.animation_running = True 
-            self.animate_character() 
+            self.animation_running = True
+            self.frame_time = 0.0
+            self.current_frame = (self.current_frame + 1) % 8
             
-        # Automatically stop animation after a short delay
-        self.canvas.after(800, self.stop_animation) # Stop after 800 ms
+        # Another move while animating only pushes the stop time back instead of stacking timers
+        self.animation_time_left = ANIMATION_DURATION
         
     def stop_animation(self):
         """
         Stop the character animation and reset the frame.
         """
-        self.animation_running = False 
+        self.animation_running = False
         self.current_frame = 0
-        self.draw_character()
         
     def is_walkable(self, x, y):
         """
-        Check if the tile at (x, y) is walkable. A tile is walkable if it is not water.
+        Check if the tile at (x, y) is walkable. A tile is walkable if it is not water and no other actor stands on it.
         """
-        if 0 <= x < self.size and 0 <= y < self.size:
-            elevation = self.terrain[y, x]
-            return elevation >= 0.2 and elevation < 0.8  # Walkable if elevation is greater than or equal to 0.2 (not water)
-        return False
+        if self.spatial_hash is not None and self.spatial_hash.occupied(x, y, ignore='character'):
+            return False
+        return self.chunk_manager.is_walkable(x, y)
 
         
     def move(self, direction):
@@ -137,19 +139,29 @@ class Character:
         scroll_threshold_y = visible_y_tiles // 4
         
         # Move the character and update it's direction
-        if direction == 'up' and self.character_y > 0 and self.is_walkable(self.character_x, self.character_y - 1):
+        # (world bounds are handled by is_walkable, so unbounded worlds need no extra checks)
+        if direction == 'up' and self.is_walkable(self.character_x, self.character_y - 1):
             self.character_y -= 1
             self.character_direction = 'up'
-        elif direction == 'down' and self.character_y < self.canvas.winfo_height() - 1 and self.is_walkable(self.character_x, self.character_y + 1):
+        elif direction == 'down' and self.is_walkable(self.character_x, self.character_y + 1):
             self.character_y += 1
             self.character_direction = 'down'
-        elif direction == 'left' and self.character_x > 0 and self.is_walkable(self.character_x - 1, self.character_y):
+        elif direction == 'left' and self.is_walkable(self.character_x - 1, self.character_y):
             self.character_x -= 1
             self.character_direction = 'left'
-        elif direction == 'right' and self.character_x < self.canvas.winfo_width() - 1 and self.is_walkable(self.character_x + 1, self.character_y):
+        elif direction == 'right' and self.is_walkable(self.character_x + 1, self.character_y):
             self.character_x += 1
             self.character_direction = 'right'
+        if self.spatial_hash is not None:
+            self.spatial_hash.move('character', self.character_x, self.character_y)
             
+        # Generate the chunks around the new position (and evict the far away ones),
+        # in the background when a world loader is set; visible chunks are still generated on demand
+        if self.world_loader is not None:
+            self.world_loader.request_around(self.character_x, self.character_y)
+        else:
+            self.chunk_manager.ensure_around(self.character_x, self.character_y)
+        
         self.start_animation()
         
         self.center_view()
@@ -186,9 +198,10 @@ class Character:
         canvas_width = self.canvas.winfo_width()
         canvas_height = self.canvas.winfo_height()
         
-        # Calculate character pixel position on the canvas
-        character_pixel_x = self.character_x * self.tile_size
-        character_pixel_y = self.character_y * self.tile_size
+        # Calculate character pixel position on the canvas (center of its isometric tile)
+        iso_x, iso_y = self.grid_to_isometric(self.character_x, self.character_y)
+        character_pixel_x = (iso_x + self.tile_width // 2) * self.zoom
+        character_pixel_y = (iso_y + self.tile_height // 2) * self.zoom
         
         # Get half the canvas size to calculate the center point
         half_canvas_width = canvas_width // 2
@@ -198,7 +211,19 @@ class Character:
         new_view_x = character_pixel_x - half_canvas_width
         new_view_y = character_pixel_y - half_canvas_height
         
+        # The scroll region follows the loaded chunks, so the view can go anywhere in the world.
+        # Zoomed out the view reaches past the loaded chunks, so it gets a canvas-sized margin around the character instead.
+        if self.zoom == 1:
+            left, top, right, bottom = self.chunk_manager.pixel_bounds(self.tile_width, self.tile_height)
+        else:
+            left, top = character_pixel_x - canvas_width, character_pixel_y - canvas_height
+            right, bottom = character_pixel_x + canvas_width, character_pixel_y + canvas_height
+        self.canvas.config(scrollregion=(left, top, right, bottom))
+        
         # Scroll the canvas to center the character (adjust scroll region)
-        self.canvas.xview_moveto(new_view_x / (self.size * self.tile_size))
-        self.canvas.yview_moveto(new_view_y / (self.size * self.tile_size))
-        
\ No newline at end of file
+        self.canvas.xview_moveto((new_view_x - left) / (right - left))
+        self.canvas.yview_moveto((new_view_y - top) / (bottom - top))
+        
+        # Draw the tiles that scrolled into view and recycle the ones that left it
+        if self.viewport is not None:
+            self.viewport.render()
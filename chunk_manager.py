@@ -0,0 +1,389 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from terrain_noise import generate_noise_tile
+from generation_cache import generate
+
+# Elevation band a tile must fall in to be walked on (not water, not high peaks)
+WALKABLE_MIN = 0.2
+WALKABLE_MAX = 0.8
+
+
+class Chunk:
+    """
+    A square block of terrain, addressed by chunk coordinates (cx, cy).
+    """
+    def __init__(self, cx, cy, x0, y0, elevation):
+        self.cx = cx
+        self.cy = cy
+        self.x0 = x0 # Grid coordinates of the top-left tile
+        self.y0 = y0
+        self.elevation = elevation
+        self.isometric_map = None # Tiles built by whoever draws the chunk
+        self.version = 0 # Bumped whenever the chunk's terrain changes, so cached renderings can be rebuilt
+
+    @property
+    def width(self):
+        return self.elevation.shape[1]
+
+    @property
+    def height(self):
+        return self.elevation.shape[0]
+
+    def contains(self, x, y):
+        """
+        Check if the grid coordinate (x, y) lies inside this chunk.
+        """
+        return self.x0 <= x < self.x0 + self.width and self.y0 <= y < self.y0 + self.height
+
+
+class ChunkManager:
+    """
+    Generate terrain in fixed-size chunks on demand and keep the recently used ones in an LRU cache.
+
+    Noise is evaluated at absolute grid coordinates, so neighbouring chunks join without seams.
+    A bounded world (`bounds` set) behaves like the old fixed size x size map; with `bounds=None`
+    the world extends in every direction.
+    """
+    def __init__(self, chunk_size=16, load_radius=2, max_chunks=None, bounds=None, scale=10, octaves=6,
+                 persistence=0.5, lacunarity=2.0, repeat=None, base=0, seed=None, normalization=None, reference_size=256,
+                 cache=None, cache_block=64):
+        """
+        :param chunk_size: Width and height of a chunk in tiles
+        :param load_radius: How many chunks around the player's chunk are kept loaded
+        :param max_chunks: LRU capacity, defaults to twice the loaded area around the player
+        :param bounds: World size in tiles (bounds x bounds), or None for an unbounded world
+        :param scale: Controls the zoom level of the noise
+        :param octaves: Number of levels of detail
+        :param persistence: Amplitude multiplier for each octave
+        :param lacunarity: Frequency multiplier for each octave
+        :param repeat: Lattice period, defaults to the world size or 1024 for unbounded worlds
+        :param base: Offset into the permutation table
+        :param seed: Seed of the noise field, None for the classic pnoise2 terrain
+        :param normalization: (low, high) raw noise values mapped to elevation 0 and 1
+        :param reference_size: Size of the window at the origin sampled to pick the normalization
+        :param cache: Optional GenerationCache the reference window and the chunk noise are read from instead of recomputed
+        :param cache_block: Width and height in tiles of the noise blocks stored in the cache
+        """
+        self.chunk_size = chunk_size
+        self.load_radius = load_radius
+        area = (2 * load_radius + 1) ** 2
+        self.max_chunks = max(max_chunks or 2 * area, area)
+        self.bounds = bounds
+        if repeat is None:
+            repeat = bounds if bounds is not None else 1024
+        self.noise_params = {
+            'scale': scale,
+            'octaves': octaves,
+            'persistence': persistence,
+            'lacunarity': lacunarity,
+            'repeatx': repeat,
+            'repeaty': repeat,
+            'base': base,
+            'seed': seed
+        }
+
+        # Chunks cannot be normalized against the whole world, so fix the range up front.
+        # For bounded worlds up to reference_size this reproduces generate_perlin_noise exactly.
+        if normalization is None:
+            reference = min(bounds, reference_size) if bounds is not None else reference_size
+            params = dict(self.noise_params, kind='noise_tile', x0=0, y0=0, width=reference, height=reference)
+            sample = cache.get_or_generate(params) if cache is not None else generate(params)
+            normalization = (float(sample.min()), float(sample.max()))
+        self.normalization = normalization
+
+        # Raw noise is cached in aligned blocks of several chunks, so a relaunch reads it back instead of recomputing it.
+        # The last few blocks are also kept in memory; the lock serializes the world loader's worker and the UI thread.
+        self.cache = cache
+        self.cache_block = cache_block
+        self.noise_blocks = OrderedDict() # (bx, by) -> raw noise of the block
+        self.max_noise_blocks = 16
+        self.cache_lock = threading.Lock()
+
+        self.chunks = OrderedDict()
+
+        # Saved world (see world_save.WorldSave) that chunks are read from before any terrain is generated
+        self.storage = None
+
+        # Elevation of edited chunks that were evicted while there was no storage to save them to,
+        # read back instead of the noise when they are loaded again
+        self.edited = {} # (cx, cy) -> elevation
+
+        # Callbacks so the renderer can draw new chunks, drop evicted ones and update edited ones
+        self.on_load = None
+        self.on_evict = None
+        self.on_change = None # Called with (chunk, (x0, y0, x1, y1)) for the part of an edit inside the chunk
+
+    def chunk_coords(self, x, y):
+        """
+        Convert grid coordinates to the coordinates of the chunk containing them.
+        """
+        return x // self.chunk_size, y // self.chunk_size
+
+    def in_bounds(self, x, y):
+        """
+        Check if grid coordinate (x, y) is part of the world.
+        """
+        if self.bounds is None:
+            return True
+        return 0 <= x < self.bounds and 0 <= y < self.bounds
+
+    def chunk_rect(self, cx, cy):
+        """
+        Grid rectangle (x0, y0, width, height) covered by a chunk, or None if it lies entirely outside the world.
+        """
+        x0 = cx * self.chunk_size
+        y0 = cy * self.chunk_size
+        width = height = self.chunk_size
+        if self.bounds is not None:
+            if not (0 <= x0 < self.bounds and 0 <= y0 < self.bounds):
+                return None
+            width = min(width, self.bounds - x0)
+            height = min(height, self.bounds - y0)
+        return x0, y0, width, height
+
+    def generate_chunk(self, cx, cy, elevation=None):
+        """
+        Generate the terrain for one chunk (or read it from storage), or return None if it lies entirely outside the world.
+
+        :param elevation: Noise elevation of the chunk computed elsewhere (e.g. on a worker thread), used unless storage has the chunk
+        """
+        rect = self.chunk_rect(cx, cy)
+        if rect is None:
+            return None
+        x0, y0, width, height = rect
+
+        kept = self.edited.pop((cx, cy), None)
+        if kept is not None:
+            chunk = Chunk(cx, cy, x0, y0, kept)
+            chunk.version = 1 # Still differs from the noise, so it is kept again on the next eviction
+            return chunk
+        stored = self.storage.load_elevation(cx, cy) if self.storage is not None else None
+        if stored is not None:
+            elevation = stored
+        elif elevation is None:
+            elevation = self.noise_elevation(x0, y0, width, height)
+        return Chunk(cx, cy, x0, y0, elevation)
+
+    def noise_elevation(self, x0, y0, width, height, step=1):
+        """
+        Generated (unedited) elevation of a rectangle of the world, normalized to [0, 1].
+
+        :param step: Grid cells between samples, for subsampled overviews (width x height samples)
+        """
+        if self.cache is not None and step == 1:
+            raw = self.cached_noise(x0, y0, width, height)
+        else:
+            raw = generate_noise_tile(x0, y0, width, height, step=step, **self.noise_params)
+        low, high = self.normalization
+        return np.clip((raw.astype(np.float64) - low) / (high - low), 0.0, 1.0)
+
+    def cached_noise(self, x0, y0, width, height):
+        """
+        Raw noise of a rectangle, assembled from the cached blocks overlapping it.
+        Noise is computed per cell, so this gives the same values as generating the rectangle directly.
+        """
+        block = self.cache_block
+        raw = np.empty((height, width), dtype=np.float32)
+        for by in range(y0 // block, (y0 + height - 1) // block + 1):
+            for bx in range(x0 // block, (x0 + width - 1) // block + 1):
+                noise = self.noise_block(bx, by)
+                left, top = max(x0, bx * block), max(y0, by * block)
+                right, bottom = min(x0 + width, (bx + 1) * block), min(y0 + height, (by + 1) * block)
+                raw[top - y0:bottom - y0, left - x0:right - x0] = noise[top - by * block:bottom - by * block,
+                                                                        left - bx * block:right - bx * block]
+        return raw
+
+    def noise_block(self, bx, by):
+        """
+        Raw noise of one cache block, from memory, the generation cache, or generated and stored.
+        """
+        key = (bx, by)
+        with self.cache_lock:
+            noise = self.noise_blocks.get(key)
+            if noise is None:
+                block = self.cache_block
+                params = dict(self.noise_params, kind='noise_tile', x0=bx * block, y0=by * block, width=block, height=block)
+                noise = self.noise_blocks[key] = self.cache.get_or_generate(params)
+                while len(self.noise_blocks) > self.max_noise_blocks:
+                    self.noise_blocks.popitem(last=False)
+            else:
+                self.noise_blocks.move_to_end(key)
+            return noise
+
+    def get_chunk(self, cx, cy):
+        """
+        Get a chunk by chunk coordinates, generating it if needed and marking it as recently used.
+        """
+        key = (cx, cy)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+
+        chunk = self.generate_chunk(cx, cy)
+        if chunk is None:
+            return None
+        return self.add_chunk(chunk)
+
+    def add_chunk(self, chunk):
+        """
+        Insert a chunk generated elsewhere (e.g. streamed in by a WorldLoader) as the most recently used one.
+        If a chunk with the same coordinates was loaded meanwhile, that one is kept.
+
+        :return: The chunk loaded at the chunk's coordinates
+        """
+        key = (chunk.cx, chunk.cy)
+        loaded = self.chunks.get(key)
+        if loaded is not None:
+            return loaded
+        self.chunks[key] = chunk
+        if self.on_load:
+            self.on_load(chunk)
+        self.evict()
+        return chunk
+
+    def chunk_at(self, x, y):
+        """
+        Get the chunk containing grid coordinate (x, y), or None outside the world.
+        """
+        if not self.in_bounds(x, y):
+            return None
+        return self.get_chunk(*self.chunk_coords(x, y))
+
+    def loaded_chunk_at(self, x, y):
+        """
+        Get the chunk containing grid coordinate (x, y) only if it is already loaded.
+        Unlike chunk_at this never generates terrain or changes the LRU order.
+        """
+        if not self.in_bounds(x, y):
+            return None
+        return self.chunks.get(self.chunk_coords(x, y))
+
+    def evict(self):
+        """
+        Drop the least recently used chunks until the cache is back within capacity.
+        Without storage, the elevation of edited chunks is kept so the edits survive.
+        """
+        while len(self.chunks) > self.max_chunks:
+            key, chunk = self.chunks.popitem(last=False)
+            if chunk.version > 0 and self.storage is None:
+                self.edited[key] = chunk.elevation
+            if self.on_evict:
+                self.on_evict(chunk)
+
+    def ensure_around(self, x, y, radius=None):
+        """
+        Make sure every chunk within `radius` chunks of grid coordinate (x, y) is loaded.
+
+        :return: List of the chunks that had to be generated
+        """
+        if radius is None:
+            radius = self.load_radius
+        center_x, center_y = self.chunk_coords(x, y)
+        loaded = []
+        for cy in range(center_y - radius, center_y + radius + 1):
+            for cx in range(center_x - radius, center_x + radius + 1):
+                is_new = (cx, cy) not in self.chunks
+                chunk = self.get_chunk(cx, cy)
+                if chunk is not None and is_new:
+                    loaded.append(chunk)
+        return loaded
+
+    def missing_around(self, x, y, radius=None):
+        """
+        Coordinates of the chunks within `radius` chunks of grid coordinate (x, y) that are part of
+        the world but not loaded, nearest first.
+        """
+        if radius is None:
+            radius = self.load_radius
+        center_x, center_y = self.chunk_coords(x, y)
+        missing = []
+        for cy in range(center_y - radius, center_y + radius + 1):
+            for cx in range(center_x - radius, center_x + radius + 1):
+                if (cx, cy) not in self.chunks and self.chunk_rect(cx, cy) is not None:
+                    missing.append((cx, cy))
+        missing.sort(key=lambda coords: (coords[0] - center_x) ** 2 + (coords[1] - center_y) ** 2)
+        return missing
+
+    def edit_region(self, x0, y0, elevation):
+        """
+        Overwrite a rectangle of the heightmap, e.g. for terraforming.
+
+        Only the chunks overlapping the rectangle are touched (generating them if they are not
+        loaded). Each one has its version bumped and on_change called with the part of the
+        rectangle inside it, so tiles, walkability and drawings are updated for just that area.
+
+        :param x0: Grid x coordinate of the rectangle's left column
+        :param y0: Grid y coordinate of the rectangle's top row
+        :param elevation: 2D array of new elevations (rows are y), clipped to [0, 1]
+        :return: List of the edited chunks
+        """
+        elevation = np.clip(np.asarray(elevation, dtype=np.float64), 0.0, 1.0)
+        height, width = elevation.shape
+        x1, y1 = x0 + width, y0 + height
+        edited = []
+        first_cx, first_cy = self.chunk_coords(x0, y0)
+        last_cx, last_cy = self.chunk_coords(x1 - 1, y1 - 1)
+        for cy in range(first_cy, last_cy + 1):
+            for cx in range(first_cx, last_cx + 1):
+                chunk = self.get_chunk(cx, cy)
+                if chunk is None:
+                    continue
+                # Part of the rectangle inside this chunk
+                left, top = max(x0, chunk.x0), max(y0, chunk.y0)
+                right, bottom = min(x1, chunk.x0 + chunk.width), min(y1, chunk.y0 + chunk.height)
+                if left >= right or top >= bottom:
+                    continue
+                chunk.elevation[top - chunk.y0:bottom - chunk.y0, left - chunk.x0:right - chunk.x0] = \
+                    elevation[top - y0:bottom - y0, left - x0:right - x0]
+                chunk.version += 1
+                edited.append(chunk)
+                if self.on_change:
+                    self.on_change(chunk, (left, top, right, bottom))
+        return edited
+
+    def regenerate_region(self, x0, y0, x1, y1):
+        """
+        Put the generated terrain back in region (x0, y0, x1, y1), undoing edits there.
+
+        :return: List of the edited chunks
+        """
+        return self.edit_region(x0, y0, self.noise_elevation(x0, y0, x1 - x0, y1 - y0))
+
+    def elevation(self, x, y):
+        """
+        Get the elevation at grid coordinate (x, y), or None outside the world.
+        """
+        chunk = self.chunk_at(x, y)
+        if chunk is None:
+            return None
+        return chunk.elevation[y - chunk.y0, x - chunk.x0]
+
+    def is_walkable(self, x, y):
+        """
+        Check if the tile at (x, y) is walkable. A tile is walkable if it is neither water nor high peaks.
+        """
+        elevation = self.elevation(x, y)
+        if elevation is None:
+            return False
+        return WALKABLE_MIN <= elevation < WALKABLE_MAX
+
+    def pixel_bounds(self, tile_width, tile_height):
+        """
+        Bounding box (left, top, right, bottom) in isometric pixels of all loaded chunks.
+        """
+        if not self.chunks:
+            return 0, 0, tile_width, tile_height
+        half_width = tile_width // 2
+        half_height = tile_height // 2
+        left = top = float('inf')
+        right = bottom = float('-inf')
+        for chunk in self.chunks.values():
+            x1 = chunk.x0 + chunk.width - 1
+            y1 = chunk.y0 + chunk.height - 1
+            left = min(left, (chunk.x0 - y1) * half_width)
+            right = max(right, (x1 - chunk.y0) * half_width + tile_width)
+            top = min(top, (chunk.x0 + chunk.y0) * half_height)
+            bottom = max(bottom, (x1 + y1) * half_height + tile_height)
+        return left, top, right, bottom
@@ -0,0 +1,339 @@
+import numpy as np
+from PIL import Image
+from assets import default_assets
+from tile_map import TERRAIN_TYPES, classify_terrain
+from visibility import UNEXPLORED
+
+# Props scattered on each terrain type: (map tile assets, minimum spacing in tiles, share of the candidates kept)
+DECORATION_TYPES = {
+    'water': (("tile_082", "tile_083", "tile_085"), 3.0, 0.5),
+    'plains': (("tile_041", "tile_042", "tile_043", "tile_044", "tile_045", "tile_046", "tile_047"), 1.2, 0.8),
+    'hills': (("tile_043", "tile_045", "tile_048", "tile_049", "tile_050", "tile_051", "tile_052"), 1.5, 0.7),
+    'mountains': (("tile_053", "tile_054", "tile_055", "tile_056", "tile_057", "tile_058", "tile_059", "tile_060"), 2.0, 0.5),
+    'high_peaks': (("tile_062", "tile_064", "tile_065", "tile_067", "tile_068"), 2.5, 0.4)
+}
+
+# One decoration: its tile, the sprite it shows (index into Decorations.sprites) and its pixel offset on the tile
+DECORATION_DTYPE = np.dtype([('x', np.int32), ('y', np.int32), ('sprite', np.uint16), ('dx', np.int8), ('dy', np.int8)])
+
+# Salts of the independent random streams drawn per tile
+PRIORITY, JITTER_X, JITTER_Y, KEEP, VARIANT = range(5)
+
+
+def tile_random(xs, ys, seed, salt):
+    """
+    Uniform random numbers in [0, 1) that depend only on the tile, the seed and the salt,
+    so any part of the world can be sampled on its own and always gives the same result.
+    """
+    h = xs.astype(np.int64).astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    h ^= ys.astype(np.int64).astype(np.uint64) * np.uint64(0xC2B2AE3D27D4EB4F)
+    h ^= np.uint64(((seed or 0) * 0x165667B19E3779F9 + salt * 0x27D4EB2F165667C5) & 0xFFFFFFFFFFFFFFFF)
+    # splitmix64 finalizer
+    h ^= h >> np.uint64(30)
+    h *= np.uint64(0xBF58476D1CE4E5B9)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(0x94D049BB133111EB)
+    h ^= h >> np.uint64(31)
+    return (h >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+class Decorations:
+    """
+    Props (flowers, bushes, logs, rocks, ripples) scattered over the terrain with blue-noise spacing.
+
+    Every tile holds one candidate point at a random spot inside it with a random priority. A
+    candidate is kept when its terrain type keeps it and no eligible candidate with a higher
+    priority lies within the spacing of either terrain type, which guarantees the minimum spacing
+    like Poisson-disk sampling does but is computed for a whole chunk at once with shifted arrays.
+    All randomness is hashed from the tile coordinates and the seed, so the result is deterministic
+    and chunks sampled separately line up without seams.
+
+    A chunk's decorations are one small structured array (see DECORATION_DTYPE), rebuilt only when
+    the chunk's terrain changes.
+    """
+    def __init__(self, chunk_manager, seed=None, types=DECORATION_TYPES, assets=None):
+        """
+        :param chunk_manager: Source of terrain
+        :param seed: Seed of the scattering, None to use the terrain's seed
+        :param types: Props per terrain type, see DECORATION_TYPES
+        :param assets: AssetManager the prop images come from, defaults to the shared one
+        """
+        self.chunk_manager = chunk_manager
+        self.seed = seed if seed is not None else chunk_manager.noise_params['seed']
+        self.assets = assets or default_assets()
+        self.sprites = [] # Sprite index -> asset ID
+        first = np.zeros(len(TERRAIN_TYPES), dtype=np.int64)
+        count = np.zeros(len(TERRAIN_TYPES), dtype=np.int64)
+        spacing = np.zeros(len(TERRAIN_TYPES))
+        keep = np.zeros(len(TERRAIN_TYPES))
+        for terrain_id, terrain_type in enumerate(TERRAIN_TYPES):
+            asset_ids, spacing[terrain_id], keep[terrain_id] = types.get(terrain_type, ((), 0.0, 0.0))
+            first[terrain_id], count[terrain_id] = len(self.sprites), len(asset_ids)
+            self.sprites.extend(asset_ids)
+        self.first_sprite = first # Terrain type ID -> index of its first sprite; its sprites are consecutive
+        self.sprite_count = count # Terrain type ID -> number of sprites
+        self.spacing = spacing # Terrain type ID -> minimum distance between props in tiles
+        self.keep = np.where(count > 0, keep, 0.0) # Terrain type ID -> share of the candidates kept
+        self.reach = int(np.ceil(spacing.max())) # Tiles around a candidate that can conflict with it
+        self.cache = {} # (cx, cy) -> (chunk version, decorations)
+
+    def sprite_images(self):
+        """
+        PIL image of every sprite, shared by all the decorations showing it.
+        """
+        return [self.assets.image(asset_id) for asset_id in self.sprites]
+
+    def terrain_window(self, x0, y0, width, height):
+        """
+        Terrain type IDs of a rectangle, from the loaded and kept edited chunks where there are any and from the noise elsewhere.
+        """
+        manager = self.chunk_manager
+        size = manager.chunk_size
+        ids = classify_terrain(manager.noise_elevation(x0, y0, width, height))
+        for cy in range(y0 // size, (y0 + height - 1) // size + 1):
+            for cx in range(x0 // size, (x0 + width - 1) // size + 1):
+                chunk = manager.chunks.get((cx, cy))
+                if chunk is not None:
+                    chunk_x0, chunk_y0, elevation = chunk.x0, chunk.y0, chunk.elevation
+                elif (cx, cy) in manager.edited:
+                    chunk_x0, chunk_y0, elevation = cx * size, cy * size, manager.edited[(cx, cy)]
+                else:
+                    continue
+                left, top = max(x0, chunk_x0), max(y0, chunk_y0)
+                right, bottom = min(x0 + width, chunk_x0 + elevation.shape[1]), min(y0 + height, chunk_y0 + elevation.shape[0])
+                if left < right and top < bottom:
+                    ids[top - y0:bottom - y0, left - x0:right - x0] = classify_terrain(
+                        elevation[top - chunk_y0:bottom - chunk_y0, left - chunk_x0:right - chunk_x0])
+        return ids
+
+    def scatter(self, x0, y0, width, height):
+        """
+        Decorations on the tiles of a rectangle of the world.
+
+        :return: Array of DECORATION_DTYPE, sorted back to front
+        """
+        reach = self.reach
+        # Candidates of the rectangle and of the tiles around it that can conflict with them
+        ids = self.terrain_window(x0 - reach, y0 - reach, width + 2 * reach, height + 2 * reach)
+        ys, xs = np.mgrid[y0 - reach:y0 + height + reach, x0 - reach:x0 + width + reach]
+        priority = tile_random(xs, ys, self.seed, PRIORITY)
+        px = xs + tile_random(xs, ys, self.seed, JITTER_X)
+        py = ys + tile_random(xs, ys, self.seed, JITTER_Y)
+        eligible = tile_random(xs, ys, self.seed, KEEP) < self.keep[ids]
+        if self.chunk_manager.bounds is not None:
+            bounds = self.chunk_manager.bounds
+            eligible &= (xs >= 0) & (ys >= 0) & (xs < bounds) & (ys < bounds)
+        spacing = self.spacing[ids]
+
+        # Keep a candidate unless an eligible one with a higher priority is too close
+        inner = (slice(reach, reach + height), slice(reach, reach + width))
+        kept = eligible[inner].copy()
+        for dy in range(-reach, reach + 1):
+            for dx in range(-reach, reach + 1):
+                if dx == 0 and dy == 0:
+                    continue
+                other = (slice(reach + dy, reach + dy + height), slice(reach + dx, reach + dx + width))
+                distance = np.hypot(px[other] - px[inner], py[other] - py[inner])
+                kept &= ~(eligible[other] & (priority[other] > priority[inner]) &
+                          (distance < np.maximum(spacing[other], spacing[inner])))
+
+        rows, cols = np.nonzero(kept)
+        tile_x = xs[inner][rows, cols]
+        tile_y = ys[inner][rows, cols]
+        terrain = ids[inner][rows, cols]
+        decorations = np.empty(len(rows), dtype=DECORATION_DTYPE)
+        decorations['x'] = tile_x
+        decorations['y'] = tile_y
+        variant = tile_random(tile_x, tile_y, self.seed, VARIANT)
+        decorations['sprite'] = self.first_sprite[terrain] + (variant * self.sprite_count[terrain]).astype(np.int64)
+        # Spot inside the tile as a small isometric pixel offset
+        jitter_x = px[inner][rows, cols] - tile_x - 0.5
+        jitter_y = py[inner][rows, cols] - tile_y - 0.5
+        decorations['dx'] = np.rint((jitter_x - jitter_y) * 8)
+        decorations['dy'] = np.rint((jitter_x + jitter_y) * 4)
+        return decorations[np.lexsort((decorations['x'], decorations['y'], decorations['x'] + decorations['y']))]
+
+    def chunk_decorations(self, chunk):
+        """
+        Decorations of a chunk, scattered again only when its terrain changed.
+        """
+        key = (chunk.cx, chunk.cy)
+        entry = self.cache.get(key)
+        if entry is None or entry[0] != chunk.version:
+            entry = self.cache[key] = (chunk.version, self.scatter(chunk.x0, chunk.y0, chunk.width, chunk.height))
+        return entry[1]
+
+    def forget_chunk(self, chunk):
+        self.cache.pop((chunk.cx, chunk.cy), None)
+
+
+class DecorationLayer:
+    """
+    Draw the decorations as one baked image per chunk instead of one canvas item per prop.
+
+    The decorations of a chunk are composited off-screen from the shared sprite images, back to
+    front, and shown as a single item stacked above the terrain and below the sprites. With a
+    Visibility set only props on explored tiles are drawn, and a chunk is rebaked when more of
+    its props have been explored, at most `max_bakes` chunks per render.
+    """
+    def __init__(self, canvas, chunk_manager, decorations, tile_width, tile_height, visibility=None, photo_factory=None,
+                 max_bakes=2, padding=8):
+        """
+        :param canvas: Canvas to draw on
+        :param chunk_manager: Source of terrain
+        :param decorations: Decorations to draw
+        :param tile_width: Isometric tile width in pixels
+        :param tile_height: Isometric tile height in pixels
+        :param visibility: Optional Visibility hiding the props of unexplored tiles
+        :param photo_factory: Callable turning a PIL image into a canvas image, defaults to ImageTk.PhotoImage
+        :param max_bakes: Most chunk images baked per render; the rest follow on later frames
+        :param padding: Pixels around a chunk's footprint left for props offset past its edge
+        """
+        self.canvas = canvas
+        self.chunk_manager = chunk_manager
+        self.decorations = decorations
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.visibility = visibility
+        if photo_factory is None:
+            from PIL import ImageTk
+            photo_factory = ImageTk.PhotoImage
+        self.photo_factory = photo_factory
+        self.max_bakes = max_bakes
+        self.padding = padding
+        self.images = None # Sprite index -> PIL image, loaded on first bake
+        self.baked = {} # (cx, cy) -> (chunk version, props shown, PhotoImage or None, canvas item or None)
+        self.visible = True
+        self.view = None
+        self.dirty = True
+
+    def region_origin(self, chunk):
+        """
+        Canvas position of the top-left corner of a chunk's baked image.
+        """
+        last_y = chunk.y0 + chunk.height - 1
+        return ((chunk.x0 - last_y) * (self.tile_width // 2) - self.padding,
+                (chunk.x0 + chunk.y0) * (self.tile_height // 2) - self.padding)
+
+    def region_size(self, chunk):
+        span = chunk.width + chunk.height - 2
+        return (span * (self.tile_width // 2) + self.tile_width + 2 * self.padding,
+                span * (self.tile_height // 2) + self.tile_height + 2 * self.padding)
+
+    def shown(self, chunk):
+        """
+        Decorations of a chunk that are drawn: all of them, or with a Visibility those on explored tiles.
+        """
+        decorations = self.decorations.chunk_decorations(chunk)
+        if self.visibility is None or not len(decorations):
+            return decorations
+        if not self.visibility.chunk_explored(chunk.cx, chunk.cy):
+            return decorations[:0]
+        return decorations[self.visibility.states_at(decorations['x'], decorations['y']) != UNEXPLORED]
+
+    def bake(self, chunk, decorations):
+        """
+        Composite decorations into one RGBA image covering a chunk's footprint.
+        """
+        if self.images is None:
+            self.images = self.decorations.sprite_images()
+        origin_x, origin_y = self.region_origin(chunk)
+        image = Image.new('RGBA', self.region_size(chunk))
+        half_width = self.tile_width // 2
+        half_height = self.tile_height // 2
+        for x, y, sprite, dx, dy in decorations.tolist():
+            image.alpha_composite(self.images[sprite], ((x - y) * half_width + dx - origin_x, (x + y) * half_height + dy - origin_y))
+        return image
+
+    def chunk_visible(self, chunk, left, top, right, bottom):
+        x, y = self.region_origin(chunk)
+        width, height = self.region_size(chunk)
+        return x < right and x + width > left and y < bottom and y + height > top
+
+    def refresh(self):
+        """
+        Check the chunks in view again on the next render, e.g. after more tiles were explored.
+        """
+        self.dirty = True
+
+    def render(self, force=False):
+        """
+        Show the baked decorations of every loaded chunk in view, baking missing or outdated ones. Called by the game loop.
+        """
+        if not self.visible:
+            return
+        left = self.canvas.canvasx(0)
+        top = self.canvas.canvasy(0)
+        right = self.canvas.canvasx(self.canvas.winfo_width())
+        bottom = self.canvas.canvasy(self.canvas.winfo_height())
+        view = (left, top, right, bottom)
+        if view == self.view and not self.dirty and not force:
+            return
+        self.view = view
+        self.dirty = False
+
+        bakes = 0
+        added = False
+        for key, chunk in list(self.chunk_manager.chunks.items()):
+            entry = self.baked.get(key)
+            if not self.chunk_visible(chunk, left, top, right, bottom):
+                if entry is not None and entry[3] is not None:
+                    self.canvas.itemconfig(entry[3], state='hidden')
+                continue
+
+            decorations = self.shown(chunk)
+            if entry is not None and entry[0] == chunk.version and entry[1] == len(decorations) and not force:
+                if entry[3] is not None:
+                    self.canvas.itemconfig(entry[3], state='normal')
+                continue
+            if bakes == self.max_bakes:
+                # Finish on a later frame
+                self.dirty = True
+                continue
+            bakes += 1
+
+            item = entry[3] if entry is not None else None
+            photo = None
+            if len(decorations):
+                photo = self.photo_factory(self.bake(chunk, decorations))
+                if item is None:
+                    item = self.canvas.create_image(*self.region_origin(chunk), anchor='nw', image=photo, tags='decoration')
+                    added = True
+                else:
+                    self.canvas.itemconfig(item, image=photo, state='normal')
+            elif item is not None:
+                self.canvas.delete(item)
+                item = None
+            self.baked[key] = (chunk.version, len(decorations), photo, item)
+
+        # Keep chunks stacked back to front, above the terrain and below the sprites
+        if added:
+            for key in sorted(self.baked, key=lambda key: (key[0] + key[1], key[1])):
+                if self.baked[key][3] is not None:
+                    self.canvas.tag_raise(self.baked[key][3])
+            self.canvas.tag_raise('sprite')
+
+    def forget_chunk(self, chunk):
+        """
+        Drop the baked image and the decorations of an evicted chunk.
+        """
+        entry = self.baked.pop((chunk.cx, chunk.cy), None)
+        if entry is not None and entry[3] is not None:
+            self.canvas.delete(entry[3])
+        self.decorations.forget_chunk(chunk)
+
+    def set_visible(self, visible):
+        """
+        Show or hide every decoration, e.g. while zoomed out.
+        """
+        self.visible = visible
+        for _, _, _, item in self.baked.values():
+            if item is not None:
+                self.canvas.itemconfig(item, state='normal' if visible else 'hidden')
+        self.view = None
+
+    def item_count(self):
+        """
+        Number of canvas items owned by the layer.
+        """
+        return sum(1 for entry in self.baked.values() if entry[3] is not None)
@@ -1,12 +1,19 @@
-import tkinter as tk
-from PIL import Image, ImageTk 
+from assets import default_assets
+from sprite_layer import SpriteLayer
+from character import FRAME_DURATION, ANIMATION_DURATION
+
+# Seconds between steps while following a path
+STEP_DURATION = 0.25
+
+# Direction name for each single-tile step
+STEP_DIRECTIONS = {(0, -1): 'up', (0, 1): 'down', (-1, 0): 'left', (1, 0): 'right'}
 
 class Enemy:
-    def __init__(self, size, canvas, ascii_map, terrain, sprite_sheet_path, sprite_width, sprite_height, tile_size, start_x=0, start_y=0):
+    def __init__(self, size, canvas, tile_index, chunk_manager, sprite_sheet_path, sprite_width, sprite_height, tile_size, start_x=0, start_y=0, sprite_layer=None, assets=None):
         self.size = size
         self.canvas = canvas
-        self.ascii_map = ascii_map
-        self.terrain = terrain
+        self.tile_index = tile_index # Lookup of the isometric tiles by grid coordinate
+        self.chunk_manager = chunk_manager # Source of terrain
         self.sprite_width = sprite_width
         self.sprite_height = sprite_height
         self.tile_size = tile_size
@@ -15,56 +22,95 @@ class Enemy:
         self.enemy_direction = 'down'
         self.current_frame = 0
         self.animation_running = False
-        self.last_position = None 
+        self.animation_time_left = 0.0
+        self.frame_time = 0.0
+        self.path = [] # Remaining steps of the path being followed
+        self.step_time = 0.0
         
+        # The enemy is a single persistent canvas item, moved and re-imaged in place
+        self.sprite_layer = sprite_layer if sprite_layer is not None else SpriteLayer(canvas)
+        self.sprite_key = f"enemy_{id(self)}"
+        self.spatial_hash = None # Optional SpatialHash of the actors; tiles other actors stand on block movement
+        
+        self.assets = assets or default_assets()
         self.enemy_sprites = self.load_enemy_sprites(sprite_sheet_path, sprite_width, sprite_height)
         
     def load_enemy_sprites(self, sprite_sheet_path, sprite_width, sprite_height):
         """
         Load the enemy sprite and extract 8 frames for each direction.
+        The sheet is decoded once by the asset manager; enemies using the same sheet share its frames.
         """
-        sprite_sheet = Image.open(sprite_sheet_path)
-        sprites = {
-            'down': [],
-            'up': [],
-            'left': [],
-            'right': []
-        }
+        # Sheets without a registered ID are registered under their path; rows are directions
+        if sprite_sheet_path not in self.assets:
+            self.assets.register(sprite_sheet_path, sprite_sheet_path, sprite_width, sprite_height)
+        frames = self.assets.acquire_frames(sprite_sheet_path)
+        frames_per_row = len(frames) // 4
+        sprites = {}
         
-        for i, direction in enumerate(sprites.keys()):
-            for frame in range(8):
-                x = frame * sprite_width 
-                y = i * sprite_height 
-                sprite = ImageTk.PhotoImage(sprite_sheet.crop((x, y, x + sprite_width, y + sprite_height)))
-                sprites[direction].append(sprite)
+        for i, direction in enumerate(('down', 'up', 'left', 'right')):
+            sprites[direction] = frames[i * frames_per_row:i * frames_per_row + 8]
                 
         return sprites
     
     def draw_enemy(self):
         """
         Draw the enemy at the current position on the canvas.
+        The change is queued on the sprite layer and reaches the canvas when the layer is flushed.
         """
-        if self.last_position:
-            # Only clear the previous enemy position
-            last_x, last_y = self.last_position 
-            tile_image = self.ascii_map[last_y][last_x]
-            self.canvas.create_image(last_x * self.tile_size, last_y * self.tile_size, anchor=tk.NW, image=tile_image)
-            
-        # Draw the enemy on the canvas at the current position
-        enemy_image = self.enemy_sprites[self.enemy_direction][self.current_frame]
-        self.canvas.create_image(self.enemy_x * self.tile_size, self.enemy_y * self.tile_size, anchor=tk.NW, image=enemy_image)
-       
-        self.last_position = (self.enemy_x, self.enemy_y)
+        # Move the enemy's sprite to the current tile's isometric position
+        current_tile = self.tile_index.tile_at_grid(self.enemy_x, self.enemy_y)
+        if current_tile:
+            enemy_image = self.enemy_sprites[self.enemy_direction][self.current_frame]
+            self.sprite_layer.update(self.sprite_key, enemy_image, current_tile['x'], current_tile['y'])
+        
+    def chase(self, pathfinder, target_x, target_y):
+        """
+        Ask the pathfinding service for a path to (target_x, target_y); the enemy follows it once found.
+        """
+        pathfinder.request((self.enemy_x, self.enemy_y), (target_x, target_y), self.follow_path)
+        
+    def follow_path(self, path):
+        """
+        Start following a list of (x, y) steps.
+        """
+        self.path = path
+        
+    def step_along_path(self):
+        """
+        Take the next step of the current path. Drops the path if the step is no longer possible.
+        """
+        next_x, next_y = self.path.pop(0)
+        direction = STEP_DIRECTIONS.get((next_x - self.enemy_x, next_y - self.enemy_y))
+        if direction is None or not self.is_walkable(next_x, next_y):
+            self.path = []
+            return
+        self.move(direction)
         
-    def animate_enemy(self):
+    def update(self, dt):
         """
-        Animate the enemy by cycling through frames.
+        Follow the current path and advance the animation by dt seconds. Called by the game loop on every simulation step.
         """
-        self.current_frame = (self.current_frame + 1) % 8 # Cycle through 8 frames
-        self.draw_enemy()
+        if self.path:
+            self.step_time += dt
+            if self.step_time >= STEP_DURATION:
+                self.step_time -= STEP_DURATION
+                self.step_along_path()
+        else:
+            self.step_time = 0.0
+            
+        if not self.animation_running:
+            return
+        
+        # Stop a short while after the last move
+        self.animation_time_left -= dt
+        if self.animation_time_left <= 0:
+            self.stop_animation()
+            return
         
-        if self.animation_running:
-            self.canvas.after(100, self.animate_enemy) # 100 ms delay for each frame
+        self.frame_time += dt
+        while self.frame_time >= FRAME_DURATION:
+            self.frame_time -= FRAME_DURATION
+            self.current_frame = (self.current_frame + 1) % 8 # Cycle through 8 frames
             
     def start_animation(self):
         """
@@ -72,10 +118,11 @@ class Enemy:
         """
         if not self.animation_running:
             self.animation_running = True
-            self.animate_enemy
+            self.frame_time = 0.0
+            self.current_frame = (self.current_frame + 1) % 8
             
-        # Automatically stop animation after a short delay
-        self.canvas.after(800, self.stop_animation) # Stop after 800 ms
+        # Another move while animating only pushes the stop time back instead of stacking timers
+        self.animation_time_left = ANIMATION_DURATION
         
     def stop_animation(self):
         """
@@ -83,33 +130,33 @@ class Enemy:
         """
         self.animation_running = False
         self.current_frame = 0
-        self.draw_enemy()
         
     def is_walkable(self, x, y):
         """
-        Check if the tile at (x, y) is walkable. A tile is walkable if it is not water.
+        Check if the tile at (x, y) is walkable. A tile is walkable if it is not water and no other actor stands on it.
         """
-        if 0 <= x < self.size and 0 <= y < self.size:
-            elevation = self.terrain[y, x]
-            return elevation >= 0.2 and elevation < 0.8  # Walkable if elevation is not water
-        return False
+        if self.spatial_hash is not None and self.spatial_hash.occupied(x, y, ignore=self.sprite_key):
+            return False
+        return self.chunk_manager.is_walkable(x, y)
 
         
     def move(self, direction):
         """
         Move the enemy in the given direction, if the target tile is walkable.
         """
-        if direction == 'up' and self.enemy_y > 0 and self.is_walkable(self.enemy_x, self.enemy_y - 1):
+        if direction == 'up' and self.is_walkable(self.enemy_x, self.enemy_y - 1):
             self.enemy_y -= 1
             self.enemy_direction = 'up'
-        elif direction == 'down' and self.enemy_y < self.canvas.winfo_height() - 1 and self.is_walkable(self.enemy_x, self.enemy_y + 1):
+        elif direction == 'down' and self.is_walkable(self.enemy_x, self.enemy_y + 1):
             self.enemy_y += 1
             self.enemy_direction = 'down'
-        elif direction == 'left' and self.enemy_x > 0 and self.is_walkable(self.enemy_x - 1, self.enemy_y):
+        elif direction == 'left' and self.is_walkable(self.enemy_x - 1, self.enemy_y):
             self.enemy_x -= 1
             self.enemy_direction = 'left'
-        elif direction == 'right' and self.enemy_x < self.canvas.winfo_width() - 1 and self.is_walkable(self.enemy_x + 1, self.enemy_y):
+        elif direction == 'right' and self.is_walkable(self.enemy_x + 1, self.enemy_y):
             self.enemy_x += 1
             self.enemy_direction = 'right'
+        if self.spatial_hash is not None:
+            self.spatial_hash.move(self.sprite_key, self.enemy_x, self.enemy_y)
             
         self.start_animation()
\ No newline at end of file
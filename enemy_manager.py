@@ -0,0 +1,257 @@
+import numpy as np
+from assets import default_assets
+from character import FRAME_DURATION, ANIMATION_DURATION
+from enemy import STEP_DURATION
+from pathfinding import NEIGHBOURS
+
+# Walk animation asset of each enemy type, one per isometric facing (see assets.register_default_assets)
+ENEMY_TYPES = {
+    'badger': "badger_walk_{facing}",
+    'stag': "stag_walk_{facing}",
+    'boar': "boar_run_{facing}"
+}
+
+# Direction IDs stored per enemy, and the isometric facing each one is drawn with
+DIRECTIONS = ('down', 'up', 'left', 'right')
+FACINGS = {'down': 'SW', 'up': 'NE', 'left': 'NW', 'right': 'SE'}
+
+# Direction ID of each step in NEIGHBOURS
+NEIGHBOUR_DIRECTIONS = np.array([DIRECTIONS.index(direction) for direction in ('up', 'down', 'left', 'right')])
+
+# Enemy states
+IDLE = 0
+CHASE = 1
+
+# Idle enemies this close to the character (in tiles) start chasing it; chasers farther than the leash give up
+AGGRO_RADIUS = 12
+LEASH_RADIUS = 24
+
+
+def load_enemy_type(type_name, assets):
+    """
+    Take the frames of an enemy type from the asset manager; every enemy of the type shares them.
+
+    :return: List indexed by direction ID of lists of frames
+    """
+    return [assets.acquire_frames(ENEMY_TYPES[type_name].format(facing=FACINGS[direction]))
+            for direction in DIRECTIONS]
+
+
+class EnemyManager:
+    """
+    All enemies in one structure of NumPy arrays, updated in vectorized batches.
+
+    Instead of one Enemy object per actor, positions, directions, animation frames and states live
+    in parallel arrays indexed by enemy ID. Movement and animation for every enemy are computed with
+    array operations each simulation step, and only enemies whose position or frame changed are sent
+    to the sprite layer when drawing.
+    """
+    def __init__(self, walkability, pathfinder, sprite_layer, tile_width, tile_height, capacity=64, chase_nodes=4096, assets=None,
+                 spatial_hash=None):
+        """
+        :param walkability: WalkabilityGrid used for vectorized collision checks
+        :param pathfinder: PathfindingService providing the flow field towards the chase target
+        :param sprite_layer: SpriteLayer the enemies are drawn on
+        :param tile_width: Isometric tile width in pixels
+        :param tile_height: Isometric tile height in pixels
+        :param capacity: Initial array size; arrays double when full
+        :param chase_nodes: Most tiles searched for the flow field around the chase target
+        :param assets: AssetManager the sprite frames come from, defaults to the shared one
+        :param spatial_hash: Optional SpatialHash the enemies are kept in, so they do not walk onto occupied tiles
+        """
+        self.walkability = walkability
+        self.pathfinder = pathfinder
+        self.sprite_layer = sprite_layer
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.type_names = [] # Type ID -> type name
+        self.type_frames = [] # Type ID -> shared frames
+        self.frame_counts = np.zeros(0, dtype=np.int32) # Type ID -> frames per direction
+        self.count = 0 # Enemies allocated (including despawned slots)
+        self.target = None # Grid position enemies in the CHASE state move towards
+        self.chase_nodes = chase_nodes
+        self.assets = assets or default_assets()
+        self.spatial_hash = spatial_hash
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        def grow(array, dtype, fill=0):
+            new = np.full(capacity, fill, dtype=dtype)
+            if array is not None:
+                new[:len(array)] = array
+            return new
+
+        current = getattr(self, 'x', None)
+        self.x = grow(current, np.int32)
+        self.y = grow(getattr(self, 'y', None), np.int32)
+        self.direction = grow(getattr(self, 'direction', None), np.uint8)
+        self.frame = grow(getattr(self, 'frame', None), np.int32)
+        self.frame_time = grow(getattr(self, 'frame_time', None), np.float32)
+        self.animation_time_left = grow(getattr(self, 'animation_time_left', None), np.float32)
+        self.step_time = grow(getattr(self, 'step_time', None), np.float32)
+        self.state = grow(getattr(self, 'state', None), np.uint8)
+        self.type_id = grow(getattr(self, 'type_id', None), np.uint8)
+        self.alive = grow(getattr(self, 'alive', None), bool, False)
+        # Last (x, y, direction, frame) sent to the sprite layer, to draw only what changed
+        self.drawn = np.full((capacity, 4), -1, dtype=np.int32) if current is None else \
+            np.vstack([self.drawn, np.full((capacity - len(self.drawn), 4), -1, dtype=np.int32)])
+
+    def __len__(self):
+        return int(self.alive[:self.count].sum())
+
+    def type_id_for(self, type_name):
+        """
+        Get the ID of an enemy type, loading its shared frames the first time it is used.
+        """
+        if type_name not in self.type_names:
+            frames = load_enemy_type(type_name, self.assets)
+            self.type_names.append(type_name)
+            self.type_frames.append(frames)
+            self.frame_counts = np.append(self.frame_counts, len(frames[0]))
+        return self.type_names.index(type_name)
+
+    def spawn(self, type_name, x, y, state=CHASE):
+        """
+        Add an enemy at grid position (x, y).
+
+        :return: The new enemy's ID
+        """
+        type_id = self.type_id_for(type_name)
+        if self.count == len(self.x):
+            self._allocate(2 * len(self.x))
+        index = self.count
+        self.count += 1
+        self.x[index] = x
+        self.y[index] = y
+        self.direction[index] = 0
+        self.frame[index] = 0
+        self.frame_time[index] = 0
+        self.animation_time_left[index] = 0
+        self.step_time[index] = 0
+        self.state[index] = state
+        self.type_id[index] = type_id
+        self.alive[index] = True
+        self.drawn[index] = -1
+        if self.spatial_hash is not None:
+            self.spatial_hash.insert(self.sprite_key(index), x, y)
+        return index
+
+    def despawn(self, index):
+        """
+        Remove an enemy and its sprite.
+        """
+        self.alive[index] = False
+        self.sprite_layer.remove(self.sprite_key(index))
+        if self.spatial_hash is not None:
+            self.spatial_hash.remove(self.sprite_key(index))
+
+    @staticmethod
+    def sprite_key(index):
+        return f"enemy_{index}"
+
+    def chase(self, x, y):
+        """
+        Set the grid position every chasing enemy moves towards.
+        """
+        self.target = (x, y)
+
+    def aggro(self, x, y, radius, leash=None):
+        """
+        Wake the idle enemies within `radius` tiles of (x, y) to chase, and send chasing ones
+        farther than `leash` tiles back to idle. Needs the spatial hash; only nearby enemies are visited.
+
+        :return: Number of enemies that started chasing
+        """
+        woken = 0
+        for key in self.spatial_hash.query_radius(x, y, radius):
+            if not key.startswith("enemy_"):
+                continue
+            index = int(key[len("enemy_"):])
+            if self.state[index] == IDLE:
+                self.state[index] = CHASE
+                woken += 1
+        if leash is not None:
+            n = self.count
+            far = self.alive[:n] & (self.state[:n] == CHASE) & \
+                ((self.x[:n] - x) ** 2 + (self.y[:n] - y) ** 2 > leash * leash)
+            self.state[:n][far] = IDLE
+        return woken
+
+    def update(self, dt):
+        """
+        Advance movement and animation of every enemy by dt seconds. Called by the game loop.
+        """
+        n = self.count
+        if n == 0:
+            return
+        alive = self.alive[:n]
+
+        # Animation: advance frames while the walk animation is playing, reset when it ends
+        animating = alive & (self.animation_time_left[:n] > 0)
+        self.frame_time[:n][animating] += dt
+        advance = np.floor(self.frame_time[:n] / FRAME_DURATION).astype(np.int32) * animating
+        self.frame_time[:n] -= advance * FRAME_DURATION
+        frame_counts = self.frame_counts[self.type_id[:n]]
+        self.frame[:n] = (self.frame[:n] + advance) % frame_counts
+        self.animation_time_left[:n][animating] -= dt
+        stopped = animating & (self.animation_time_left[:n] <= 0)
+        self.frame[:n][stopped] = 0
+        self.frame_time[:n][stopped] = 0
+
+        # Movement: chasing enemies take one step every STEP_DURATION down the flow field
+        if self.target is None:
+            return
+        chasing = alive & (self.state[:n] == CHASE)
+        self.step_time[:n][chasing] += dt
+        due = np.flatnonzero(chasing & (self.step_time[:n] >= STEP_DURATION))
+        if len(due) == 0:
+            return
+        self.step_time[due] -= STEP_DURATION
+
+        field = self.pathfinder.flow_field(self.target, self.chase_nodes)
+        steps = field.next_steps(self.x[due], self.y[due])
+        moving = steps >= 0
+        due = due[moving]
+        steps = steps[moving]
+        if len(due) == 0:
+            return
+
+        offsets = np.array(NEIGHBOURS)[steps]
+        new_x = self.x[due] + offsets[:, 0]
+        new_y = self.y[due] + offsets[:, 1]
+
+        # Collision with the terrain, checked for the whole batch at once
+        walkable = self.walkability.costs_at(new_x, new_y) != np.inf
+        if self.spatial_hash is not None:
+            # Collision with other actors, one mover at a time so two enemies never step onto the same tile
+            for i in np.flatnonzero(walkable).tolist():
+                key = self.sprite_key(int(due[i]))
+                if self.spatial_hash.occupied(int(new_x[i]), int(new_y[i]), ignore=key):
+                    walkable[i] = False
+                else:
+                    self.spatial_hash.move(key, int(new_x[i]), int(new_y[i]))
+        due = due[walkable]
+        self.x[due] = new_x[walkable]
+        self.y[due] = new_y[walkable]
+        self.direction[due] = NEIGHBOUR_DIRECTIONS[steps[walkable]]
+        self.animation_time_left[due] = ANIMATION_DURATION
+
+    def draw(self):
+        """
+        Queue sprite updates for the enemies whose position, direction or frame changed. Called by the game loop.
+        """
+        n = self.count
+        if n == 0:
+            return
+        state = np.stack([self.x[:n], self.y[:n], self.direction[:n], self.frame[:n]], axis=1)
+        changed = np.flatnonzero(self.alive[:n] & (state != self.drawn[:n]).any(axis=1))
+        if len(changed) == 0:
+            return
+
+        # Convert (x, y) grid coordinates to isometric coordinates for the whole batch
+        iso_x = (self.x[changed] - self.y[changed]) * (self.tile_width // 2)
+        iso_y = (self.x[changed] + self.y[changed]) * (self.tile_height // 2)
+        for index, px, py in zip(changed.tolist(), iso_x.tolist(), iso_y.tolist()):
+            image = self.type_frames[self.type_id[index]][self.direction[index]][self.frame[index]]
+            self.sprite_layer.update(self.sprite_key(index), image, px, py)
+        self.drawn[changed] = state[changed]
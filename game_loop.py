@@ -0,0 +1,227 @@
+import time
+from collections import deque
+
+
+class FrameStats:
+    """
+    Rolling frame-time statistics, broken down by phase and by registered callback.
+    """
+    def __init__(self, history=240):
+        """
+        :param history: Number of recent frames kept
+        """
+        self.frame_times = deque(maxlen=history) # Seconds between consecutive rendered frames
+        self.phase_times = {} # phase name -> deque of seconds spent per frame
+        self.callback_times = {} # callback name -> deque of seconds spent per frame
+        self.history = history
+        self.frames = 0
+        self.updates = 0
+        self.dropped_updates = 0
+
+    def record_phase(self, name, seconds):
+        self.phase_times.setdefault(name, deque(maxlen=self.history)).append(seconds)
+
+    def record_callback(self, name, seconds):
+        self.callback_times.setdefault(name, deque(maxlen=self.history)).append(seconds)
+
+    @staticmethod
+    def _summarize(samples):
+        if not samples:
+            return {'avg_ms': 0.0, 'max_ms': 0.0, 'p95_ms': 0.0}
+        ordered = sorted(samples)
+        return {
+            'avg_ms': 1000 * sum(ordered) / len(ordered),
+            'max_ms': 1000 * ordered[-1],
+            'p95_ms': 1000 * ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        }
+
+    def summary(self):
+        """
+        Get averages, maxima and 95th percentiles of the recent frames.
+
+        :return: Dictionary with overall 'fps', 'frame', per-'phases' and per-'callbacks' timings
+        """
+        frame = self._summarize(self.frame_times)
+        return {
+            'fps': 1000 / frame['avg_ms'] if frame['avg_ms'] else 0.0,
+            'frames': self.frames,
+            'updates': self.updates,
+            'dropped_updates': self.dropped_updates,
+            'frame': frame,
+            'phases': {name: self._summarize(samples) for name, samples in self.phase_times.items()},
+            'callbacks': {name: self._summarize(samples) for name, samples in self.callback_times.items()}
+        }
+
+    def report(self):
+        """
+        Format the summary as a few lines of text.
+        """
+        summary = self.summary()
+        lines = [f"{summary['fps']:.1f} fps, frame avg {summary['frame']['avg_ms']:.2f} ms, "
+                 f"p95 {summary['frame']['p95_ms']:.2f} ms, max {summary['frame']['max_ms']:.2f} ms"]
+        for group in ('phases', 'callbacks'):
+            for name, timing in summary[group].items():
+                lines.append(f"  {name}: avg {timing['avg_ms']:.3f} ms, max {timing['max_ms']:.3f} ms")
+        return "\n".join(lines)
+
+
+class GameLoop:
+    """
+    Central game loop with a fixed simulation timestep and a separate render rate.
+
+    Actors register update(dt) and draw() callbacks instead of scheduling their own timers.
+    Input is posted to the loop and coalesced, so each kind of input is handled at most once
+    per tick with its latest value no matter how fast keys repeat.
+    """
+    def __init__(self, widget, timestep=1 / 60, render_interval=1 / 30, max_steps=5):
+        """
+        :param widget: Tk widget whose `after` drives the loop
+        :param timestep: Simulation step in seconds
+        :param render_interval: Minimum time between rendered frames in seconds
+        :param max_steps: Most simulation steps run in one tick before the loop drops time to catch up
+        """
+        self.widget = widget
+        self.timestep = timestep
+        self.render_interval = render_interval
+        self.max_steps = max_steps
+        self.updates = [] # (name, callback(dt))
+        self.draws = [] # (name, callback())
+        self.input_handlers = {} # input kind -> callback(value)
+        self.pending_input = {} # input kind -> latest value since the last tick
+        self.stats = FrameStats()
+        self.profiler = None # Optional profiler.Profiler, fed every callback's timing and the frame boundaries
+        self.running = False
+        self.after_id = None
+        self.accumulator = 0.0
+        self.last_time = None
+        self.last_render = None
+        self.due_time = None # When the scheduled tick should run, to measure how late `after` fires
+
+    def register(self, name, update=None, draw=None):
+        """
+        Register an actor's callbacks.
+
+        :param name: Label used in the frame statistics
+        :param update: Called with the timestep in seconds on every simulation step
+        :param draw: Called once per rendered frame
+        """
+        if update is not None:
+            self.updates.append((name, update))
+        if draw is not None:
+            self.draws.append((name, draw))
+
+    def unregister(self, name):
+        """
+        Remove every callback registered under a name.
+        """
+        self.updates = [entry for entry in self.updates if entry[0] != name]
+        self.draws = [entry for entry in self.draws if entry[0] != name]
+
+    def on_input(self, kind, handler):
+        """
+        Set the handler for one kind of input (e.g. 'move').
+        """
+        self.input_handlers[kind] = handler
+
+    def post_input(self, kind, value):
+        """
+        Queue input for the next tick; a newer value of the same kind replaces an unhandled older one.
+        """
+        self.pending_input[kind] = value
+
+    def start(self):
+        """
+        Start ticking.
+        """
+        if self.running:
+            return
+        self.running = True
+        self.last_time = time.perf_counter()
+        self.last_render = None
+        self.accumulator = 0.0
+        self.after_id = self.widget.after(0, self.tick)
+
+    def stop(self):
+        """
+        Stop ticking.
+        """
+        self.running = False
+        if self.after_id is not None:
+            self.widget.after_cancel(self.after_id)
+            self.after_id = None
+
+    def _timed(self, name, callback, *args):
+        start = time.perf_counter()
+        callback(*args)
+        end = time.perf_counter()
+        self.stats.record_callback(name, end - start)
+        if self.profiler is not None:
+            self.profiler.record(name, start, end)
+
+    def step(self, elapsed):
+        """
+        Advance the game by `elapsed` seconds of wall time: handle input, run the fixed simulation steps that fit.
+
+        :return: Number of simulation steps run
+        """
+        self.accumulator += elapsed
+
+        start = time.perf_counter()
+        pending, self.pending_input = self.pending_input, {}
+        for kind, value in pending.items():
+            handler = self.input_handlers.get(kind)
+            if handler is not None:
+                self._timed(f"input:{kind}", handler, value)
+        self.stats.record_phase('input', time.perf_counter() - start)
+
+        start = time.perf_counter()
+        steps = 0
+        while self.accumulator >= self.timestep and steps < self.max_steps:
+            for name, update in self.updates:
+                self._timed(f"update:{name}", update, self.timestep)
+            self.accumulator -= self.timestep
+            steps += 1
+        if self.accumulator >= self.timestep:
+            # Too far behind: drop the backlog rather than spiral into ever longer ticks
+            self.stats.dropped_updates += int(self.accumulator / self.timestep)
+            self.accumulator %= self.timestep
+        self.stats.updates += steps
+        self.stats.record_phase('update', time.perf_counter() - start)
+        return steps
+
+    def render(self):
+        """
+        Run every draw callback once.
+        """
+        start = time.perf_counter()
+        for name, draw in self.draws:
+            self._timed(f"draw:{name}", draw)
+        self.stats.record_phase('render', time.perf_counter() - start)
+        self.stats.frames += 1
+        if self.profiler is not None:
+            self.profiler.end_frame()
+
+    def tick(self):
+        """
+        One pass of the loop, scheduled through `after`.
+        """
+        if not self.running:
+            return
+        now = time.perf_counter()
+        if self.profiler is not None and self.due_time is not None:
+            self.profiler.count('timer_late_ms', 1000 * max(0.0, now - self.due_time))
+        self.step(now - self.last_time)
+        self.last_time = now
+
+        if self.last_render is None or now - self.last_render >= self.render_interval:
+            if self.last_render is not None:
+                self.stats.frame_times.append(now - self.last_render)
+            self.last_render = now
+            self.render()
+
+        # Sleep until the next simulation step or frame is due
+        next_update = self.timestep - self.accumulator
+        next_render = self.render_interval - (time.perf_counter() - self.last_render)
+        delay = max(1, int(1000 * min(next_update, next_render)))
+        self.due_time = time.perf_counter() + delay / 1000
+        self.after_id = self.widget.after(delay, self.tick)
@@ -0,0 +1,217 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+from collections import OrderedDict
+import numpy as np
+from terrain_noise import generate_noise_map, generate_noise_tile
+
+# Bump when the noise code changes its output, so entries made by older code are never reused
+GENERATOR_VERSION = 1
+DEFAULT_CACHE_DIRECTORY = "cache/terrain"
+
+
+def generate(params, workers=None):
+    """
+    Compute what a cache entry holds from its parameters.
+
+    :param params: Dictionary with 'kind' ('noise_map' for generate_noise_map, 'noise_tile' for
+        generate_noise_tile) and that function's keyword arguments
+    :param workers: Worker processes for noise maps; not part of the key since it does not change the result
+    """
+    params = dict(params)
+    kind = params.pop('kind')
+    if kind == 'noise_map':
+        return generate_noise_map(workers=workers, **params)
+    if kind == 'noise_tile':
+        return generate_noise_tile(**params)
+    raise ValueError(f"Unknown generation kind {kind!r}")
+
+
+class GenerationCache:
+    """
+    On-disk cache of generated terrain arrays, keyed by every parameter that affects the result.
+
+    Each entry is an .npy file named after a hash of its parameters, with the parameters next to it
+    in a .json file. Hits refresh the entry's modification time, and once the cache is over its
+    size or entry limit the least recently used entries are deleted. In verify mode every hit is
+    regenerated and compared bit for bit; a mismatching entry is replaced by the fresh result.
+
+    The directory is scanned once, when the cache is created; from then on the entries and their
+    total size are tracked in memory, so storing an entry does not list the whole directory.
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIRECTORY, max_bytes=256 * 1024 * 1024, max_entries=64, verify=False):
+        """
+        :param directory: Directory holding the entries
+        :param max_bytes: Most bytes of arrays kept
+        :param max_entries: Most entries kept
+        :param verify: Regenerate every hit and check it matches
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.verify = verify
+        self.hits = 0
+        self.misses = 0
+        self.mismatches = 0
+        self.index = OrderedDict((key, size) for _, size, key in self.entries()) # key -> bytes, least recently used first
+        self.total_bytes = sum(self.index.values())
+
+    @staticmethod
+    def key(params):
+        """
+        Stable hash of an entry's parameters.
+        """
+        encoded = json.dumps({'version': GENERATOR_VERSION, 'params': params}, sort_keys=True)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:32]
+
+    def path(self, key, extension=".npy"):
+        return os.path.join(self.directory, key + extension)
+
+    def get(self, params):
+        """
+        Get a cached array, or None if there is no entry for these parameters.
+        """
+        key = self.key(params)
+        path = self.path(key)
+        try:
+            array = np.load(path)
+        except (OSError, ValueError):
+            self._forget(key)
+            return None
+        os.utime(path) # Mark as recently used
+        if key in self.index:
+            self.index.move_to_end(key)
+        else:
+            # Stored by another cache on the same directory
+            self._track(key)
+        return array
+
+    def put(self, params, array):
+        """
+        Store an array, then evict old entries if the cache is over its limits.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        key = self.key(params)
+        # Write to temporary files and swap them in, so readers never see a partial entry
+        temp_path = self.path(key, ".tmp.npy")
+        np.save(temp_path, array)
+        with open(self.path(key, ".json.tmp"), 'w') as file:
+            json.dump(params, file, sort_keys=True)
+        os.replace(self.path(key, ".json.tmp"), self.path(key, ".json"))
+        os.replace(temp_path, self.path(key))
+        self._track(key)
+        self.evict()
+
+    def get_or_generate(self, params, workers=None):
+        """
+        Get the array for these parameters from the cache, generating and storing it on a miss.
+        """
+        array = self.get(params)
+        if array is None:
+            self.misses += 1
+            array = generate(params, workers)
+            self.put(params, array)
+            return array
+
+        self.hits += 1
+        if self.verify:
+            fresh = generate(params, workers)
+            if not self.matches(array, fresh):
+                self.mismatches += 1
+                self.put(params, fresh)
+                return fresh
+        return array
+
+    @staticmethod
+    def matches(cached, fresh):
+        """
+        Check two arrays are identical bit for bit (NaNs included).
+        """
+        return cached.dtype == fresh.dtype and cached.shape == fresh.shape and \
+            cached.tobytes() == np.ascontiguousarray(fresh).tobytes()
+
+    def entries(self):
+        """
+        List the cached entries, least recently used first.
+
+        :return: List of (modification time, size in bytes, key)
+        """
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, "*.npy")):
+            if path.endswith(".tmp.npy"):
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, os.path.basename(path)[:-len(".npy")]))
+        return sorted(entries)
+
+    def remove(self, key):
+        for extension in (".npy", ".json"):
+            if os.path.exists(self.path(key, extension)):
+                os.remove(self.path(key, extension))
+        self._forget(key)
+
+    def _track(self, key):
+        self._forget(key)
+        self.index[key] = os.path.getsize(self.path(key))
+        self.total_bytes += self.index[key]
+
+    def _forget(self, key):
+        self.total_bytes -= self.index.pop(key, 0)
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the cache is within its limits.
+
+        :return: Number of entries deleted
+        """
+        removed = 0
+        while self.index and (self.total_bytes > self.max_bytes or len(self.index) > self.max_entries):
+            self.remove(next(iter(self.index)))
+            removed += 1
+        return removed
+
+    def verify_all(self, workers=None):
+        """
+        Regenerate every cached entry and compare it bit for bit with the stored array.
+        Mismatching entries are deleted.
+
+        :return: List of (key, params) of the entries that did not match
+        """
+        mismatched = []
+        for _, _, key in self.entries():
+            try:
+                with open(self.path(key, ".json")) as file:
+                    params = json.load(file)
+                cached = np.load(self.path(key))
+            except (OSError, ValueError):
+                self.remove(key)
+                continue
+            if not self.matches(cached, generate(params, workers)):
+                mismatched.append((key, params))
+                self.remove(key)
+        return mismatched
+
+    def clear(self):
+        for _, _, key in self.entries():
+            self.remove(key)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect or verify the terrain generation cache.")
+    parser.add_argument('--directory', default=DEFAULT_CACHE_DIRECTORY, help="Cache directory")
+    parser.add_argument('--verify', action='store_true', help="Regenerate every entry and compare bit for bit")
+    parser.add_argument('--clear', action='store_true', help="Delete every entry")
+    args = parser.parse_args()
+
+    cache = GenerationCache(args.directory)
+    entries = cache.entries()
+    print(f"{len(entries)} entries, {sum(size for _, size, _ in entries) / 2 ** 20:.1f} MiB in {args.directory}")
+    if args.verify:
+        mismatched = cache.verify_all()
+        for key, params in mismatched:
+            print(f"mismatch {key}: {params}")
+        print(f"{len(entries) - len(mismatched)} of {len(entries)} entries match fresh generation")
+    if args.clear:
+        cache.clear()
@@ -0,0 +1,287 @@
+import time
+import numpy as np
+from assets import AssetManager, register_default_assets
+from chunk_manager import ChunkManager
+from tile_index import TileIndex
+from viewport import ViewportRenderer
+from sprite_layer import SpriteLayer
+from game_loop import GameLoop
+from pathfinding import WalkabilityGrid, PathfindingService
+from character import Character
+from enemy_manager import EnemyManager, IDLE, AGGRO_RADIUS, LEASH_RADIUS
+from spatial_hash import SpatialHash
+from map_generation import generate_isometric_map, create_terrain_image_map
+from profiler import instrument_game
+
+# Moves the simulated player picks from
+MOVES = ('up', 'down', 'left', 'right')
+
+
+class HeadlessImage:
+    """
+    Stand-in for a PhotoImage: keeps only the size, so no display is needed.
+    """
+    def __init__(self, image):
+        self.size = image.size
+
+    def width(self):
+        return self.size[0]
+
+    def height(self):
+        return self.size[1]
+
+
+class HeadlessPhoto:
+    """
+    Stand-in for a blank tkinter.PhotoImage that counts the pixels written with `put`.
+    """
+    def __init__(self, width, height):
+        self.size = (width, height)
+        self.puts = 0
+        self.pixels_put = 0
+
+    def width(self):
+        return self.size[0]
+
+    def height(self):
+        return self.size[1]
+
+    def put(self, data, to=(0, 0)):
+        self.puts += 1
+        self.pixels_put += data.count('#')
+
+
+class HeadlessCanvas:
+    """
+    In-memory stand-in for the parts of tkinter.Canvas the engine uses.
+
+    Items are kept in a dictionary, and scrolling moves a view rectangle the same way a canvas
+    with a scroll region does, so the viewport and sprite layer behave as they do on screen.
+    """
+    def __init__(self, width=640, height=480):
+        self.width = width
+        self.height = height
+        self.items = {} # item id -> {'coords', 'options'}
+        self.next_item = 1
+        self.scrollregion = (0, 0, width, height)
+        self.view_x = 0
+        self.view_y = 0
+        self.images_created = 0
+
+    def create_image(self, x, y, **options):
+        item = self.next_item
+        self.next_item += 1
+        self.items[item] = {'coords': (x, y), 'options': options}
+        self.images_created += 1
+        return item
+
+    def _find(self, tag_or_id):
+        if tag_or_id in self.items:
+            return [tag_or_id]
+        return [item for item, entry in self.items.items()
+                if tag_or_id == 'all' or tag_or_id in entry['options'].get('tags', ())]
+
+    def coords(self, item, *coords):
+        if coords:
+            self.items[item]['coords'] = coords
+        return self.items[item]['coords']
+
+    def itemconfig(self, tag_or_id, **options):
+        for item in self._find(tag_or_id):
+            self.items[item]['options'].update(options)
+
+    def delete(self, tag_or_id):
+        for item in self._find(tag_or_id):
+            del self.items[item]
+
+    def tag_raise(self, *args):
+        pass
+
+    def tag_lower(self, *args):
+        pass
+
+    def find_all(self):
+        return tuple(self.items)
+
+    def config(self, scrollregion=None, **options):
+        if scrollregion is not None:
+            self.scrollregion = tuple(scrollregion)
+
+    def winfo_width(self):
+        return self.width
+
+    def winfo_height(self):
+        return self.height
+
+    def canvasx(self, x):
+        return self.view_x + x
+
+    def canvasy(self, y):
+        return self.view_y + y
+
+    def xview_moveto(self, fraction):
+        left, _, right, _ = self.scrollregion
+        self.view_x = left + fraction * (right - left)
+
+    def yview_moveto(self, fraction):
+        _, top, _, bottom = self.scrollregion
+        self.view_y = top + fraction * (bottom - top)
+
+    def xview_scroll(self, amount, what):
+        self.view_x += amount
+
+    def yview_scroll(self, amount, what):
+        self.view_y += amount
+
+
+class HeadlessTimer:
+    """
+    Widget stand-in for GameLoop: nothing is scheduled, the simulation is stepped by hand.
+    """
+    def after(self, delay, callback=None):
+        return None
+
+    def after_cancel(self, after_id):
+        pass
+
+
+class HeadlessGame:
+    """
+    The game without a display: terrain, character, enemies, pathfinding and rendering
+    bookkeeping wired as in TerrainMapApp, driven tick by tick by `simulate`.
+    """
+    def __init__(self, size=60, infinite=False, chunk_size=16, enemy_count=0, seed=None, render=True,
+                 canvas_width=640, canvas_height=480, assets=None, profiler=None):
+        """
+        :param size: World size in tiles (ignored for infinite worlds)
+        :param infinite: Generate an unbounded world instead of a size x size one
+        :param chunk_size: Width and height of a terrain chunk
+        :param enemy_count: Number of enemies spawned around the character
+        :param seed: Seed of the terrain, None for the classic terrain
+        :param render: Run the viewport and sprite layer against a HeadlessCanvas every frame
+        :param canvas_width: Width of the simulated view in pixels
+        :param canvas_height: Height of the simulated view in pixels
+        :param assets: AssetManager to share between games; one with stand-in images is made if None
+        :param profiler: Optional profiler.Profiler to instrument the game with
+        """
+        self.tile_width = 32
+        self.tile_height = 32
+        self.canvas = HeadlessCanvas(canvas_width, canvas_height)
+        self.assets = assets or register_default_assets(AssetManager(photo_factory=HeadlessImage))
+        self.terrain_image_map = create_terrain_image_map(self.assets)
+
+        self.chunks = ChunkManager(chunk_size=chunk_size, bounds=None if infinite else size, seed=seed)
+        self.chunks.on_load = self.build_chunk_tiles
+        self.chunks.on_evict = self.erase_chunk
+        self.chunks.on_change = self.retile_chunk
+        self.tile_index = TileIndex(self.tile_width, self.tile_height, chunk_size, loader=self.chunks.chunk_at)
+        self.viewport = ViewportRenderer(self.canvas, self.chunks, self.tile_index, self.tile_width, self.tile_height) if render else None
+
+        self.walkability = WalkabilityGrid(self.chunks)
+        self.pathfinder = PathfindingService(self.walkability)
+        self.sprite_layer = SpriteLayer(self.canvas)
+
+        self.character = Character(size, 32, self.canvas, self.chunks, self.tile_index, "character_spritesheet.png", 24, 32,
+                                   self.tile_width, self.tile_height, sprite_layer=self.sprite_layer, assets=self.assets)
+        self.character.viewport = self.viewport
+        self.chunks.ensure_around(self.character.character_x, self.character.character_y)
+        self.spatial_hash = SpatialHash()
+        self.spatial_hash.insert('character', self.character.character_x, self.character.character_y)
+        self.character.spatial_hash = self.spatial_hash
+
+        self.enemies = EnemyManager(self.walkability, self.pathfinder, self.sprite_layer, self.tile_width, self.tile_height,
+                                    assets=self.assets, spatial_hash=self.spatial_hash)
+        self.spawn_enemies(enemy_count)
+
+        self.loop = GameLoop(HeadlessTimer())
+        self.loop.register('character', update=self.character.update, draw=self.character.draw_character if render else None)
+        self.loop.register('enemies', update=self.update_enemies, draw=self.enemies.draw if render else None)
+        self.loop.register('pathfinding', update=self.pathfinder.process)
+        if render:
+            self.loop.register('sprites', draw=self.sprite_layer.flush)
+        self.loop.on_input('move', self.character.move)
+        self.character.center_view()
+        self.profiler = profiler
+        if profiler is not None:
+            instrument_game(profiler, self)
+
+    def build_chunk_tiles(self, chunk):
+        chunk.isometric_map = generate_isometric_map(None, chunk.elevation, self.terrain_image_map, self.tile_width,
+                                                     self.tile_height, chunk.x0, chunk.y0)
+        self.tile_index.add(chunk.isometric_map)
+        self.pathfinder.refresh_chunk(chunk)
+
+    def erase_chunk(self, chunk):
+        if self.viewport is not None:
+            self.viewport.forget_chunk(chunk)
+        self.pathfinder.refresh_chunk(chunk)
+        if chunk.isometric_map is not None:
+            self.tile_index.remove(chunk.isometric_map)
+        chunk.isometric_map = None
+
+    def retile_chunk(self, chunk, region):
+        x0, y0, x1, y1 = region
+        if chunk.isometric_map is not None:
+            elevation = chunk.elevation[y0 - chunk.y0:y1 - chunk.y0, x0 - chunk.x0:x1 - chunk.x0]
+            changed = chunk.isometric_map.update_region(x0, y0, elevation)
+            if self.viewport is not None:
+                self.viewport.retile(chunk, changed)
+        self.pathfinder.invalidate(region)
+
+    def spawn_enemies(self, count, radius=8, seed=0, size_limit=1024):
+        """
+        Spawn idle enemies on random free walkable tiles around the character, widening the search while none are found.
+        """
+        rng = np.random.default_rng(seed)
+        x0, y0 = self.character.character_x, self.character.character_y
+        types = ('badger', 'stag', 'boar')
+        spawned = 0
+        while spawned < count:
+            xs = rng.integers(x0 - radius, x0 + radius + 1, size=8 * count)
+            ys = rng.integers(y0 - radius, y0 + radius + 1, size=8 * count)
+            walkable = self.walkability.costs_at(xs, ys) != np.inf
+            placed = 0
+            for x, y in zip(xs[walkable].tolist(), ys[walkable].tolist()):
+                if spawned == count:
+                    break
+                if self.spatial_hash.occupied(x, y):
+                    continue
+                self.enemies.spawn(types[spawned % len(types)], x, y, state=IDLE)
+                spawned += 1
+                placed += 1
+            if spawned < count:
+                # The area is full or unwalkable, look farther out
+                if radius > size_limit and not placed:
+                    break
+                radius *= 2
+
+    def update_enemies(self, dt):
+        x, y = self.character.character_x, self.character.character_y
+        self.enemies.aggro(x, y, AGGRO_RADIUS, leash=LEASH_RADIUS)
+        self.enemies.chase(x, y)
+        self.enemies.update(dt)
+
+    def simulate(self, ticks, move_every=4, seed=0):
+        """
+        Run the game for a number of simulation steps with a randomly walking player.
+
+        Each tick runs one fixed timestep of the game loop; frames are rendered at the loop's
+        render rate. No wall-clock waiting is done, so this runs as fast as the engine allows.
+
+        :param ticks: Number of simulation steps
+        :param move_every: Ticks between the player's moves (0 for a player that stands still)
+        :param seed: Seed of the player's random walk
+        :return: Array of seconds spent on each tick
+        """
+        rng = np.random.default_rng(seed)
+        steps_per_frame = max(1, round(self.loop.render_interval / self.loop.timestep))
+        times = np.empty(ticks)
+        for tick in range(ticks):
+            start = time.perf_counter()
+            if move_every and tick % move_every == 0:
+                self.loop.post_input('move', MOVES[rng.integers(len(MOVES))])
+            self.loop.step(self.loop.timestep)
+            if tick % steps_per_frame == 0:
+                self.loop.render()
+            times[tick] = time.perf_counter() - start
+        return times
@@ -1,83 +1,315 @@
 import tkinter as tk
+from items import default_items
 
 class Inventory:
     """
-    Inventory class to manage a character's items.
-    """ 
-    def __init__(self, root):
-        self.items = {}
-        self.inventory_window = None
+    Inventory class to manage a character's items, or the contents of a chest or an enemy's loot.
+
+    Counts are kept per item ID of an ItemRegistry. Every change notifies `on_change`, which the
+    inventory window uses to refresh the rows on screen.
+    """
+    def __init__(self, root=None, registry=None, slots=None):
+        """
+        :param root: Main application window, parent of the inventory window
+        :param registry: ItemRegistry the item IDs come from, defaults to the shared one
+        :param slots: Most stacks the inventory holds (see ItemRegistry.stacks), None for no limit
+        """
+        self.registry = registry or default_items()
+        self.counts = {} # item ID -> count
+        self.slots = slots
+        self.used_slots = 0
+        self.layout_version = 0 # Bumped whenever an item kind appears or disappears
+        self.on_change = None # Called with no arguments after every change
+        self.window = None
         self.root = root # Keep a reference to the main application window.
-        
+
+    def __len__(self):
+        return len(self.counts)
+
+    def count(self, item):
+        return self.counts.get(self.registry.id_of(item), 0)
+
+    def _add(self, item_id, quantity):
+        """
+        Add up to `quantity` items of one kind, as far as the free slots allow.
+
+        :return: Number of items added
+        """
+        count = self.counts.get(item_id, 0)
+        if self.slots is not None:
+            max_stack = self.registry.info(item_id)['max_stack']
+            # Room left in the last partial stack plus in the free slots
+            room = (self.registry.stacks(item_id, count) * max_stack - count) + (self.slots - self.used_slots) * max_stack
+            quantity = min(quantity, room)
+        if quantity <= 0:
+            return 0
+        if count == 0:
+            self.layout_version += 1
+        new_count = count + quantity
+        self.used_slots += self.registry.stacks(item_id, new_count) - self.registry.stacks(item_id, count)
+        self.counts[item_id] = new_count
+        return quantity
+
+    def _remove(self, item_id, quantity):
+        """
+        Remove up to `quantity` items of one kind.
+
+        :return: Number of items removed
+        """
+        count = self.counts.get(item_id, 0)
+        quantity = min(quantity, count)
+        if quantity <= 0:
+            return 0
+        new_count = count - quantity
+        self.used_slots -= self.registry.stacks(item_id, count) - self.registry.stacks(item_id, new_count)
+        if new_count:
+            self.counts[item_id] = new_count
+        else:
+            del self.counts[item_id]
+            self.layout_version += 1
+        return quantity
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
     def add_item(self, item, quantity=1):
         """
         Add an item to the inventory
-        
-        :param item: Item name
+
+        :param item: Item name or ID
         :param quantity: Quantity of the item
+        :return: Quantity actually added (less when the inventory is full)
         """
-        if item in self.items:
-            self.items[item] += quantity
-        else:
-            self.items[item] = quantity
-            
+        added = self._add(self.registry.id_of(item), quantity)
+        self._changed()
+        return added
+
     def remove_item(self, item, quantity=1):
         """
         Remove an item from the inventory.
-        
-        :param item: Item name
+
+        :param item: Item name or ID
         :param quantity: Quantity to remove
+        :return: Quantity actually removed
+        """
+        removed = self._remove(self.registry.id_of(item), quantity)
+        self._changed()
+        return removed
+
+    def add_items(self, items):
+        """
+        Add many items at once, notifying once.
+
+        :param items: Dictionary or iterable of (item name or ID, quantity)
+        :return: Dictionary item ID -> quantity that did not fit
+        """
+        leftover = {}
+        for item, quantity in (items.items() if isinstance(items, dict) else items):
+            item_id = self.registry.id_of(item)
+            added = self._add(item_id, quantity)
+            if added < quantity:
+                leftover[item_id] = leftover.get(item_id, 0) + quantity - added
+        self._changed()
+        return leftover
+
+    def remove_items(self, items):
+        """
+        Remove many items at once, notifying once.
+
+        :param items: Dictionary or iterable of (item name or ID, quantity)
+        :return: Dictionary item ID -> quantity removed
         """
-        if item in self.items:
-            self.items[item] -= quantity
-            if self.items[item] <= 0:
-                del self.items[item]
-                
+        removed = {}
+        for item, quantity in (items.items() if isinstance(items, dict) else items):
+            item_id = self.registry.id_of(item)
+            taken = self._remove(item_id, quantity)
+            if taken:
+                removed[item_id] = removed.get(item_id, 0) + taken
+        self._changed()
+        return removed
+
+    def transfer(self, target, items=None):
+        """
+        Move items into another inventory, e.g. looting a chest. Whatever does not fit stays here.
+
+        :param target: Inventory receiving the items
+        :param items: Dictionary or iterable of (item name or ID, quantity), or None for everything
+        :return: Dictionary item ID -> quantity moved
+        """
+        if items is None:
+            items = list(self.counts.items())
+        taken = self.remove_items(items)
+        leftover = target.add_items(taken)
+        if leftover:
+            self.add_items(leftover)
+        return {item_id: quantity - leftover.get(item_id, 0) for item_id, quantity in taken.items()
+                if quantity > leftover.get(item_id, 0)}
+
     def get_items(self):
         """
         Get all items in the inventory.
-        
-        :return: Dictionary of items and quantities
+
+        :return: Dictionary of item names and quantities
+        """
+        return {self.registry.name(item_id): count for item_id, count in self.counts.items()}
+
+    def set_items(self, items):
         """
-        return self.items 
-    
-    def toggle_inventory(self, event):
+        Replace the contents with the given items (e.g. restored from a save).
+
+        :param items: Dictionary of item names or IDs and quantities
+        """
+        self.counts = {}
+        self.used_slots = 0
+        self.layout_version += 1
+        self.add_items(items)
+
+    def toggle_inventory(self, event=None):
         """
         Toggle the inventory window on and off when the 'i' key is pressed.
         """
-        if self.inventory_window is None:
-            self.show_inventory_overlay()
-        else:
-            self.hide_inventory_overlay()
-            
+        if self.window is None:
+            self.window = InventoryWindow(self.root, self)
+        self.window.toggle()
+
     def show_inventory_overlay(self):
         """
-        Show the inventory in a new window (overlay).
-        """
-        self.inventory_window = tk.Toplevel(self.root)
-        self.inventory_window.title("Inventory")
-        self.inventory_window.geometry("300x200")
-        
-        # Create a label for each item in the inventory
-        inventory_label = tk.Label(self.inventory_window, text="Inventory", font=("Arial", 16))
-        inventory_label.pack(pady=10)
-        
-        items = self.get_items()
-        if items:
-            for item in items:
-                item_label = tk.Label(self.inventory_window, text=item)
-                item_label.pack()
-        else:
-            empty_label = tk.Label(self.inventory_window, text="Inventory is empty")
-            empty_label.pack()
-            
-        # Close the inventory window when it is destroyed
-        self.inventory_window.protocol("WM_DELETE_WINDOW", self.hide_inventory_overlay)
-        
+        Show the inventory window, creating it the first time.
+        """
+        if self.window is None:
+            self.window = InventoryWindow(self.root, self)
+        self.window.show()
+
     def hide_inventory_overlay(self):
         """
-        Hide the inventory window and set it to None.
+        Hide the inventory window. It is kept and shown again as it was.
+        """
+        if self.window is not None:
+            self.window.hide()
+
+
+class InventoryWindow:
+    """
+    Inventory window created once and then only shown, hidden and updated.
+
+    The list is virtualized: a fixed pool of text rows on a canvas shows the items in view, and
+    scrolling or changes only rewrite the rows whose text differs from what they show. Any
+    inventory can be shown, so chests and enemy loot reuse the same window.
+    """
+    def __init__(self, root, inventory, rows=12, row_height=18, width=300):
+        """
+        :param root: Parent window
+        :param inventory: Inventory shown first
+        :param rows: Number of rows visible at once
+        :param row_height: Height of a row in pixels
+        :param width: Width of the list in pixels
+        """
+        self.root = root
+        self.rows = rows
+        self.row_height = row_height
+        self.inventory = None
+        self.order = [] # Item IDs of the shown inventory in display order
+        self.layout_version = None # Inventory layout the order was built from
+        self.first_row = 0 # Index into order of the top visible row
+        self.shown_text = [None] * rows # Text each pooled row currently shows
+        self.sync_pending = False
+        self.visible = False
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Inventory")
+        self.window.withdraw()
+        self.title = tk.Label(self.window, text="Inventory", font=("Arial", 16))
+        self.title.pack(pady=10)
+        self.scrollbar = tk.Scrollbar(self.window, orient=tk.VERTICAL, command=self.scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas = tk.Canvas(self.window, width=width, height=rows * row_height, highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.row_items = [self.canvas.create_text(8, i * row_height + 2, anchor=tk.NW, text="") for i in range(rows)]
+        self.canvas.bind('<MouseWheel>', lambda event: self.scroll('scroll', -1 if event.delta > 0 else 1, 'units'))
+        self.canvas.bind('<Button-4>', lambda event: self.scroll('scroll', -1, 'units'))
+        self.canvas.bind('<Button-5>', lambda event: self.scroll('scroll', 1, 'units'))
+
+        # Closing the window only hides it
+        self.window.protocol("WM_DELETE_WINDOW", self.hide)
+        self.set_inventory(inventory)
+
+    def set_inventory(self, inventory, title="Inventory"):
+        """
+        Show another inventory (e.g. a chest) in the window.
         """
-        if self.inventory_window is not None:
-            self.inventory_window.destroy() 
-            self.inventory_window = None
\ No newline at end of file
+        if self.inventory is not None:
+            self.inventory.on_change = None
+        self.inventory = inventory
+        inventory.on_change = self.request_sync
+        self.title.config(text=title)
+        self.window.title(title)
+        self.layout_version = None
+        self.first_row = 0
+        self.sync()
+
+    def toggle(self, event=None):
+        if self.visible:
+            self.hide()
+        else:
+            self.show()
+
+    def show(self):
+        self.visible = True
+        self.sync()
+        self.window.deiconify()
+
+    def hide(self):
+        self.visible = False
+        self.window.withdraw()
+
+    def request_sync(self):
+        """
+        Schedule one sync for when Tk is idle, however many changes come in before then.
+        """
+        if self.visible and not self.sync_pending:
+            self.sync_pending = True
+            self.window.after_idle(self.sync)
+
+    def row_text(self, item_id):
+        registry = self.inventory.registry
+        count = self.inventory.counts[item_id]
+        stacks = registry.stacks(item_id, count)
+        return f"{registry.name(item_id)}  x{count}" + (f"  ({stacks} stacks)" if stacks > 1 else "")
+
+    def sync(self):
+        """
+        Bring the visible rows up to date, rewriting only the rows whose text changed.
+        """
+        self.sync_pending = False
+        if self.inventory.layout_version != self.layout_version:
+            # Items appeared or disappeared: rebuild the display order, in registration order
+            self.order = sorted(self.inventory.counts)
+            self.layout_version = self.inventory.layout_version
+        self.first_row = max(0, min(self.first_row, len(self.order) - self.rows))
+
+        for row in range(self.rows):
+            index = self.first_row + row
+            if index < len(self.order):
+                text = self.row_text(self.order[index])
+            else:
+                text = "Inventory is empty" if row == 0 and not self.order else ""
+            if text != self.shown_text[row]:
+                self.canvas.itemconfig(self.row_items[row], text=text)
+                self.shown_text[row] = text
+
+        if self.order:
+            self.scrollbar.set(self.first_row / len(self.order), min(1.0, (self.first_row + self.rows) / len(self.order)))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll(self, action, amount, unit=None):
+        """
+        Scrollbar and mouse wheel handler.
+        """
+        if action == 'moveto':
+            self.first_row = int(float(amount) * len(self.order))
+        else:
+            step = self.rows if unit == 'pages' else 1
+            self.first_row += int(amount) * step
+        self.sync()
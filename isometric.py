@@ -1,11 +1,38 @@
 import tkinter as tk
-from PIL import Image
-from map_generation import generate_perlin_noise, generate_isometric_map, create_terrain_image_map
+import numpy as np
+from PIL import Image, ImageTk
+from assets import default_assets
+from asset_bundle import ensure_bundle
+from map_generation import generate_isometric_map, create_terrain_image_map, load_terrain_tiles, classify_elevation
+from tile_map import TERRAIN_TYPES
+from chunk_manager import ChunkManager
+from viewport import ViewportRenderer
+from background import BakedBackground
+from tile_index import TileIndex
+from sprite_layer import SpriteLayer
+from game_loop import GameLoop
+from pathfinding import WalkabilityGrid, PathfindingService
 from character import Character
+from world_save import WorldSave
+from generation_cache import GenerationCache
+from enemy_manager import EnemyManager, IDLE, AGGRO_RADIUS, LEASH_RADIUS
+from spatial_hash import SpatialHash
 from inventory import Inventory
+from profiler import Profiler, ProfilerOverlay, instrument_game, instrument_renderer
+from zoom import ZOOM_LEVELS, ZoomedTerrain, RegionTerrain, build_mipmaps, terrain_colors
+from minimap import Minimap
+from world_loader import WorldLoader, LoadingIndicator
+from visibility import Visibility, fog_tiles
+from decorations import Decorations, DecorationLayer
 
 class TerrainMapApp:
-    def __init__(self, root, size=20, tile_size=32, sprite_sheet_path="tileset/spritesheet.png"):
+    def __init__(self, root, size=20, tile_size=32, sprite_sheet_path="tileset/spritesheet.png", infinite=False, chunk_size=16, baked_background=False, enemy_count=8, world_path=None, autosave_interval=60, seed=None):
+        # A saved world continues with its own parameters (including its size) and stored terrain
+        self.world = WorldSave(world_path) if world_path else None
+        if self.world is not None and self.world.exists():
+            self.world.open()
+            if self.world.metadata['bounds'] is not None:
+                size = self.world.metadata['bounds']
         self.size = size
         self.tile_size = tile_size
         self.tile_width = 32 # Isometric tile width
@@ -16,8 +43,9 @@ class TerrainMapApp:
         # self.terrain_spritesheet = Image.open(sprite_sheet_path)
         # self.terrain_spritesheet_alt = Image.open("textures/hyptosis_tile-art-batch-1.png")
         
-        # Create a canvas with scrollbars
-        self.canvas = tk.Canvas(self.root, width=self.size * self.tile_size, height=self.size * self.tile_size, scrollregion=(0, 0, self.size * self.tile_size * 2, self.size * self.tile_size * 2))
+        # Create a canvas with scrollbars, no larger than a window's worth of tiles however big the world is
+        view_size = min(self.size, 24) * self.tile_size
+        self.canvas = tk.Canvas(self.root, width=view_size, height=view_size, scrollregion=(0, 0, self.size * self.tile_size * 2, self.size * self.tile_size * 2))
         self.canvas.pack(fill=tk.BOTH, expand=True)
         
         # Add scrollbars
@@ -32,24 +60,136 @@ class TerrainMapApp:
         # Configure canvas scroll commands
         self.canvas.config(xscrollcommand=x_scrollbar.set, yscrollcommand=y_scrollbar.set)
 
-        # Generate the terrain and map
-        self.terrain = generate_perlin_noise(self.size)
-        self.terrain_image_map = create_terrain_image_map()
-        self.isometric_map = generate_isometric_map(self.size, self.terrain, self.terrain_image_map, self.tile_width, self.tile_height)
+        # Every image comes from the shared asset atlas, memory-mapped from the baked bundle
+        # (rebaked first if any source image changed)
+        self.assets = default_assets()
+        ensure_bundle(self.assets)
+        
+        # Terrain is generated chunk by chunk around the character instead of all up front
+        self.terrain_tiles = load_terrain_tiles(self.assets)
+        self.terrain_image_map = create_terrain_image_map(self.assets)
+        # Noise computed on earlier runs with the same parameters is read back from the generation cache,
+        # in blocks of a few chunks each.
+        self.generation_cache = GenerationCache(max_entries=1024)
+        if self.world is not None and self.world.metadata is not None:
+            self.chunks = ChunkManager(cache=self.generation_cache, **self.world.chunk_manager_params())
+        else:
+            self.chunks = ChunkManager(chunk_size=chunk_size, bounds=None if infinite else self.size, seed=seed, cache=self.generation_cache)
+            if self.world is not None:
+                self.world.create(self.chunks)
+        self.chunks.storage = self.world
+        self.chunks.on_load = self.build_chunk_tiles
+        self.chunks.on_evict = self.erase_chunk
+        self.chunks.on_change = self.retile_chunk
+        
+        # Tiles of the loaded chunks, looked up by grid coordinate, isometric position or screen point
+        self.tile_index = TileIndex(self.tile_width, self.tile_height, self.chunks.chunk_size, loader=self.chunks.chunk_at)
+        
+        # Only the tiles inside the visible part of the canvas get canvas items,
+        # or in baked mode a single pre-composited image per chunk
+        if baked_background:
+            self.viewport = BakedBackground(self.canvas, self.chunks, self.terrain_tiles, self.tile_width, self.tile_height)
+        else:
+            self.viewport = ViewportRenderer(self.canvas, self.chunks, self.tile_index, self.tile_width, self.tile_height)
+        self.terrain_viewport = self.viewport
+
+        # Zoomed out the terrain comes from downscaled tile mipmaps, and further out from one image per region
+        self.zoom = 1.0
+        self.region_terrain = RegionTerrain(self.chunks)
+        self.mipmaps = build_mipmaps(self.terrain_tiles)
+        self.terrain_colors = terrain_colors(self.terrain_tiles)
+
+        # Field of view and fog of war: unexplored tiles are not drawn, explored ones out of sight are darkened
+        # (the baked background draws every tile)
+        self.visibility = Visibility(self.chunks)
+        if not baked_background:
+            fogged = fog_tiles(self.terrain_tiles)
+            self.viewport.fog_images = {self.terrain_image_map[terrain_type]: ImageTk.PhotoImage(image) for terrain_type, image in fogged.items()}
+            self.viewport.visibility = self.visibility
+
+        # Props scattered over the terrain, drawn as one baked image per chunk instead of one item per prop
+        self.decorations = Decorations(self.chunks, assets=self.assets)
+        self.decoration_layer = DecorationLayer(self.canvas, self.chunks, self.decorations, self.tile_width, self.tile_height,
+                                                visibility=None if baked_background else self.visibility)
+
+        # Walkability and move costs of the loaded chunks, and A* paths over them for enemies
+        self.walkability = WalkabilityGrid(self.chunks)
+        self.pathfinder = PathfindingService(self.walkability)
+
+        # Actors are drawn as persistent items on a sprite layer above the terrain
+        self.sprite_layer = SpriteLayer(self.canvas)
 
         # Initialize the character
-        self.character = Character(self.size, self.tile_size, self.canvas, self.isometric_map, self.terrain, "character_spritesheet.png", 24, 32, self.tile_width, self.tile_height)
+        self.character = Character(self.size, self.tile_size, self.canvas, self.chunks, self.tile_index, "character_spritesheet.png", 24, 32, self.tile_width, self.tile_height, sprite_layer=self.sprite_layer, assets=self.assets)
+        self.character.viewport = self.viewport
+
+        # Beyond the first screen, chunks are streamed in by a background worker
+        self.world_loader = WorldLoader(self.root, self.chunks)
+        self.character.world_loader = self.world_loader
+
+        # Actors are kept in a spatial hash for occupancy and proximity queries
+        self.spatial_hash = SpatialHash()
+        self.character.spatial_hash = self.spatial_hash
+
+        # Enemies are simulated together in arrays and chase the character down a shared flow field
+        self.enemies = EnemyManager(self.walkability, self.pathfinder, self.sprite_layer, self.tile_width, self.tile_height, assets=self.assets, spatial_hash=self.spatial_hash)
 
         # Create an inventory for the character
         self.character.inventory = Inventory(self.root)
         
-        # Add some items to the character's inventory (example items)
-        self.character.inventory.add_item("Sword", 1)
-        self.character.inventory.add_item("Health Potion", 3)
-        self.character.inventory.add_item("Shield", 1)
+        # Resume a saved player, or add some items to the character's inventory (example items)
+        if self.world is not None and self.world.restore_player(self.character):
+            self.world.restore_inventory(self.character.inventory)
+        else:
+            self.character.inventory.add_item("Sword", 1)
+            self.character.inventory.add_item("Health Potion", 3)
+            self.character.inventory.add_item("Shield", 1)
+        
+        # Load only the chunks right around the character, then draw the character on top
+        self.chunks.ensure_around(self.character.character_x, self.character.character_y, radius=1)
+        self.spatial_hash.insert('character', self.character.character_x, self.character.character_y)
+        self.spawn_enemies(enemy_count)
+        self.character.draw_character()
+        self.enemies.draw()
+        self.sprite_layer.flush()
+        
+        # See what the character sees before anything is drawn
+        self.visibility.update(self.character.character_x, self.character.character_y)
+
+        # Center the view after drawing the character (this also draws the visible terrain),
+        # then stream in the rest of the area around the character
+        self.character.center_view()
+        self.world_loader.request_around(self.character.character_x, self.character.character_y)
+        
+        # Redraw the visible terrain when the window is resized
+        self.canvas.bind('<Configure>', lambda event: self.viewport.render())
         
-        # Draw the initial map with the character
-        self.draw_isometric_map(self.isometric_map)
+        # One loop drives animation and drawing; sprite changes reach the canvas once per frame
+        self.loop = GameLoop(self.root)
+        self.loop.register('character', update=self.character.update, draw=self.character.draw_character)
+        if not baked_background:
+            self.loop.register('visibility', update=self.update_visibility)
+        self.loop.register('enemies', update=self.update_enemies, draw=self.enemies.draw)
+        self.loop.register('pathfinding', update=self.pathfinder.process)
+        self.loop.register('decorations', draw=self.decoration_layer.render)
+        self.loop.register('sprites', draw=self.sprite_layer.flush)
+        self.loading_indicator = LoadingIndicator(self.canvas, self.world_loader)
+        self.loop.register('loading', draw=self.loading_indicator.draw)
+
+        # World overview in the corner, patched with just the pixels that change
+        self.minimap = Minimap(self.canvas, self.chunks, self.terrain_colors)
+        self.loop.register('minimap', draw=lambda: self.minimap.draw(self.character, self.enemies))
+        if self.world is not None:
+            self.autosave_interval = autosave_interval
+            self.autosave_time = 0.0
+            self.loop.register('autosave', update=self.autosave)
+        self.loop.on_input('move', self.character.move)
+
+        # Hot-path timings and counters per frame, shown in an overlay and exportable as a Chrome trace
+        self.profiler = instrument_game(Profiler(), self)
+        self.profiler_overlay = ProfilerOverlay(self.canvas, self.profiler)
+        self.loop.register('profiler', draw=self.profiler_overlay.draw)
+        self.loop.start()
         
         # Bind arrow keys for movement
         self.root.bind('<Up>', self.move_up)
@@ -59,49 +199,212 @@ class TerrainMapApp:
         
         # Bind 'i' key to toggle inventory overlay
         self.root.bind('i', self.character.inventory.toggle_inventory)
+        
+        # Toggle the minimap
+        self.root.bind('m', self.minimap.toggle)
+        
+        # Zoom out and back in
+        self.root.bind('<minus>', lambda event: self.step_zoom(1))
+        self.root.bind('<equal>', lambda event: self.step_zoom(-1))
+        self.root.bind('<plus>', lambda event: self.step_zoom(-1))
+        
+        # Click on a tile to inspect it
+        self.canvas.bind('<Button-1>', self.inspect_tile)
+        
+        # Save the world
+        self.root.bind('<F5>', lambda event: self.save_world())
+        
+        # Print frame-time statistics
+        self.root.bind('<F3>', lambda event: print(self.loop.stats.report()))
+        
+        # Toggle the profiler overlay, and write the recent frames as a trace file
+        self.root.bind('<F4>', self.profiler_overlay.toggle)
+        self.root.bind('<F6>', lambda event: self.export_trace())
     
-    def draw_isometric_map(self, isometric_map):
+    def build_chunk_tiles(self, chunk):
         """
-        Draw the terrain map with images and the character.
+        Build the isometric tiles for a freshly generated chunk. They are drawn by the viewport once they scroll into view.
         """
-        # Iterate over the ASCII map and use the terrain images
-        self.image_references = []  # Store references to images to prevent garbage collection
-
-        for tile in isometric_map:
-            # Add the image to the canvas at it's isometric coordinates
-            tile_image = tile['image']
-            x = tile['x']
-            y = tile['y']
-            self.canvas.create_image(x, y, anchor=tk.NW, image=tile_image)
+        chunk.isometric_map = generate_isometric_map(None, chunk.elevation, self.terrain_image_map, self.tile_width, self.tile_height, chunk.x0, chunk.y0)
+        self.tile_index.add(chunk.isometric_map)
+        self.pathfinder.refresh_chunk(chunk)
+        
+    def erase_chunk(self, chunk):
+        """
+        Remove every canvas item of a chunk that was evicted from the chunk cache.
+        """
+        # Keep the chunk's terrain (and any changes to it) in the saved world
+        if self.world is not None and self.world.is_dirty(chunk):
+            self.world.save_chunk(chunk)
+        self.terrain_viewport.forget_chunk(chunk)
+        if self.viewport is not self.terrain_viewport:
+            self.viewport.forget_chunk(chunk)
+        self.decoration_layer.forget_chunk(chunk)
+        self.pathfinder.refresh_chunk(chunk)
+        if chunk.isometric_map is not None:
+            self.tile_index.remove(chunk.isometric_map)
+        chunk.isometric_map = None
+        
+    def retile_chunk(self, chunk, region):
+        """
+        Update the tiles of an edited part of a chunk: reclassify just that region, swap the
+        changed tiles' images on screen and drop walkability and paths through it.
+        """
+        x0, y0, x1, y1 = region
+        self.region_terrain.invalidate(region)
+        if chunk.isometric_map is not None:
+            elevation = chunk.elevation[y0 - chunk.y0:y1 - chunk.y0, x0 - chunk.x0:x1 - chunk.x0]
+            changed = chunk.isometric_map.update_region(x0, y0, elevation)
+            self.terrain_viewport.retile(chunk, changed)
+            if self.viewport is not self.terrain_viewport:
+                self.viewport.retile(chunk, changed)
+        self.minimap.retile(chunk, region)
+        self.pathfinder.invalidate(region)
+        self.visibility.invalidate()
+        self.decoration_layer.refresh()
+        
+    def spawn_enemies(self, count, radius=8):
+        """
+        Spawn idle enemies on random free walkable tiles around the character.
+        """
+        rng = np.random.default_rng()
+        x0, y0 = self.character.character_x, self.character.character_y
+        xs = rng.integers(x0 - radius, x0 + radius + 1, size=8 * count)
+        ys = rng.integers(y0 - radius, y0 + radius + 1, size=8 * count)
+        walkable = self.walkability.costs_at(xs, ys) != np.inf
+        spawned = 0
+        for x, y in zip(xs[walkable].tolist(), ys[walkable].tolist()):
+            if spawned == count:
+                break
+            if self.spatial_hash.occupied(x, y):
+                continue
+            self.enemies.spawn(('badger', 'stag', 'boar')[spawned % 3], x, y, state=IDLE)
+            spawned += 1
             
-            # Keep a reference to prevent the image from being garbage collected
-            self.image_references.append(tile_image)
-                
-        # Draw the character on top
-        self.character.draw_character()
+    def update_visibility(self, dt):
+        """
+        Recompute the field of view when the character moved and redraw just the tiles whose visibility changed.
+        """
+        changed = self.visibility.update(self.character.character_x, self.character.character_y)
+        if self.viewport is self.terrain_viewport:
+            self.terrain_viewport.refresh_visibility(*changed)
+        if len(changed[0]):
+            self.decoration_layer.refresh()
+            
+    def update_enemies(self, dt):
+        """
+        Wake the enemies near the character, point them at its current tile and advance them by dt seconds.
+        """
+        x, y = self.character.character_x, self.character.character_y
+        self.enemies.aggro(x, y, AGGRO_RADIUS, leash=LEASH_RADIUS)
+        self.enemies.chase(x, y)
+        self.enemies.update(dt)
+        
+    def save_world(self):
+        """
+        Write the changed chunks, the player and the inventory to the saved world.
+        
+        :return: Number of chunks written
+        """
+        if self.world is None:
+            return 0
+        return self.world.save(self.chunks, self.character, self.character.inventory)
         
-        # Center the view after drawing the character
+    def export_trace(self, path="profile_trace.json"):
+        """
+        Write the profiler's recent frames as a Chrome trace file.
+        """
+        count = self.profiler.export_trace(path)
+        print(f"Wrote {count} trace events to {path}")
+        
+    def autosave(self, dt):
+        """
+        Save the world every autosave_interval seconds. Called by the game loop.
+        """
+        self.autosave_time += dt
+        if self.autosave_time >= self.autosave_interval:
+            self.autosave_time = 0.0
+            self.save_world()
+            
+    def set_zoom(self, zoom):
+        """
+        Switch the terrain renderer for a zoom level (see zoom.ZOOM_LEVELS). Sprites are hidden while zoomed out.
+        """
+        if zoom == self.zoom:
+            return
+        self.viewport.clear()
+        if self.viewport is not self.terrain_viewport:
+            # Dropped, so its timing wrapper goes with it
+            self.profiler.remove_instrumentation(self.viewport)
+        if zoom == 1:
+            self.viewport = self.terrain_viewport
+        else:
+            self.viewport = ZoomedTerrain(self.canvas, self.chunks, self.region_terrain, self.mipmaps, self.terrain_colors,
+                                          self.tile_width, self.tile_height, zoom)
+            instrument_renderer(self.profiler, self.viewport)
+        self.zoom = zoom
+        self.character.zoom = zoom
+        self.character.viewport = self.viewport
+        self.sprite_layer.set_visible(zoom == 1)
+        self.decoration_layer.set_visible(zoom == 1)
         self.character.center_view()
+        self.viewport.render(force=True)
         
+    def step_zoom(self, steps):
+        """
+        Move through the zoom levels; positive steps zoom out.
+        """
+        index = min(max(ZOOM_LEVELS.index(self.zoom) + steps, 0), len(ZOOM_LEVELS) - 1)
+        self.set_zoom(ZOOM_LEVELS[index])
+        
+    def inspect_tile(self, event):
+        """
+        Show the grid coordinate, terrain and elevation of the clicked tile.
+        """
+        if self.zoom != 1:
+            # Zoomed out only the terrain type is known without loading the chunk
+            x, y = self.tile_index.grid_at_point(self.canvas.canvasx(event.x) / self.zoom, self.canvas.canvasy(event.y) / self.zoom)
+            if self.chunks.in_bounds(x, y):
+                terrain_type = TERRAIN_TYPES[self.region_terrain.terrain_id(x, y)]
+                self.root.title(f"Terrain Map with Controllable Character - ({x}, {y}) {terrain_type}")
+            return
+        (x, y), tile = self.tile_index.pick(self.canvas, event.x, event.y)
+        if tile is None:
+            return
+        elevation = self.chunks.elevation(x, y)
+        self.root.title(f"Terrain Map with Controllable Character - ({x}, {y}) {classify_elevation(elevation)} {elevation:.2f}")
+        
+    # Key presses are posted to the game loop, which handles at most one move per tick
     def move_up(self, event):
-        self.character.move('up')
+        self.loop.post_input('move', 'up')
 
     def move_down(self, event):
-        self.character.move('down')
+        self.loop.post_input('move', 'down')
 
     def move_left(self, event):
-        self.character.move('left')
+        self.loop.post_input('move', 'left')
         
     def move_right(self, event):
-        self.character.move('right')
+        self.loop.post_input('move', 'right')
 
-def display_image_map(size=20):
+def display_image_map(size=20, infinite=False, baked_background=False, enemy_count=8, world_path=None, seed=None):
     """
     Display the terrain map with a controllable character.
+    
+    :param size: World size in tiles (also sets the initial window size)
+    :param infinite: Generate an unbounded world instead of a size x size one
+    :param baked_background: Draw the terrain as a few pre-composited images instead of one item per tile
+    :param enemy_count: Number of enemies spawned around the character
+    :param world_path: Directory of a saved world to continue (created if missing), or None to not save
+    :param seed: Seed of a new world's terrain, None for the classic terrain
     """
     root = tk.Tk()
-    app = TerrainMapApp(root, size)
+    app = TerrainMapApp(root, size, infinite=infinite, baked_background=baked_background, enemy_count=enemy_count, world_path=world_path, seed=seed)
     root.mainloop()
+    app.world_loader.shutdown()
+    app.save_world()
 
-# Display the terrain map with a controllable character
-display_image_map(size=60)
+if __name__ == '__main__':
+    # Display the terrain map with a controllable character
+    # (guarded so noise worker processes can import this module safely)
+    display_image_map(size=60)
@@ -0,0 +1,84 @@
+class ItemRegistry:
+    """
+    Every kind of item, with an integer ID and its metadata.
+
+    Inventories store counts by item ID, so they never compare or hash item names. IDs are
+    handed out in registration order and are only valid within one run; anything saved to disk
+    uses the item names (see Inventory.get_items).
+    """
+    def __init__(self):
+        self.names = [] # Item ID -> name
+        self.ids = {} # name -> item ID
+        self.metadata = [] # Item ID -> {'max_stack', 'kind', ...}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def register(self, name, max_stack=99, kind='misc', **metadata):
+        """
+        Register an item kind, or get the ID of one already registered.
+
+        :param name: Display name, unique per item kind
+        :param max_stack: Most items of this kind in one inventory slot
+        :param kind: Category, e.g. 'weapon' or 'consumable'
+        :param metadata: Any other properties of the item
+        :return: The item ID
+        """
+        item_id = self.ids.get(name)
+        if item_id is None:
+            item_id = len(self.names)
+            self.names.append(name)
+            self.ids[name] = item_id
+            self.metadata.append(dict(metadata, max_stack=max_stack, kind=kind))
+        return item_id
+
+    def id_of(self, item):
+        """
+        Get the ID of an item given by name or ID. Unknown names are registered with default metadata.
+        """
+        if isinstance(item, int):
+            return item
+        return self.register(item)
+
+    def name(self, item_id):
+        return self.names[item_id]
+
+    def info(self, item_id):
+        """
+        Metadata of an item kind, including 'max_stack' and 'kind'.
+        """
+        return self.metadata[item_id]
+
+    def stacks(self, item_id, count):
+        """
+        Number of inventory slots `count` items of a kind take up.
+        """
+        max_stack = self.metadata[item_id]['max_stack']
+        return -(-count // max_stack)
+
+
+def register_default_items(registry):
+    """
+    Register the items the game hands out.
+    """
+    registry.register("Sword", max_stack=1, kind='weapon')
+    registry.register("Shield", max_stack=1, kind='armor')
+    registry.register("Health Potion", max_stack=20, kind='consumable')
+    return registry
+
+
+# Registry shared by everything that does not get one passed in
+_default_items = None
+
+
+def default_items():
+    """
+    Get the shared item registry, with the default items registered.
+    """
+    global _default_items
+    if _default_items is None:
+        _default_items = register_default_items(ItemRegistry())
+    return _default_items
@@ -0,0 +1,242 @@
+import numpy as np
+from tile_map import TERRAIN_TYPES, classify_terrain
+
+# Palette entries after the terrain types: outside the world, enemies, the character
+VOID = len(TERRAIN_TYPES)
+ENEMY = VOID + 1
+CHARACTER = VOID + 2
+
+# Side of the square drawn for each marker, in minimap pixels
+MARKER_SIZES = {ENEMY: 2, CHARACTER: 3}
+
+
+class Minimap:
+    """
+    Top-down overview of the world as one image, pinned to the top right corner of the view.
+
+    Every pixel is one sampled tile colored by its terrain type, computed from terrain type
+    arrays: loaded chunks and chunks of a saved world give their own (possibly edited) terrain,
+    everything else is sampled straight from the noise, so no chunk is loaded for it. A bounded
+    world is shrunk to fit; an unbounded one shows a window that recenters when the character
+    nears its edge. After the first fill only changed pixels are written to the image: the
+    squares of markers that moved, and the tiles of edited regions.
+    """
+    def __init__(self, canvas, chunk_manager, colors, size=192, tiles_per_pixel=1, photo_factory=None, margin=8):
+        """
+        :param canvas: Canvas to draw on
+        :param chunk_manager: Source of terrain
+        :param colors: RGBA color per terrain type ID, see zoom.terrain_colors
+        :param size: Width and height of the minimap in pixels
+        :param tiles_per_pixel: Grid cells per pixel in unbounded worlds (bounded ones are fitted)
+        :param photo_factory: Callable (width, height) making the image, defaults to tkinter.PhotoImage
+        :param margin: Distance from the corner of the view in pixels
+        """
+        self.canvas = canvas
+        self.chunk_manager = chunk_manager
+        self.margin = margin
+        if chunk_manager.bounds is not None:
+            self.step = max(1, -(-chunk_manager.bounds // size))
+            self.size = -(-chunk_manager.bounds // self.step)
+        else:
+            self.step = tiles_per_pixel
+            self.size = size
+        palette = [tuple(colors[terrain_id][:3]) for terrain_id in range(len(TERRAIN_TYPES))]
+        palette += [(0, 0, 0), (220, 40, 40), (255, 255, 255)] # void, enemy, character
+        self.palette = np.array(['#%02x%02x%02x' % color for color in palette])
+        if photo_factory is None:
+            import tkinter
+            photo_factory = lambda width, height: tkinter.PhotoImage(width=width, height=height)
+        self.photo = photo_factory(self.size, self.size)
+        self.origin = None # Grid coordinate of the top-left pixel
+        self.base = None # Palette index of every pixel without markers
+        self.pixels = None # Palette index of every pixel as shown
+        self.markers = {} # (px, py) of a marker's top-left corner -> palette index
+        self.visible = True
+        self.item = None
+        self.pixels_written = 0
+
+    def toggle(self, event=None):
+        self.visible = not self.visible
+        if self.item is not None:
+            self.canvas.itemconfig(self.item, state='normal' if self.visible else 'hidden')
+
+    def sample_terrain(self, x0, y0, width, height):
+        """
+        Terrain type IDs at every `step`-th tile of a rectangle, as palette indices.
+
+        :param x0: Grid x coordinate of the first sample
+        :param y0: Grid y coordinate of the first sample
+        :param width: Number of sample columns
+        :param height: Number of sample rows
+        """
+        manager = self.chunk_manager
+        step = self.step
+        ids = classify_terrain(manager.noise_elevation(x0, y0, width, height, step))
+        xs = x0 + step * np.arange(width)
+        ys = y0 + step * np.arange(height)
+
+        # Known chunks override the noise, so edits show up
+        size = manager.chunk_size
+        for cy in range(ys[0] // size, ys[-1] // size + 1):
+            rows = np.nonzero((ys >= cy * size) & (ys < (cy + 1) * size))[0]
+            if not len(rows):
+                continue
+            for cx in range(xs[0] // size, xs[-1] // size + 1):
+                cols = np.nonzero((xs >= cx * size) & (xs < (cx + 1) * size))[0]
+                if not len(cols):
+                    continue
+                chunk = manager.chunks.get((cx, cy))
+                if chunk is not None:
+                    terrain = classify_terrain(chunk.elevation)
+                elif (cx, cy) in manager.edited:
+                    terrain = classify_terrain(manager.edited[(cx, cy)])
+                elif manager.storage is not None and manager.storage.has_chunk(cx, cy):
+                    terrain = manager.storage.load_terrain(cx, cy)
+                else:
+                    continue
+                local_rows = ys[rows] - cy * size
+                local_cols = xs[cols] - cx * size
+                inside_rows = local_rows < terrain.shape[0]
+                inside_cols = local_cols < terrain.shape[1]
+                ids[np.ix_(rows[inside_rows], cols[inside_cols])] = terrain[np.ix_(local_rows[inside_rows], local_cols[inside_cols])]
+
+        if manager.bounds is not None:
+            ids[(ys >= manager.bounds)[:, np.newaxis] | (xs >= manager.bounds)[np.newaxis, :]] = VOID
+            ids[(ys < 0)[:, np.newaxis] | (xs < 0)[np.newaxis, :]] = VOID
+        return ids
+
+    def pixel_of(self, x, y):
+        """
+        Minimap pixel showing grid coordinate (x, y) (may lie outside the image).
+        """
+        return (x - self.origin[0]) // self.step, (y - self.origin[1]) // self.step
+
+    def recenter(self, x, y):
+        """
+        Move the window to center on grid coordinate (x, y) and rewrite the whole image.
+        Tiles still inside the window are kept; only the newly uncovered strips are sampled.
+        """
+        if self.chunk_manager.bounds is not None:
+            origin = (0, 0)
+        else:
+            half = self.size * self.step // 2
+            origin = ((x - half) // self.step * self.step, (y - half) // self.step * self.step)
+        base = None
+        if self.base is not None:
+            shift_x = (origin[0] - self.origin[0]) // self.step
+            shift_y = (origin[1] - self.origin[1]) // self.step
+            if abs(shift_x) < self.size and abs(shift_y) < self.size:
+                base = np.empty_like(self.base)
+                # Overlap of the old and new windows, in new pixel coordinates
+                left, right = max(0, -shift_x), min(self.size, self.size - shift_x)
+                top, bottom = max(0, -shift_y), min(self.size, self.size - shift_y)
+                base[top:bottom, left:right] = self.base[top + shift_y:bottom + shift_y, left + shift_x:right + shift_x]
+                # Rows above or below the overlap, then the columns beside it
+                for row_start, row_end in ((0, top), (bottom, self.size)):
+                    if row_start < row_end:
+                        base[row_start:row_end] = self.sample_terrain(origin[0], origin[1] + row_start * self.step,
+                                                                      self.size, row_end - row_start)
+                for col_start, col_end in ((0, left), (right, self.size)):
+                    if col_start < col_end:
+                        base[top:bottom, col_start:col_end] = self.sample_terrain(
+                            origin[0] + col_start * self.step, origin[1] + top * self.step, col_end - col_start, bottom - top)
+        self.origin = origin
+        self.base = base if base is not None else self.sample_terrain(origin[0], origin[1], self.size, self.size)
+        self.pixels = self.base.copy()
+        self.markers = {}
+        self._put(0, 0, self.size, self.size)
+
+    def _put(self, left, top, right, bottom):
+        """
+        Write a rectangle of pixels to the image.
+        """
+        left, top = max(left, 0), max(top, 0)
+        right, bottom = min(right, self.size), min(bottom, self.size)
+        if left >= right or top >= bottom:
+            return
+        colors = self.palette[self.pixels[top:bottom, left:right]]
+        self.photo.put(" ".join("{" + " ".join(row) + "}" for row in colors.tolist()), to=(left, top))
+        self.pixels_written += (right - left) * (bottom - top)
+
+    def retile(self, chunk, region):
+        """
+        Refresh the pixels of an edited region of a chunk.
+        """
+        if self.origin is None:
+            return
+        x0, y0, x1, y1 = region
+        step = self.step
+        # Sampled tiles inside the region
+        first_x = self.origin[0] + -(-(x0 - self.origin[0]) // step) * step
+        first_y = self.origin[1] + -(-(y0 - self.origin[1]) // step) * step
+        xs = np.arange(first_x, x1, step)
+        ys = np.arange(first_y, y1, step)
+        px, py = self.pixel_of(xs, ys)
+        keep_x = (px >= 0) & (px < self.size)
+        keep_y = (py >= 0) & (py < self.size)
+        xs, px, ys, py = xs[keep_x], px[keep_x], ys[keep_y], py[keep_y]
+        if not len(xs) or not len(ys):
+            return
+        terrain = classify_terrain(chunk.elevation[np.ix_(ys - chunk.y0, xs - chunk.x0)])
+        self.base[np.ix_(py, px)] = terrain
+        self.pixels[np.ix_(py, px)] = terrain
+        for (marker_x, marker_y), index in self.markers.items():
+            marker_size = MARKER_SIZES[index]
+            self.pixels[marker_y:marker_y + marker_size, marker_x:marker_x + marker_size] = index
+        self._put(int(px.min()), int(py.min()), int(px.max()) + 1, int(py.max()) + 1)
+
+    def update_markers(self, markers):
+        """
+        Move the markers, writing only the squares of markers that appeared, moved or went away.
+
+        :param markers: Dictionary (px, py) -> palette index, later markers drawn on top
+        """
+        if markers == self.markers:
+            return
+        changed = {position: self.markers[position] for position in self.markers if markers.get(position) != self.markers[position]}
+        changed.update({position: index for position, index in markers.items() if self.markers.get(position) != index})
+        for (x, y), index in changed.items():
+            marker_size = MARKER_SIZES[index]
+            self.pixels[max(y, 0):y + marker_size, max(x, 0):x + marker_size] = self.base[max(y, 0):y + marker_size, max(x, 0):x + marker_size]
+        # Redraw every marker, since a cleared square may have covered part of one that stayed
+        for (x, y), index in markers.items():
+            marker_size = MARKER_SIZES[index]
+            self.pixels[max(y, 0):y + marker_size, max(x, 0):x + marker_size] = index
+        for (x, y), index in changed.items():
+            marker_size = MARKER_SIZES[index]
+            self._put(x, y, x + marker_size, y + marker_size)
+        self.markers = markers
+
+    def draw(self, character, enemies=None):
+        """
+        Bring the minimap up to date with the character and enemies and keep it pinned to the view.
+        """
+        if not self.visible:
+            return
+        x, y = character.character_x, character.character_y
+        if self.origin is None:
+            self.recenter(x, y)
+        elif self.chunk_manager.bounds is None:
+            px, py = self.pixel_of(x, y)
+            if not self.size // 4 <= px < self.size * 3 // 4 or not self.size // 4 <= py < self.size * 3 // 4:
+                self.recenter(x, y)
+
+        markers = {}
+        if enemies is not None and enemies.count:
+            alive = enemies.alive[:enemies.count]
+            px, py = self.pixel_of(enemies.x[:enemies.count][alive], enemies.y[:enemies.count][alive])
+            on_map = (px >= 0) & (px < self.size) & (py >= 0) & (py < self.size)
+            for marker in zip((px[on_map] - 1).tolist(), (py[on_map] - 1).tolist()):
+                markers[marker] = ENEMY
+        px, py = self.pixel_of(x, y)
+        markers.pop((px - 1, py - 1), None)
+        markers[(px - 1, py - 1)] = CHARACTER
+        self.update_markers(markers)
+
+        left = self.canvas.canvasx(self.canvas.winfo_width()) - self.size - self.margin
+        top = self.canvas.canvasy(0) + self.margin
+        if self.item is None:
+            self.item = self.canvas.create_image(left, top, anchor='nw', image=self.photo, tags='minimap')
+        else:
+            self.canvas.coords(self.item, left, top)
+        self.canvas.tag_raise(self.item)
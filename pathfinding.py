@@ -0,0 +1,388 @@
+import heapq
+import time
+from collections import OrderedDict, deque
+import numpy as np
+from tile_map import classify_terrain
+
+# Cost of stepping onto each terrain type (indexed like TERRAIN_TYPES); inf means impassable.
+# The walkable types match ChunkManager.is_walkable.
+MOVE_COSTS = np.array([np.inf, 1.0, 1.5, 3.0, np.inf], dtype=np.float32)
+
+# 4-directional movement, matching Character.move and Enemy.move
+NEIGHBOURS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+
+class WalkabilityGrid:
+    """
+    Precomputed walkability and move costs for the loaded chunks.
+
+    Each chunk's cost array is built once from its elevation and cached with the chunk's version,
+    so per-step checks are array lookups instead of reclassifying elevations.
+    Only loaded chunks are searched: pathfinding never generates (or evicts) terrain.
+    """
+    def __init__(self, chunk_manager):
+        self.chunk_manager = chunk_manager
+        self.costs = {} # (cx, cy) -> (chunk version, 2D float32 cost array)
+        self.version = 0 # Bumped on every invalidation
+
+    def chunk_costs(self, chunk):
+        """
+        Get the move cost array of a chunk, rebuilding it if the chunk's terrain changed.
+        """
+        key = (chunk.cx, chunk.cy)
+        entry = self.costs.get(key)
+        if entry is None or entry[0] != chunk.version:
+            entry = (chunk.version, MOVE_COSTS[classify_terrain(chunk.elevation)])
+            self.costs[key] = entry
+        return entry[1]
+
+    def cost(self, x, y):
+        """
+        Cost of stepping onto tile (x, y); inf if it is impassable or not loaded.
+        """
+        chunk = self.chunk_manager.loaded_chunk_at(x, y)
+        if chunk is None or not chunk.contains(x, y):
+            return np.inf
+        return float(self.chunk_costs(chunk)[y - chunk.y0, x - chunk.x0])
+
+    def is_walkable(self, x, y):
+        return self.cost(x, y) != np.inf
+
+    def costs_at(self, xs, ys):
+        """
+        Move costs at arrays of grid coordinates, looked up chunk by chunk; inf where impassable or not loaded.
+        """
+        xs = np.asarray(xs)
+        ys = np.asarray(ys)
+        result = np.full(xs.shape, np.inf, dtype=np.float32)
+        size = self.chunk_manager.chunk_size
+        keys = np.stack([xs // size, ys // size], axis=-1).reshape(-1, 2)
+        flat_x = xs.reshape(-1)
+        flat_y = ys.reshape(-1)
+        flat_result = result.reshape(-1)
+        for cx, cy in np.unique(keys, axis=0):
+            chunk = self.chunk_manager.loaded_chunk_at(int(cx) * size, int(cy) * size)
+            if chunk is None:
+                continue
+            selected = (keys[:, 0] == cx) & (keys[:, 1] == cy)
+            local_x = flat_x[selected] - chunk.x0
+            local_y = flat_y[selected] - chunk.y0
+            inside = (local_x < chunk.width) & (local_y < chunk.height)
+            values = np.full(local_x.shape, np.inf, dtype=np.float32)
+            values[inside] = self.chunk_costs(chunk)[local_y[inside], local_x[inside]]
+            flat_result[selected] = values
+        return result
+
+    def cost_lookup(self):
+        """
+        Get a fast cost(x, y) function for one search, which keeps the cost arrays it has used
+        in a local dictionary instead of going through the chunk manager for every step.
+        """
+        size = self.chunk_manager.chunk_size
+        arrays = {}
+
+        def cost(x, y):
+            key = (x // size, y // size)
+            array = arrays.get(key)
+            if array is None:
+                chunk = self.chunk_manager.loaded_chunk_at(x, y)
+                array = self.chunk_costs(chunk).tolist() if chunk is not None else None
+                arrays[key] = array
+            if array is None:
+                return np.inf
+            row = array[y - key[1] * size] if 0 <= y - key[1] * size < len(array) else None
+            if row is None or not 0 <= x - key[0] * size < len(row):
+                return np.inf
+            return row[x - key[0] * size]
+
+        return cost
+
+    def invalidate(self, region=None):
+        """
+        Forget the cost arrays of the chunks overlapping region (x0, y0, x1, y1), or of every chunk.
+        """
+        self.version += 1
+        if region is None:
+            self.costs.clear()
+            return
+        x0, y0, x1, y1 = region
+        size = self.chunk_manager.chunk_size
+        for cy in range(y0 // size, (y1 - 1) // size + 1):
+            for cx in range(x0 // size, (x1 - 1) // size + 1):
+                self.costs.pop((cx, cy), None)
+
+    def drop_chunk(self, chunk):
+        """
+        Forget the cost array of a chunk that was evicted (or loaded again), so its tiles are no longer
+        (or now) walkable to searches and flow fields built from here on.
+        """
+        self.version += 1
+        self.costs.pop((chunk.cx, chunk.cy), None)
+
+
+def astar(grid, start, goal, max_nodes=20000, batch=256):
+    """
+    A* search over a WalkabilityGrid, written as a generator so it can be spread over several ticks.
+
+    Yields None after every `batch` expanded nodes, then finally yields the result:
+    (path, searched_region), where path is a list of (x, y) steps after start (empty if the
+    goal is unreachable within max_nodes) and searched_region is the bounding box of the expanded nodes.
+    """
+    def heuristic(x, y):
+        # Manhattan distance times the cheapest move cost keeps the heuristic admissible
+        return abs(x - goal[0]) + abs(y - goal[1])
+
+    cost_of = grid.cost_lookup()
+    open_heap = [(heuristic(*start), 0.0, start)]
+    came_from = {start: None}
+    best_cost = {start: 0.0}
+    closed = set()
+    min_x = max_x = start[0]
+    min_y = max_y = start[1]
+    expanded = 0
+
+    while open_heap:
+        _, cost, node = heapq.heappop(open_heap)
+        if node in closed:
+            continue
+        closed.add(node)
+        x, y = node
+        min_x, max_x = min(min_x, x), max(max_x, x)
+        min_y, max_y = min(min_y, y), max(max_y, y)
+
+        if node == goal:
+            path = deque()
+            while came_from[node] is not None:
+                path.appendleft(node)
+                node = came_from[node]
+            yield list(path), (min_x, min_y, max_x + 1, max_y + 1)
+            return
+
+        expanded += 1
+        if expanded >= max_nodes:
+            break
+        if expanded % batch == 0:
+            yield None
+
+        for dx, dy in NEIGHBOURS:
+            neighbour = (x + dx, y + dy)
+            step = cost_of(*neighbour)
+            if step == np.inf or neighbour in closed:
+                continue
+            new_cost = cost + step
+            if new_cost < best_cost.get(neighbour, np.inf):
+                best_cost[neighbour] = new_cost
+                came_from[neighbour] = node
+                heapq.heappush(open_heap, (new_cost + heuristic(*neighbour), new_cost, neighbour))
+
+    yield [], (min_x, min_y, max_x + 1, max_y + 1)
+
+
+class FlowField:
+    """
+    Dense array of path costs to one goal over the bounding box of the tiles that can reach it.
+    """
+    def __init__(self, distance):
+        """
+        :param distance: Dictionary (x, y) -> cost of the cheapest path to the goal
+        """
+        coords = np.array(list(distance.keys()), dtype=np.int64).reshape(-1, 2)
+        self.origin_x, self.origin_y = coords.min(axis=0)
+        width, height = coords.max(axis=0) - coords.min(axis=0) + 1
+        self.distance = np.full((height, width), np.inf, dtype=np.float32)
+        self.distance[coords[:, 1] - self.origin_y, coords[:, 0] - self.origin_x] = list(distance.values())
+
+    def values(self, xs, ys):
+        """
+        Path costs at arrays of grid coordinates; inf where the goal cannot be reached.
+        """
+        xs = np.asarray(xs) - self.origin_x
+        ys = np.asarray(ys) - self.origin_y
+        height, width = self.distance.shape
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        result = np.full(xs.shape, np.inf, dtype=np.float32)
+        result[inside] = self.distance[ys[inside], xs[inside]]
+        return result
+
+    def next_steps(self, xs, ys):
+        """
+        For arrays of positions, pick the neighbour that leads down the field.
+
+        :return: Array of indices into NEIGHBOURS, -1 where no neighbour is closer to the goal
+        """
+        xs = np.asarray(xs)
+        ys = np.asarray(ys)
+        here = self.values(xs, ys)
+        around = np.stack([self.values(xs + dx, ys + dy) for dx, dy in NEIGHBOURS])
+        best = np.argmin(around, axis=0)
+        closer = np.take_along_axis(around, best[None], axis=0)[0] < here
+        return np.where(closer, best, -1)
+
+    def next_step(self, x, y):
+        """
+        Get the neighbour of (x, y) that leads down the field, or None if there is none.
+        """
+        index = int(self.next_steps([x], [y])[0])
+        if index < 0:
+            return None
+        return x + NEIGHBOURS[index][0], y + NEIGHBOURS[index][1]
+
+
+class PathfindingService:
+    """
+    Answer path requests with A* within a per-tick time budget, and cache the results.
+
+    Requests are queued and worked on from the game loop, so hundreds of actors asking for paths
+    at once spread the work over several ticks instead of stalling the Tk main loop.
+
+    Jump-point search was considered but is not used: it assumes uniform move costs, and the
+    terrain here has per-type costs.
+    """
+    def __init__(self, grid, max_cached=1024, max_nodes=20000, budget=0.004):
+        """
+        :param grid: WalkabilityGrid to search
+        :param max_cached: Number of paths kept in the LRU cache
+        :param max_nodes: Node expansion limit per search (treats far goals as unreachable)
+        :param budget: Seconds of searching allowed per call to process
+        """
+        self.grid = grid
+        self.max_cached = max_cached
+        self.max_nodes = max_nodes
+        self.budget = budget
+        self.cache = OrderedDict() # (start, goal) -> (path, searched region)
+        self.queue = deque() # (start, goal) keys waiting to be searched
+        self.pending = {} # (start, goal) -> callbacks of the queued request
+        self.active = None # (key, search generator) being worked on
+        self.fields = OrderedDict() # goal -> (grid version, distance field), see flow_field
+        self.hits = 0
+        self.misses = 0
+
+    def find_path(self, start, goal):
+        """
+        Find a path right away (blocking). Uses and fills the cache.
+
+        :return: List of (x, y) steps after start, empty if there is none
+        """
+        key = (start, goal)
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return list(self.cache[key][0])
+        self.misses += 1
+        for result in astar(self.grid, start, goal, self.max_nodes):
+            if result is not None:
+                self._store(key, result)
+                return list(result[0])
+
+    def request(self, start, goal, callback):
+        """
+        Ask for a path; callback(path) runs from process() once it is found, or right away on a cache hit.
+        Identical outstanding requests share one search.
+        """
+        key = (start, goal)
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            callback(list(self.cache[key][0]))
+            return
+        if key in self.pending:
+            self.pending[key].append(callback)
+            return
+        self.misses += 1
+        self.pending[key] = [callback]
+        self.queue.append(key)
+
+    def process(self, dt=None):
+        """
+        Work on queued searches until the time budget runs out. Can be registered as a game loop update.
+        """
+        deadline = time.perf_counter() + self.budget
+        while time.perf_counter() < deadline:
+            if self.active is None:
+                if not self.queue:
+                    return
+                key = self.queue.popleft()
+                self.active = (key, astar(self.grid, key[0], key[1], self.max_nodes))
+
+            key, search = self.active
+            result = next(search)
+            if result is None:
+                continue
+
+            self.active = None
+            self._store(key, result)
+            for callback in self.pending.pop(key, []):
+                callback(list(result[0]))
+
+    def flow_field(self, goal, max_nodes=None):
+        """
+        Cost-to-goal of every tile that can reach `goal`, from one reverse Dijkstra search.
+
+        When many actors chase the same target (the character), one field replaces one A* search per
+        actor: each actor just steps to the neighbour with the lowest cost, see FlowField.next_steps.
+
+        :return: FlowField covering the reached tiles
+        """
+        entry = self.fields.get(goal)
+        if entry is not None and entry[0] == self.grid.version:
+            self.fields.move_to_end(goal)
+            return entry[1]
+
+        max_nodes = max_nodes or self.max_nodes
+        cost_of = self.grid.cost_lookup()
+        distance = {goal: 0.0}
+        heap = [(0.0, goal)]
+        while heap and len(distance) < max_nodes:
+            cost, node = heapq.heappop(heap)
+            if cost > distance[node]:
+                continue
+            # Stepping from a neighbour onto `node` costs the cost of `node`
+            step = cost_of(*node)
+            for dx, dy in NEIGHBOURS:
+                neighbour = (node[0] + dx, node[1] + dy)
+                if cost_of(*neighbour) == np.inf:
+                    continue
+                new_cost = cost + step
+                if new_cost < distance.get(neighbour, np.inf):
+                    distance[neighbour] = new_cost
+                    heapq.heappush(heap, (new_cost, neighbour))
+
+        field = FlowField(distance)
+        self.fields[goal] = (self.grid.version, field)
+        while len(self.fields) > 8:
+            self.fields.popitem(last=False)
+        return field
+
+    def _store(self, key, result):
+        self.cache[key] = result
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_cached:
+            self.cache.popitem(last=False)
+
+    def invalidate(self, region=None):
+        """
+        Terrain changed in region (x0, y0, x1, y1), or everywhere: drop the affected cost arrays
+        and every cached path whose search touched the region.
+        """
+        self.grid.invalidate(region)
+        self.fields.clear()
+        if region is None:
+            self.cache.clear()
+            return
+        self._drop_paths(region)
+
+    def refresh_chunk(self, chunk):
+        """
+        A chunk was loaded or evicted: tiles outside the loaded chunks count as impassable, so drop
+        the flow fields and every cached path whose search reached the chunk's edge.
+        """
+        self.grid.drop_chunk(chunk)
+        self.fields.clear()
+        # Searches stop one tile short of impassable tiles, so widen the chunk by one
+        self._drop_paths((chunk.x0 - 1, chunk.y0 - 1, chunk.x0 + chunk.width + 1, chunk.y0 + chunk.height + 1))
+
+    def _drop_paths(self, region):
+        x0, y0, x1, y1 = region
+        for key in [key for key, (_, searched) in self.cache.items()
+                    if searched[0] < x1 and x0 < searched[2] and searched[1] < y1 and y0 < searched[3]]:
+            del self.cache[key]
@@ -0,0 +1,254 @@
+import json
+import time
+from collections import deque
+
+
+class Profiler:
+    """
+    Frame profiler: timed sections and counters, grouped by rendered frame.
+
+    Sections are timed by the game loop (every registered callback, see GameLoop.profiler) and by
+    wrappers installed with `instrument` around methods of any object. Counters are bumped by
+    wrappers installed with `count_calls` or directly with `count`, and gauges are sampled once per
+    frame. `end_frame` closes a frame; the last `history` frames are kept for the overlay and for
+    the trace written by `export_trace`.
+    """
+    def __init__(self, enabled=True, history=600):
+        """
+        :param enabled: Record anything at all; a disabled profiler's wrappers only forward the call
+        :param history: Number of recent frames kept
+        """
+        self.enabled = enabled
+        self.history = history
+        self.origin = time.perf_counter()
+        self.events = deque(maxlen=64 * history) # (name, start, duration) of every timed section
+        self.frames = deque(maxlen=history) # {'start', 'duration', 'sections', 'counters'} of every closed frame
+        self.sections = {} # section name -> seconds spent in the current frame
+        self.counters = {} # counter name -> total in the current frame
+        self.gauges = {} # gauge name -> callable sampled when a frame closes
+        self.instrumented = [] # (object, attribute, original) of every installed wrapper
+        self.frame_start = self.origin
+
+    def record(self, name, start, end):
+        """
+        Record a timed section, with perf_counter start and end times.
+        """
+        if not self.enabled:
+            return
+        self.events.append((name, start, end - start))
+        self.sections[name] = self.sections.get(name, 0.0) + end - start
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, sample):
+        """
+        Sample a value at the end of every frame, e.g. the number of canvas items.
+
+        :param sample: Callable returning the value
+        """
+        self.gauges[name] = sample
+
+    def _wrap(self, obj, attribute, wrapper):
+        original = getattr(obj, attribute)
+        self.instrumented.append((obj, attribute, original))
+        setattr(obj, attribute, wrapper(original))
+
+    def instrument(self, obj, attribute, section):
+        """
+        Time every call of a method (or any callable attribute) as a section.
+
+        The wrapper is set on the object itself, so it sees calls made through the attribute
+        from then on; callbacks captured earlier (e.g. bound methods handed to the game loop) are unaffected.
+        """
+        def wrapper(original):
+            def timed(*args, **kwargs):
+                if not self.enabled:
+                    return original(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    self.record(section, start, time.perf_counter())
+            return timed
+        self._wrap(obj, attribute, wrapper)
+
+    def count_calls(self, obj, attribute, counter):
+        """
+        Count every call of a method (or any callable attribute).
+        """
+        def wrapper(original):
+            def counted(*args, **kwargs):
+                if self.enabled:
+                    self.counters[counter] = self.counters.get(counter, 0) + 1
+                return original(*args, **kwargs)
+            return counted
+        self._wrap(obj, attribute, wrapper)
+
+    def remove_instrumentation(self, obj=None):
+        """
+        Put back every method wrapped by `instrument` and `count_calls`, or only those of one object
+        (e.g. a renderer that is being replaced).
+        """
+        for wrapped_obj, attribute, original in reversed(self.instrumented):
+            if obj is None or wrapped_obj is obj:
+                setattr(wrapped_obj, attribute, original)
+        self.instrumented = [entry for entry in self.instrumented if obj is not None and entry[0] is not obj]
+
+    def end_frame(self):
+        """
+        Close the current frame: keep its section times, counters and gauges, and start the next one.
+        """
+        now = time.perf_counter()
+        if self.enabled:
+            counters = dict(self.counters)
+            for name, sample in self.gauges.items():
+                counters[name] = sample()
+            self.frames.append({'start': self.frame_start, 'duration': now - self.frame_start,
+                                'sections': self.sections, 'counters': counters})
+        self.sections = {}
+        self.counters = {}
+        self.frame_start = now
+
+    def summary(self, frames=None):
+        """
+        Averages and maxima over the recent frames.
+
+        :param frames: Number of most recent frames to summarize, all kept frames if None
+        :return: Dictionary with 'frames', 'frame' timing, per-'sections' timings (ms) and per-'counters' values
+        """
+        recent = list(self.frames)[-frames:] if frames else list(self.frames)
+        count = len(recent) or 1
+        sections = {}
+        counters = {}
+        for frame in recent:
+            for name, seconds in frame['sections'].items():
+                sections.setdefault(name, []).append(seconds)
+            for name, value in frame['counters'].items():
+                counters.setdefault(name, []).append(value)
+        durations = [frame['duration'] for frame in recent] or [0.0]
+        return {
+            'frames': len(recent),
+            'frame': {'avg_ms': 1000 * sum(durations) / count, 'max_ms': 1000 * max(durations)},
+            # Averages are per frame, so a section that ran in only some frames counts as 0 in the others
+            'sections': {name: {'avg_ms': 1000 * sum(values) / count, 'max_ms': 1000 * max(values)}
+                         for name, values in sections.items()},
+            'counters': {name: {'avg': sum(values) / count, 'max': max(values)} for name, values in counters.items()}
+        }
+
+    def report(self, frames=None):
+        """
+        Format the summary as a few lines of text, slowest sections first.
+        """
+        summary = self.summary(frames)
+        lines = [f"{summary['frames']} frames, avg {summary['frame']['avg_ms']:.2f} ms, max {summary['frame']['max_ms']:.2f} ms"]
+        for name, timing in sorted(summary['sections'].items(), key=lambda item: -item[1]['avg_ms']):
+            lines.append(f"  {name:<20} avg {timing['avg_ms']:7.3f} ms  max {timing['max_ms']:7.3f} ms")
+        for name, value in sorted(summary['counters'].items()):
+            lines.append(f"  {name:<20} avg {value['avg']:9.1f}  max {value['max']:9.1f}")
+        return "\n".join(lines)
+
+    def trace_events(self):
+        """
+        The kept frames and sections as Chrome trace events (timestamps in microseconds).
+        """
+        events = []
+        for frame in self.frames:
+            start = 1e6 * (frame['start'] - self.origin)
+            events.append({'name': 'frame', 'ph': 'X', 'ts': start, 'dur': 1e6 * frame['duration'], 'pid': 0, 'tid': 0})
+            events.append({'name': 'counters', 'ph': 'C', 'ts': start + 1e6 * frame['duration'], 'pid': 0,
+                           'args': frame['counters']})
+        # Sections go on their own row; nested ones (e.g. a render inside center_view) stack below their caller
+        first_kept = self.frames[0]['start'] if self.frames else self.origin
+        for name, start, duration in self.events:
+            if start >= first_kept:
+                events.append({'name': name, 'ph': 'X', 'ts': 1e6 * (start - self.origin), 'dur': 1e6 * duration,
+                               'pid': 0, 'tid': 1})
+        return events
+
+    def export_trace(self, path):
+        """
+        Write the kept frames as a Chrome trace JSON file (open it in chrome://tracing or Perfetto).
+
+        :return: Number of events written
+        """
+        events = self.trace_events()
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+        return len(events)
+
+
+def instrument_game(profiler, game):
+    """
+    Install the standard hot-path hooks on a TerrainMapApp or HeadlessGame.
+
+    The game loop already times every update, draw and input callback; on top of that this times
+    terrain rendering, view scrolling and centering and chunk generation, counts images created and
+    tile lookups, and samples the canvas item and loaded chunk counts every frame.
+    """
+    game.loop.profiler = profiler
+    if game.viewport is not None:
+        instrument_renderer(profiler, game.viewport)
+    profiler.instrument(game.character, 'center_view', 'center')
+    profiler.instrument(game.character, 'scroll_map', 'scroll')
+    profiler.instrument(game.chunks, 'generate_chunk', 'generate:chunk')
+    profiler.instrument(game.chunks, 'on_load', 'generate:tiles')
+    profiler.count_calls(game.canvas, 'create_image', 'images_created')
+    profiler.count_calls(game.tile_index, 'tile_map_at', 'tile_lookups')
+    profiler.gauge('canvas_items', lambda: len(game.canvas.find_all()))
+    profiler.gauge('loaded_chunks', lambda: len(game.chunks.chunks))
+    return profiler
+
+
+def instrument_renderer(profiler, renderer):
+    """
+    Time a terrain renderer's `render`. Games that swap renderers (e.g. when zooming) call this for each new one.
+    """
+    profiler.instrument(renderer, 'render', 'draw:terrain')
+
+
+class ProfilerOverlay:
+    """
+    Toggleable text overlay in the top left corner of the view showing the profiler's recent stats.
+    """
+    def __init__(self, canvas, profiler, frames=60, refresh=15, tag='profiler'):
+        """
+        :param canvas: Canvas to draw on
+        :param profiler: Profiler to show
+        :param frames: Number of recent frames summarized
+        :param refresh: Frames between text updates
+        :param tag: Canvas tag of the overlay items
+        """
+        self.canvas = canvas
+        self.profiler = profiler
+        self.frames = frames
+        self.refresh = refresh
+        self.tag = tag
+        self.visible = False
+        self.item = None
+        self.countdown = 0
+
+    def toggle(self, event=None):
+        self.visible = not self.visible
+        if not self.visible and self.item is not None:
+            self.canvas.delete(self.item)
+            self.item = None
+        self.countdown = 0
+
+    def draw(self):
+        """
+        Keep the overlay pinned to the view and refresh its text every few frames. Called by the game loop.
+        """
+        if not self.visible:
+            return
+        x, y = self.canvas.canvasx(8), self.canvas.canvasy(8)
+        if self.item is None:
+            self.item = self.canvas.create_text(x, y, anchor='nw', fill='yellow', font=('Courier', 9), tags=self.tag)
+        else:
+            self.canvas.coords(self.item, x, y)
+        self.countdown -= 1
+        if self.countdown <= 0:
+            self.countdown = self.refresh
+            self.canvas.itemconfig(self.item, text=self.profiler.report(self.frames))
+        self.canvas.tag_raise(self.item)
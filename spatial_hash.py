@@ -0,0 +1,190 @@
+import heapq
+
+
+class SpatialHash:
+    """
+    Actors bucketed by grid cell, for proximity, collision and aggro queries.
+
+    The world is divided into square cells of `cell_size` tiles; every actor is kept in the set of
+    the cell it stands in, and in a per-tile table for occupancy checks. Moving an actor only touches
+    its old and new buckets, and a query visits just the cells overlapping its area, so the cost of
+    both depends on how crowded the area is, not on how many actors there are in the world.
+    """
+    def __init__(self, cell_size=8):
+        """
+        :param cell_size: Width and height of a cell in tiles
+        """
+        self.cell_size = cell_size
+        self.cells = {} # (cx, cy) -> set of keys
+        self.tiles = {} # (x, y) -> set of keys of the blocking actors standing there
+        self.positions = {} # key -> (x, y)
+        self.blocking = {} # key -> whether the actor occupies its tile
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    def cell_key(self, x, y):
+        return x // self.cell_size, y // self.cell_size
+
+    def insert(self, key, x, y, blocking=True):
+        """
+        Add an actor at grid position (x, y).
+
+        :param key: Unique name of the actor, e.g. its sprite key
+        :param blocking: Whether the actor occupies its tile, blocking others from moving onto it
+        """
+        if key in self.positions:
+            self.remove(key)
+        self.positions[key] = (x, y)
+        self.blocking[key] = blocking
+        self.cells.setdefault(self.cell_key(x, y), set()).add(key)
+        if blocking:
+            self.tiles.setdefault((x, y), set()).add(key)
+
+    def remove(self, key):
+        """
+        Drop an actor, e.g. when it despawns.
+        """
+        position = self.positions.pop(key, None)
+        if position is None:
+            return
+        blocking = self.blocking.pop(key)
+        self._discard(self.cells, self.cell_key(*position), key)
+        if blocking:
+            self._discard(self.tiles, position, key)
+
+    @staticmethod
+    def _discard(buckets, bucket_key, key):
+        bucket = buckets.get(bucket_key)
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del buckets[bucket_key]
+
+    def move(self, key, x, y):
+        """
+        Update an actor's position, adding it if it is not in the hash yet.
+        """
+        position = self.positions.get(key)
+        if position is None:
+            self.insert(key, x, y)
+            return
+        if position == (x, y):
+            return
+        self.positions[key] = (x, y)
+        old_cell = self.cell_key(*position)
+        new_cell = self.cell_key(x, y)
+        if old_cell != new_cell:
+            self._discard(self.cells, old_cell, key)
+            self.cells.setdefault(new_cell, set()).add(key)
+        if self.blocking[key]:
+            self._discard(self.tiles, position, key)
+            self.tiles.setdefault((x, y), set()).add(key)
+
+    def position(self, key):
+        return self.positions.get(key)
+
+    def occupied(self, x, y, ignore=None):
+        """
+        Check if a blocking actor other than `ignore` stands on tile (x, y).
+        """
+        occupants = self.tiles.get((x, y))
+        if not occupants:
+            return False
+        return len(occupants) > 1 or ignore not in occupants
+
+    def at(self, x, y):
+        """
+        Keys of the blocking actors standing on tile (x, y).
+        """
+        return set(self.tiles.get((x, y), ()))
+
+    def query_rect(self, x0, y0, x1, y1):
+        """
+        Keys of the actors inside grid region [x0, x1) x [y0, y1).
+        """
+        found = []
+        first_cx, first_cy = self.cell_key(x0, y0)
+        last_cx, last_cy = self.cell_key(x1 - 1, y1 - 1)
+        for cy in range(first_cy, last_cy + 1):
+            for cx in range(first_cx, last_cx + 1):
+                for key in self.cells.get((cx, cy), ()):
+                    x, y = self.positions[key]
+                    if x0 <= x < x1 and y0 <= y < y1:
+                        found.append(key)
+        return found
+
+    def query_radius(self, x, y, radius):
+        """
+        Keys of the actors within `radius` tiles (Euclidean) of grid position (x, y).
+        """
+        limit = radius * radius
+        found = []
+        for key in self.query_rect(x - radius, y - radius, x + radius + 1, y + radius + 1):
+            other_x, other_y = self.positions[key]
+            if (other_x - x) ** 2 + (other_y - y) ** 2 <= limit:
+                found.append(key)
+        return found
+
+    def nearest(self, x, y, count=1, max_radius=None, exclude=None):
+        """
+        The `count` actors closest to grid position (x, y).
+
+        Cells are searched in rings around the position's cell, stopping once no unvisited cell can
+        hold anything closer than what was found.
+
+        :param max_radius: Ignore actors farther than this many tiles, None for no limit
+        :param exclude: Key to leave out, e.g. the actor asking
+        :return: List of (distance, key), closest first
+        """
+        if not self.positions:
+            return []
+        center_x, center_y = self.cell_key(x, y)
+        best = [] # Max-heap of (-squared distance, order seen, key) of the closest actors so far
+        ring = 0
+        seen = 0
+        max_ring = None
+        if max_radius is not None:
+            max_ring = max_radius // self.cell_size + 1
+        while True:
+            for cx, cy in self._ring(center_x, center_y, ring):
+                for key in self.cells.get((cx, cy), ()):
+                    seen += 1
+                    if key == exclude:
+                        continue
+                    other_x, other_y = self.positions[key]
+                    squared = (other_x - x) ** 2 + (other_y - y) ** 2
+                    if max_radius is not None and squared > max_radius * max_radius:
+                        continue
+                    if len(best) < count:
+                        heapq.heappush(best, (-squared, seen, key))
+                    elif squared < -best[0][0]:
+                        heapq.heapreplace(best, (-squared, seen, key))
+            # Anything in ring + 1 or beyond is at least `ring` whole cells away
+            reach = ring * self.cell_size
+            if len(best) == count and reach * reach >= -best[0][0]:
+                break
+            if max_ring is not None and ring >= max_ring:
+                break
+            if seen == len(self.positions):
+                break
+            ring += 1
+        return [(squared ** 0.5, key) for squared, _, key in sorted((-negative, order, key) for negative, order, key in best)]
+
+    @staticmethod
+    def _ring(center_x, center_y, ring):
+        """
+        Cells at Chebyshev distance `ring` from the center cell.
+        """
+        if ring == 0:
+            yield center_x, center_y
+            return
+        for cx in range(center_x - ring, center_x + ring + 1):
+            yield cx, center_y - ring
+            yield cx, center_y + ring
+        for cy in range(center_y - ring + 1, center_y + ring):
+            yield center_x - ring, cy
+            yield center_x + ring, cy
@@ -0,0 +1,114 @@
+class SpriteLayer:
+    """
+    Persistent canvas items for moving actors, drawn above the terrain.
+
+    Every sprite owns exactly one canvas item that is moved and re-imaged in place, so the canvas
+    item count stays constant no matter how long the game runs. Changes are collected with
+    `update` and applied in one `flush`, which also reports the screen regions that changed.
+    """
+    def __init__(self, canvas, tag='sprite'):
+        """
+        :param canvas: Canvas to draw on
+        :param tag: Canvas tag shared by every sprite item, used to keep them above the terrain
+        """
+        self.canvas = canvas
+        self.tag = tag
+        self.sprites = {} # key -> {'item', 'image', 'x', 'y', 'width', 'height'}
+        self.dirty = {} # key -> bounding box the sprite covered before its pending changes
+        self.visible = True
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def __contains__(self, key):
+        return key in self.sprites
+
+    def add(self, key, image, x, y):
+        """
+        Create the canvas item for a new sprite.
+
+        :param key: Unique name of the sprite, also given to its item as a canvas tag
+        :param image: Image to show
+        :param x: Canvas x coordinate of the sprite's top-left corner
+        :param y: Canvas y coordinate of the sprite's top-left corner
+        """
+        item = self.canvas.create_image(x, y, anchor='nw', image=image, tags=(self.tag, key),
+                                        state='normal' if self.visible else 'hidden')
+        self.sprites[key] = {
+            'item': item,
+            'image': image,
+            'x': x,
+            'y': y,
+            'width': image.width(),
+            'height': image.height()
+        }
+        self.canvas.tag_raise(item)
+        return item
+
+    def update(self, key, image=None, x=None, y=None):
+        """
+        Queue a new image and/or position for a sprite, creating it on first use.
+        Nothing is sent to the canvas until flush.
+        """
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            self.add(key, image, x, y)
+            return
+
+        changed = (image is not None and image is not sprite['image']) or \
+                  (x is not None and x != sprite['x']) or \
+                  (y is not None and y != sprite['y'])
+        if not changed:
+            return
+
+        if key not in self.dirty:
+            self.dirty[key] = self.bbox(key)
+        if image is not None:
+            sprite['image'] = image
+            sprite['width'] = image.width()
+            sprite['height'] = image.height()
+        if x is not None:
+            sprite['x'] = x
+        if y is not None:
+            sprite['y'] = y
+
+    def set_visible(self, visible):
+        """
+        Show or hide every sprite, e.g. while the map is zoomed out. Updates keep being tracked while hidden.
+        """
+        self.visible = visible
+        self.canvas.itemconfig(self.tag, state='normal' if visible else 'hidden')
+
+    def remove(self, key):
+        """
+        Delete a sprite and its canvas item.
+        """
+        sprite = self.sprites.pop(key, None)
+        self.dirty.pop(key, None)
+        if sprite is not None:
+            self.canvas.delete(sprite['item'])
+
+    def bbox(self, key):
+        """
+        Bounding box (left, top, right, bottom) of a sprite on the canvas.
+        """
+        sprite = self.sprites[key]
+        return sprite['x'], sprite['y'], sprite['x'] + sprite['width'], sprite['y'] + sprite['height']
+
+    def flush(self):
+        """
+        Apply the queued changes to the canvas, touching only the sprites that changed.
+
+        :return: List of dirty regions (left, top, right, bottom), each covering a sprite's old and new position
+        """
+        regions = []
+        for key, old_box in self.dirty.items():
+            sprite = self.sprites[key]
+            self.canvas.coords(sprite['item'], sprite['x'], sprite['y'])
+            self.canvas.itemconfig(sprite['item'], image=sprite['image'])
+
+            new_box = self.bbox(key)
+            regions.append((min(old_box[0], new_box[0]), min(old_box[1], new_box[1]),
+                            max(old_box[2], new_box[2]), max(old_box[3], new_box[3])))
+        self.dirty.clear()
+        return regions
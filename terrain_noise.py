@@ -0,0 +1,225 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Ken Perlin's reference permutation, the same table the `noise` package uses for pnoise2
+PERMUTATION = np.array([
+    151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7, 225, 140,
+    36, 103, 30, 69, 142, 8, 99, 37, 240, 21, 10, 23, 190, 6, 148, 247, 120,
+    234, 75, 0, 26, 197, 62, 94, 252, 219, 203, 117, 35, 11, 32, 57, 177, 33,
+    88, 237, 149, 56, 87, 174, 20, 125, 136, 171, 168, 68, 175, 74, 165, 71,
+    134, 139, 48, 27, 166, 77, 146, 158, 231, 83, 111, 229, 122, 60, 211, 133,
+    230, 220, 105, 92, 41, 55, 46, 245, 40, 244, 102, 143, 54, 65, 25, 63, 161,
+    1, 216, 80, 73, 209, 76, 132, 187, 208, 89, 18, 169, 200, 196, 135, 130,
+    116, 188, 159, 86, 164, 100, 109, 198, 173, 186, 3, 64, 52, 217, 226, 250,
+    124, 123, 5, 202, 38, 147, 118, 126, 255, 82, 85, 212, 207, 206, 59, 227,
+    47, 16, 58, 17, 182, 189, 28, 42, 223, 183, 170, 213, 119, 248, 152, 2, 44,
+    154, 163, 70, 221, 153, 101, 155, 167, 43, 172, 9, 129, 22, 39, 253, 19, 98,
+    108, 110, 79, 113, 224, 232, 178, 185, 112, 104, 218, 246, 97, 228, 251, 34,
+    242, 193, 238, 210, 144, 12, 191, 179, 162, 241, 81, 51, 145, 235, 249, 14,
+    239, 107, 49, 192, 214, 31, 181, 199, 106, 157, 184, 84, 204, 176, 115, 121,
+    50, 45, 127, 4, 150, 254, 138, 236, 205, 93, 222, 114, 67, 29, 24, 72, 243,
+    141, 128, 195, 78, 66, 215, 61, 156, 180
+], dtype=np.int32)
+
+# The x/y components of the gradient table pnoise2 indexes with (hash & 15)
+GRADIENTS = np.array([
+    [1, 1], [-1, 1], [1, -1], [-1, -1],
+    [1, 0], [-1, 0], [1, 0], [-1, 0],
+    [0, 1], [0, -1], [0, 1], [0, -1],
+    [1, 0], [-1, 0], [0, -1], [0, 1]
+], dtype=np.float32)
+
+# Tiles this large or larger are worth shipping to a worker process
+DEFAULT_CHUNK_SIZE = 256
+
+
+def _permutation_table(base, seed=None):
+    """
+    Build the lookup table used by the noise function for the given base and seed.
+
+    pnoise2 offsets lattice indices by `base` and reads past the end of its 512 entry
+    table for anything but small bases, so the table is repeated far enough that every
+    base from 0 to 255 gives well-defined values (base=0 matches pnoise2 exactly).
+    A seed replaces the reference permutation with a shuffle drawn from that seed,
+    giving a different but reproducible noise field per seed.
+    """
+    permutation = PERMUTATION if seed is None else np.random.default_rng(seed).permutation(256).astype(np.int32)
+    return np.tile(permutation, 4), int(base) % 256
+
+
+def _noise2(x, y, repeatx, repeaty, perm, base):
+    """
+    Evaluate a single octave of 2D gradient noise for whole arrays of coordinates.
+
+    :param x: float32 array of x coordinates
+    :param y: float32 array of y coordinates (same shape as x)
+    :param repeatx: Lattice period along x
+    :param repeaty: Lattice period along y
+    :param perm: Permutation lookup table
+    :param base: Offset into the permutation table
+    :return: float32 array of noise values in roughly [-1, 1]
+    """
+    repeatx = np.float32(repeatx)
+    repeaty = np.float32(repeaty)
+
+    i = np.floor(np.fmod(x, repeatx)).astype(np.int32)
+    j = np.floor(np.fmod(y, repeaty)).astype(np.int32)
+    ii = np.fmod((i + 1).astype(np.float32), repeatx).astype(np.int32)
+    jj = np.fmod((j + 1).astype(np.float32), repeaty).astype(np.int32)
+    i = (i & 255) + base
+    j = (j & 255) + base
+    ii = (ii & 255) + base
+    jj = (jj & 255) + base
+
+    x = x - np.floor(x)
+    y = y - np.floor(y)
+    fx = x * x * x * (x * (x * 6 - 15) + 10)
+    fy = y * y * y * (y * (y * 6 - 15) + 10)
+
+    a = perm[i]
+    b = perm[ii]
+    aa = perm[perm[a + j]] & 15
+    ab = perm[perm[a + jj]] & 15
+    ba = perm[perm[b + j]] & 15
+    bb = perm[perm[b + jj]] & 15
+
+    x1 = x - 1
+    y1 = y - 1
+    n_aa = x * GRADIENTS[aa, 0] + y * GRADIENTS[aa, 1]
+    n_ba = x1 * GRADIENTS[ba, 0] + y * GRADIENTS[ba, 1]
+    n_ab = x * GRADIENTS[ab, 0] + y1 * GRADIENTS[ab, 1]
+    n_bb = x1 * GRADIENTS[bb, 0] + y1 * GRADIENTS[bb, 1]
+
+    top = n_aa + fx * (n_ba - n_aa)
+    bottom = n_ab + fx * (n_bb - n_ab)
+    return top + fy * (bottom - top)
+
+
+def generate_noise_tile(x0, y0, width, height, scale=10, octaves=6, persistence=0.5, lacunarity=2.0,
+                        repeatx=1024, repeaty=1024, base=0, seed=None, step=1):
+    """
+    Generate raw (un-normalized) fractal noise for a rectangular tile of the map in one pass.
+
+    Cell (x, y) of the map gets the same value pnoise2(x / scale, y / scale, ...) would give it,
+    so tiles generated separately line up seamlessly.
+
+    :param x0: Grid x coordinate of the tile's left column
+    :param y0: Grid y coordinate of the tile's top row
+    :param width: Number of columns in the tile
+    :param height: Number of rows in the tile
+    :param scale: Controls the zoom level of the noise
+    :param octaves: Number of levels of detail
+    :param persistence: Amplitude multiplier for each octave
+    :param lacunarity: Frequency multiplier for each octave
+    :param repeatx: Lattice period along x
+    :param repeaty: Lattice period along y
+    :param base: Offset into the permutation table, selects a different noise field
+    :param seed: Seed of the permutation table, None for the reference table pnoise2 uses
+    :param step: Grid cells between samples; above 1 the tile is a subsampled overview of width x height samples
+    :return: 2D float32 numpy array of shape (height, width)
+    """
+    perm, base = _permutation_table(base, seed)
+
+    # Match pnoise2, which receives x / scale as a C float
+    xs = (np.arange(x0, x0 + width * step, step, dtype=np.float64) / scale).astype(np.float32)
+    ys = (np.arange(y0, y0 + height * step, step, dtype=np.float64) / scale).astype(np.float32)
+    x, y = np.meshgrid(xs, ys)
+
+    if octaves <= 1:
+        return _noise2(x, y, repeatx, repeaty, perm, base)
+
+    freq = np.float32(1.0)
+    amp = np.float32(1.0)
+    max_amp = np.float32(0.0)
+    total = np.zeros((height, width), dtype=np.float32)
+    for _ in range(octaves):
+        total += _noise2(x * freq, y * freq, np.float32(repeatx) * freq, np.float32(repeaty) * freq, perm, base) * amp
+        max_amp += amp
+        freq *= np.float32(lacunarity)
+        amp *= np.float32(persistence)
+
+    return total / max_amp
+
+
+def _generate_tile_job(args):
+    """
+    Process pool entry point: unpack a tile job and return its origin with the noise values.
+    """
+    x0, y0, width, height, kwargs = args
+    return x0, y0, generate_noise_tile(x0, y0, width, height, **kwargs)
+
+
+def normalize(noise_map):
+    """
+    Normalize noise values to the 0..1 range the terrain thresholds are defined on.
+
+    :param noise_map: 2D numpy array of raw noise values
+    :return: 2D float64 numpy array scaled so its minimum is 0 and its maximum is 1
+    """
+    noise_map = noise_map.astype(np.float64)
+    min_val = np.min(noise_map)
+    max_val = np.max(noise_map)
+    if max_val == min_val:
+        return np.zeros_like(noise_map)
+    return (noise_map - min_val) / (max_val - min_val)
+
+
+def generate_noise_map(size, scale=10, octaves=6, persistence=0.5, lacunarity=2.0, repeat=None, base=0,
+                       seed=None, chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    """
+    Generate a normalized size x size heightmap, splitting large maps into tiles on a process pool.
+
+    :param size: The size of the map (size x size)
+    :param scale: Controls the zoom level of the noise
+    :param octaves: Number of levels of detail
+    :param persistence: Amplitude multiplier for each octave
+    :param lacunarity: Frequency multiplier for each octave
+    :param repeat: Lattice period, defaults to the map size like the original pnoise2 loop
+    :param base: Offset into the permutation table
+    :param seed: Seed of the permutation table, None for the reference table
+    :param chunk_size: Width and height of the tiles the map is split into
+    :param workers: Number of worker processes, None for one per CPU and 1 to stay in-process
+    :return: 2D float64 numpy array of terrain heights between 0 and 1
+    """
+    if repeat is None:
+        repeat = size
+    kwargs = {
+        'scale': scale,
+        'octaves': octaves,
+        'persistence': persistence,
+        'lacunarity': lacunarity,
+        'repeatx': repeat,
+        'repeaty': repeat,
+        'base': base,
+        'seed': seed
+    }
+
+    # Small maps are a single tile; a process pool would only add start-up cost
+    if size <= chunk_size:
+        return normalize(generate_noise_tile(0, 0, size, size, **kwargs))
+
+    jobs = []
+    for y0 in range(0, size, chunk_size):
+        for x0 in range(0, size, chunk_size):
+            jobs.append((x0, y0, min(chunk_size, size - x0), min(chunk_size, size - y0), kwargs))
+
+    noise_map = np.empty((size, size), dtype=np.float32)
+    if workers == 1:
+        results = map(_generate_tile_job, jobs)
+        _store_tiles(noise_map, results)
+    else:
+        workers = min(workers or os.cpu_count() or 1, len(jobs))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            _store_tiles(noise_map, executor.map(_generate_tile_job, jobs))
+
+    return normalize(noise_map)
+
+
+def _store_tiles(noise_map, results):
+    """
+    Copy finished tiles into their place in the full noise map.
+    """
+    for x0, y0, tile in results:
+        height, width = tile.shape
+        noise_map[y0:y0 + height, x0:x0 + width] = tile
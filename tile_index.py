@@ -0,0 +1,107 @@
+class TileIndex:
+    """
+    Index isometric tiles for O(1) lookup by grid coordinate, by isometric pixel coordinate,
+    and from an arbitrary canvas point (picking).
+
+    Tiles are stored as TileMaps covering square regions of the world (one per chunk), so a
+    lookup is a dictionary access for the region plus an array access inside it.
+    """
+    def __init__(self, tile_width, tile_height, region_size, loader=None):
+        """
+        :param tile_width: Isometric tile width in pixels
+        :param tile_height: Isometric tile height in pixels
+        :param region_size: Width and height of the tile maps added to the index (the chunk size)
+        :param loader: Optional callable (x, y) invoked on a lookup miss, e.g. to generate the missing chunk
+        """
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.half_width = tile_width // 2
+        self.half_height = tile_height // 2
+        self.region_size = region_size
+        self.loader = loader
+        self.regions = {} # (region x, region y) -> TileMap
+
+    def __len__(self):
+        return sum(len(tile_map) for tile_map in self.regions.values())
+
+    def grid_to_isometric(self, x, y):
+        """
+        Convert (x, y) grid coordinates to isometric coordinates.
+        """
+        return (x - y) * self.half_width, (x + y) * self.half_height
+
+    def isometric_to_grid(self, iso_x, iso_y):
+        """
+        Convert the isometric coordinates of a tile back to its (x, y) grid coordinates.
+        """
+        u = iso_x // self.half_width # x - y
+        v = iso_y // self.half_height # x + y
+        return (u + v) // 2, (v - u) // 2
+
+    def region_key(self, x, y):
+        return x // self.region_size, y // self.region_size
+
+    def add(self, tile_map):
+        """
+        Index a tile map (as built by generate_isometric_map).
+        """
+        self.regions[self.region_key(tile_map.origin_x, tile_map.origin_y)] = tile_map
+
+    def remove(self, tile_map):
+        """
+        Drop a tile map from the index, e.g. when its chunk is evicted.
+        """
+        key = self.region_key(tile_map.origin_x, tile_map.origin_y)
+        if self.regions.get(key) is tile_map:
+            del self.regions[key]
+
+    def tile_map_at(self, x, y):
+        """
+        Get the tile map containing grid coordinate (x, y), loading it if needed.
+        """
+        tile_map = self.regions.get(self.region_key(x, y))
+        if tile_map is None and self.loader is not None:
+            self.loader(x, y)
+            tile_map = self.regions.get(self.region_key(x, y))
+        if tile_map is None or not tile_map.contains(x, y):
+            return None
+        return tile_map
+
+    def tile_at_grid(self, x, y):
+        """
+        Get the tile at grid coordinate (x, y), or None if there is no such tile.
+        """
+        tile_map = self.tile_map_at(x, y)
+        return tile_map.tile(x, y) if tile_map else None
+
+    def tile_at_iso(self, iso_x, iso_y):
+        """
+        Get the tile drawn at exactly the isometric coordinates (iso_x, iso_y).
+        """
+        if iso_x % self.half_width or iso_y % self.half_height:
+            return None
+        u = iso_x // self.half_width
+        v = iso_y // self.half_height
+        if (u + v) % 2:
+            return None
+        return self.tile_at_grid((u + v) // 2, (v - u) // 2)
+
+    def grid_at_point(self, px, py):
+        """
+        Get the grid coordinate of the tile whose diamond contains canvas point (px, py).
+        """
+        # Tile (x, y) is centered on ((x - y) * w/2 + w/2, (x + y) * h/2 + h/2); invert that and round
+        u = (px - self.half_width) / self.half_width
+        v = (py - self.half_height) / self.half_height
+        return int(round((u + v) / 2)), int(round((v - u) / 2))
+
+    def pick(self, canvas, screen_x, screen_y):
+        """
+        Get the grid coordinate and tile under a point in window coordinates (e.g. a mouse event).
+
+        :return: ((x, y), tile), where tile is None if nothing is drawn there
+        """
+        x, y = self.grid_at_point(canvas.canvasx(screen_x), canvas.canvasy(screen_y))
+        tile_map = self.regions.get(self.region_key(x, y))
+        tile = tile_map.tile(x, y) if tile_map else None
+        return (x, y), tile
@@ -0,0 +1,119 @@
+import numpy as np
+
+# Terrain types in ID order; a tile map stores the index into this tuple for every cell
+TERRAIN_TYPES = ('water', 'plains', 'hills', 'mountains', 'high_peaks')
+
+# Upper elevation bound of every terrain type but the last
+TERRAIN_THRESHOLDS = np.array([0.2, 0.4, 0.6, 0.8])
+
+
+def classify_terrain(noise_map):
+    """
+    Map a whole array of elevations to terrain type IDs at once.
+
+    :param noise_map: 2D array of elevations between 0 and 1
+    :return: 2D uint8 array of indices into TERRAIN_TYPES
+    """
+    return np.digitize(noise_map, TERRAIN_THRESHOLDS).astype(np.uint8)
+
+
+class TileMap:
+    """
+    Compact isometric tile map: terrain type IDs and precomputed isometric coordinates stored
+    as NumPy arrays, plus a small palette mapping IDs to tile images.
+
+    Indexing or iterating yields {'image', 'x', 'y'} dicts in row-major order, built on the fly,
+    so code written for the old list of tile dicts keeps working.
+    """
+    def __init__(self, terrain_ids, palette, tile_width, tile_height, origin_x=0, origin_y=0):
+        """
+        :param terrain_ids: 2D uint8 array of indices into TERRAIN_TYPES
+        :param palette: Tile image for each terrain type ID
+        :param tile_width: Isometric tile width in pixels
+        :param tile_height: Isometric tile height in pixels
+        :param origin_x: Grid x coordinate of the first column
+        :param origin_y: Grid y coordinate of the first row
+        """
+        self.terrain_ids = terrain_ids
+        self.palette = palette
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.height, self.width = terrain_ids.shape
+
+        # Convert (x, y) grid coordinates to isometric coordinates for every tile at once
+        ys, xs = np.mgrid[origin_y:origin_y + self.height, origin_x:origin_x + self.width]
+        self.iso_x = ((xs - ys) * (tile_width // 2)).astype(np.int32)
+        self.iso_y = ((xs + ys) * (tile_height // 2)).astype(np.int32)
+
+    def __len__(self):
+        return self.width * self.height
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("tile index out of range")
+        row, col = divmod(index, self.width)
+        return self._tile(row, col)
+
+    def __iter__(self):
+        for row in range(self.height):
+            for col in range(self.width):
+                yield self._tile(row, col)
+
+    def _tile(self, row, col):
+        return {
+            'image': self.palette[self.terrain_ids[row, col]],
+            'x': int(self.iso_x[row, col]),
+            'y': int(self.iso_y[row, col])
+        }
+
+    def contains(self, x, y):
+        """
+        Check if grid coordinate (x, y) is part of this map.
+        """
+        return 0 <= x - self.origin_x < self.width and 0 <= y - self.origin_y < self.height
+
+    def tile(self, x, y):
+        """
+        Get the tile dict for grid coordinate (x, y), or None outside the map.
+        """
+        if not self.contains(x, y):
+            return None
+        return self._tile(y - self.origin_y, x - self.origin_x)
+
+    def terrain_type(self, x, y):
+        """
+        Get the terrain type name at grid coordinate (x, y).
+        """
+        return TERRAIN_TYPES[self.terrain_ids[y - self.origin_y, x - self.origin_x]]
+
+    def update_region(self, x0, y0, elevation):
+        """
+        Reclassify a rectangle of tiles from new elevations, leaving the rest of the map alone.
+
+        :param x0: Grid x coordinate of the rectangle's left column (inside the map)
+        :param y0: Grid y coordinate of the rectangle's top row (inside the map)
+        :param elevation: 2D array of elevations covering the rectangle
+        :return: List of (x, y) grid coordinates whose terrain type changed
+        """
+        row = y0 - self.origin_y
+        col = x0 - self.origin_x
+        height, width = elevation.shape
+        terrain_ids = classify_terrain(elevation)
+        block = self.terrain_ids[row:row + height, col:col + width]
+        changed_rows, changed_cols = np.nonzero(block != terrain_ids)
+        block[...] = terrain_ids
+        return [(x0 + int(c), y0 + int(r)) for r, c in zip(changed_rows, changed_cols)]
+
+    def dump(self):
+        """
+        Get the terrain type name of every tile in row-major order (for debugging).
+        """
+        return [TERRAIN_TYPES[terrain_id] for terrain_id in self.terrain_ids.ravel()]
+
+    def nbytes(self):
+        """
+        Memory used by the tile arrays in bytes.
+        """
+        return self.terrain_ids.nbytes + self.iso_x.nbytes + self.iso_y.nbytes
@@ -1,21 +1,129 @@
-import os 
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
 
-def save_terrain_images(terrain_image_map, prefix, save_directory="textures"):
+def slice_tiles(sprite_sheet, tile_width, tile_height=None):
+    """
+    Cut a sprite sheet into tiles in one pass.
+
+    The sheet is converted to one RGBA array and reshaped into a grid of tiles, so no per-tile
+    crop is made; partial tiles at the right and bottom edges are dropped.
+
+    :param sprite_sheet: PIL image or path of the sheet
+    :param tile_width: Tile width in pixels
+    :param tile_height: Tile height in pixels, defaults to tile_width
+    :return: Dictionary (row, col) -> tile pixels (height x width x 4 uint8 array)
+    """
+    if not isinstance(sprite_sheet, Image.Image):
+        sprite_sheet = Image.open(sprite_sheet)
+    tile_height = tile_height or tile_width
+    pixels = np.asarray(sprite_sheet.convert('RGBA'))
+    rows = pixels.shape[0] // tile_height
+    cols = pixels.shape[1] // tile_width
+    grid = pixels[:rows * tile_height, :cols * tile_width].reshape(rows, tile_height, cols, tile_width, 4).swapaxes(1, 2)
+    return {(row, col): grid[row, col] for row in range(rows) for col in range(cols)}
+
+def tile_digest(pixels):
+    """
+    Content hash of a tile's pixels. Every fully transparent tile hashes the same, whatever its color channels hold.
+    """
+    pixels = np.ascontiguousarray(pixels)
+    if not pixels[..., 3].any():
+        pixels = np.zeros_like(pixels)
+    digest = hashlib.sha256(str(pixels.shape).encode())
+    digest.update(pixels.tobytes())
+    return digest.hexdigest()
+
+def _write_tile(pixels, save_path):
+    Image.fromarray(np.ascontiguousarray(pixels), 'RGBA').save(save_path)
+
+def save_terrain_images(terrain_image_map, prefix, save_directory="textures", workers=None):
     """
     Save the sliced sprite sheet images as individual image files.
-    
-    :param terrain_image_map: Dictionary of terrain images from the sprite sheet.
+
+    Identical tiles (including all fully transparent ones) are written once. Tiles whose content
+    hash matches the previous export and whose file is still on disk are skipped, and the
+    remaining files are encoded and written on a thread pool. A manifest named
+    `<prefix>_manifest.json` maps every (row, col) to its file, see load_tile_manifest.
+
+    :param terrain_image_map: Dictionary (row, col) -> tile, as PIL images or RGBA arrays (see slice_tiles)
+    :param prefix: Start of every file name
     :param save_directory: Directory to save the sliced images.
+    :param workers: Number of writer threads (None for the executor's default)
+    :return: The manifest, with counts of the files written and skipped under 'stats'
     """
     # Create directory if it doesn't exist
     if not os.path.exists(save_directory):
         os.makedirs(save_directory)
-        
-    for (row, col), image in terrain_image_map.items():
-        # Define the file name for each tile
-        file_name = f"{prefix}_{row}_{col}.png"
-        # Full path where the image will be saved
-        save_path = os.path.join(save_directory, file_name)
-        # Save the image
-        image.save(save_path)
-        
+    manifest_path = os.path.join(save_directory, f"{prefix}_manifest.json")
+    previous = load_tile_manifest(manifest_path) if os.path.exists(manifest_path) else {'files': {}}
+
+    files = {} # file name -> content hash
+    tiles = {} # "row,col" -> file name
+    first_file = {} # content hash -> file name of its first tile
+    pending = [] # (pixels, path) still to write
+    for (row, col), image in sorted(terrain_image_map.items()):
+        pixels = np.asarray(image.convert('RGBA') if isinstance(image, Image.Image) else image)
+        digest = tile_digest(pixels)
+        file_name = first_file.get(digest)
+        if file_name is None:
+            # Define the file name for each distinct tile
+            file_name = f"{prefix}_{row}_{col}.png" if pixels[..., 3].any() else f"{prefix}_empty.png"
+            first_file[digest] = file_name
+            files[file_name] = digest
+            save_path = os.path.join(save_directory, file_name)
+            if previous['files'].get(file_name) != digest or not os.path.exists(save_path):
+                pending.append((pixels, save_path))
+        tiles[f"{row},{col}"] = file_name
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Pillow releases the GIL while encoding, so the writes overlap
+        list(executor.map(lambda job: _write_tile(*job), pending))
+
+    # Drop files of the previous export that no tile uses any more
+    for file_name in set(previous['files']) - set(files):
+        stale_path = os.path.join(save_directory, file_name)
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+
+    manifest = {'prefix': prefix, 'tiles': tiles, 'files': files}
+    with open(manifest_path, 'w') as file:
+        json.dump(manifest, file, indent=1)
+    manifest['stats'] = {'tiles': len(tiles), 'files': len(files), 'written': len(pending),
+                         'skipped': len(files) - len(pending)}
+    return manifest
+
+def load_tile_manifest(manifest_path):
+    """
+    Read a manifest written by save_terrain_images.
+
+    :return: Dictionary with 'prefix', 'tiles' ("row,col" -> file name) and 'files' (file name -> content hash)
+    """
+    with open(manifest_path) as file:
+        return json.load(file)
+
+def export_spritesheet(sprite_sheet_path, tile_size, save_directory="textures", prefix=None, workers=None):
+    """
+    Slice a sprite sheet into tiles and export them, see save_terrain_images.
+
+    :param prefix: Start of every file name, defaults to the sheet's file name
+    """
+    prefix = prefix or os.path.splitext(os.path.basename(sprite_sheet_path))[0]
+    return save_terrain_images(slice_tiles(sprite_sheet_path, tile_size), prefix, save_directory, workers)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Slice sprite sheets into deduplicated tile images with a manifest.")
+    parser.add_argument('sheets', nargs='+', help="Sprite sheet images")
+    parser.add_argument('--tile-size', type=int, default=32, help="Tile width and height in pixels")
+    parser.add_argument('--output', default="textures/sliced", help="Directory to write the tiles to")
+    parser.add_argument('--workers', type=int, default=None, help="Number of writer threads")
+    args = parser.parse_args()
+
+    for sheet in args.sheets:
+        stats = export_spritesheet(sheet, args.tile_size, args.output, workers=args.workers)['stats']
+        print(f"{sheet}: {stats['tiles']} tiles, {stats['files']} distinct, "
+              f"{stats['written']} written, {stats['skipped']} unchanged")
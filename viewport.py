@@ -0,0 +1,233 @@
+import numpy as np
+from visibility import UNEXPLORED, VISIBLE
+
+
+class ViewportRenderer:
+    """
+    Keep canvas items only for the terrain tiles that intersect the visible part of the canvas.
+
+    Items are recycled as the view scrolls: tiles that leave the screen give their item back to a
+    pool, and tiles that come into view take one from it and are moved and re-imaged in place.
+    The number of canvas items is bounded by the screen size, not by the size of the world.
+
+    With a Visibility set, unexplored tiles get no item at all and explored tiles out of sight
+    show the darker image from `fog_images`.
+    """
+    def __init__(self, canvas, chunk_manager, tile_index, tile_width, tile_height, margin=1):
+        """
+        :param canvas: Canvas to draw on
+        :param chunk_manager: Source of terrain, used for the world bounds
+        :param tile_index: Index of the terrain tiles, loading missing chunks on demand
+        :param tile_width: Isometric tile width in pixels
+        :param tile_height: Isometric tile height in pixels
+        :param margin: Extra rows of tiles drawn around the edges to hide pop-in while scrolling
+        """
+        self.canvas = canvas
+        self.chunk_manager = chunk_manager
+        self.tile_index = tile_index
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.margin = margin
+        self.items = {} # (x, y) -> canvas item id of every tile on screen
+        self.free_items = [] # Hidden items waiting to be reused
+        self.view = None # Last rendered view rectangle
+        self.drawn = [] # Grid coordinates of the tiles in the last rendered view, back to front
+        self.order = {} # (x, y) -> position in drawn
+        self.visibility = None # Optional Visibility deciding which tiles are drawn and which are fogged
+        self.fog_images = {} # Tile image -> image shown while the tile is explored but out of sight
+
+    def view_rect(self):
+        """
+        Get the visible canvas region as (left, top, right, bottom) in canvas coordinates.
+        """
+        left = self.canvas.canvasx(0)
+        top = self.canvas.canvasy(0)
+        right = self.canvas.canvasx(self.canvas.winfo_width())
+        bottom = self.canvas.canvasy(self.canvas.winfo_height())
+        return left, top, right, bottom
+
+    def visible_tiles(self, left, top, right, bottom):
+        """
+        Find the grid coordinates of every tile whose image intersects the given canvas region.
+
+        Tile (x, y) is drawn at ((x - y) * w/2, (x + y) * h/2), so the region is a rectangle in
+        (x - y, x + y) space; it is scanned there and converted back to grid coordinates.
+
+        :return: List of (x, y) tuples in drawing order (back to front)
+        """
+        half_width = self.tile_width // 2
+        half_height = self.tile_height // 2
+        u_min = int(np.floor((left - self.tile_width) / half_width)) - self.margin
+        u_max = int(np.ceil(right / half_width)) + self.margin
+        v_min = int(np.floor((top - self.tile_height) / half_height)) - self.margin
+        v_max = int(np.ceil(bottom / half_height)) + self.margin
+
+        u, v = np.meshgrid(np.arange(u_min, u_max + 1), np.arange(v_min, v_max + 1))
+        same_parity = (u + v) % 2 == 0
+        u = u[same_parity]
+        v = v[same_parity]
+        xs = (u + v) // 2
+        ys = (v - u) // 2
+
+        # Same order generate_isometric_map draws in: row by row, left to right
+        order = np.lexsort((xs, ys))
+        return [(int(x), int(y)) for x, y in zip(xs[order], ys[order]) if self.chunk_manager.in_bounds(x, y)]
+
+    def render(self, force=False):
+        """
+        Bring the tile items in line with the current view, touching only tiles that entered or left it.
+        """
+        view = self.view_rect()
+        if view == self.view and not force:
+            return
+        self.view = view
+
+        visible = self.visible_tiles(*view)
+        self.drawn = visible
+        self.order = {coords: i for i, coords in enumerate(visible)}
+
+        # Release the items of tiles that scrolled out of view
+        for coords in [coords for coords in self.items if coords not in self.order]:
+            self.release(coords)
+
+        # Claim items for tiles that scrolled into view
+        added = []
+        missing = [coords for coords in visible if coords not in self.items]
+        states = None
+        if self.visibility is not None and missing:
+            xs, ys = np.array(missing).T
+            states = self.visibility.states_at(xs, ys).tolist()
+        for i, (x, y) in enumerate(missing):
+            if states is not None and states[i] == UNEXPLORED:
+                continue
+            tile = self.tile_index.tile_at_grid(x, y)
+            if tile is None:
+                continue
+            self.items[(x, y)] = self.claim(tile, VISIBLE if states is None else states[i])
+            added.append((x, y))
+
+        # Recycled items keep their old stacking position, so move just those into the back-to-front order
+        if added:
+            self.stack(added)
+
+    def tile_image(self, tile, state=VISIBLE):
+        """
+        Image a tile is drawn with in the given visibility state.
+        """
+        if state == VISIBLE:
+            return tile['image']
+        return self.fog_images.get(tile['image'], tile['image'])
+
+    def claim(self, tile, state=VISIBLE):
+        """
+        Get a canvas item showing the given tile, reusing a hidden one when possible.
+        """
+        image = self.tile_image(tile, state)
+        if self.free_items:
+            item = self.free_items.pop()
+            self.canvas.coords(item, tile['x'], tile['y'])
+            self.canvas.itemconfig(item, image=image, state='normal')
+            return item
+        return self.canvas.create_image(tile['x'], tile['y'], anchor='nw', image=image, tags='terrain')
+
+    def release(self, coords):
+        """
+        Hide the item drawn for a tile and return it to the pool.
+        """
+        item = self.items.pop(coords, None)
+        if item is not None:
+            self.canvas.itemconfig(item, state='hidden')
+            self.free_items.append(item)
+
+    def retile(self, chunk, coords):
+        """
+        Swap the images of on-screen tiles whose terrain changed, in place.
+
+        :param chunk: Chunk holding the tiles
+        :param coords: Grid coordinates of the changed tiles
+        """
+        coords = list(coords)
+        states = None
+        if self.visibility is not None and coords:
+            xs, ys = np.array(coords).T
+            states = self.visibility.states_at(xs, ys).tolist()
+        for i, (x, y) in enumerate(coords):
+            item = self.items.get((x, y))
+            if item is not None:
+                tile = chunk.isometric_map.tile(x, y)
+                self.canvas.itemconfig(item, image=self.tile_image(tile, VISIBLE if states is None else states[i]))
+
+    def stack(self, coords):
+        """
+        Move the items of newly drawn tiles to their place in the back-to-front order, right above
+        the nearest drawn tile behind them (or below the nearest one in front), so the rest of the
+        view keeps its stacking and is not raised again.
+
+        :param coords: Grid coordinates of the new items, all in the last rendered view
+        """
+        # Loading a chunk for one tile can evict another and release the items claimed in it
+        pending = {tile for tile in coords if tile in self.items}
+        for x, y in sorted(pending, key=self.order.get):
+            pending.discard((x, y))
+            item = self.items[(x, y)]
+            i = self.order[(x, y)]
+            behind = next((self.items[self.drawn[j]] for j in range(i - 1, -1, -1) if self.drawn[j] in self.items), None)
+            if behind is not None:
+                self.canvas.tag_raise(item, behind)
+                continue
+            ahead = next((self.items[self.drawn[j]] for j in range(i + 1, len(self.drawn))
+                          if self.drawn[j] in self.items and self.drawn[j] not in pending), None)
+            if ahead is not None:
+                self.canvas.tag_lower(item, ahead)
+            else:
+                # The only tile drawn so far, still below the decorations and sprites
+                self.canvas.tag_raise(item)
+                self.canvas.tag_raise('decoration')
+                self.canvas.tag_raise('sprite')
+
+    def refresh_visibility(self, xs, ys):
+        """
+        Redraw the tiles whose visibility state changed (see Visibility.update): on-screen tiles
+        swap between their normal and fogged image, and newly explored ones in view get an item.
+        """
+        if self.visibility is None or not len(xs):
+            return
+        revealed = []
+        for x, y, state in zip(xs.tolist(), ys.tolist(), self.visibility.states_at(xs, ys).tolist()):
+            item = self.items.get((x, y))
+            if item is None and (state == UNEXPLORED or (x, y) not in self.order):
+                continue
+            tile = self.tile_index.tile_at_grid(x, y)
+            if tile is None:
+                continue
+            if item is None:
+                self.items[(x, y)] = self.claim(tile, state)
+                revealed.append((x, y))
+            else:
+                self.canvas.itemconfig(item, image=self.tile_image(tile, state))
+        if revealed:
+            self.stack(revealed)
+
+    def forget_chunk(self, chunk):
+        """
+        Release the items of every tile in a chunk, e.g. when the chunk is evicted.
+        """
+        for coords in [coords for coords in self.items if chunk.contains(*coords)]:
+            self.release(coords)
+        self.view = None
+
+    def clear(self):
+        """
+        Hide every tile item, e.g. while another renderer draws the terrain. The next render redraws the view.
+        """
+        for coords in list(self.items):
+            self.release(coords)
+        self.view = None
+        self.drawn = []
+        self.order = {}
+
+    def item_count(self):
+        """
+        Number of canvas items owned by the renderer, visible or pooled.
+        """
+        return len(self.items) + len(self.free_items)
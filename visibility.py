@@ -0,0 +1,213 @@
+import numpy as np
+from PIL import Image
+from tile_map import TERRAIN_TYPES, classify_terrain
+
+# Visibility state of a tile
+UNEXPLORED = 0
+EXPLORED = 1 # Seen before, drawn from memory
+VISIBLE = 2
+
+# Terrain types that block the line of sight
+OPAQUE_TERRAIN = ('mountains', 'high_peaks')
+
+
+def sight_rays(radius):
+    """
+    Precompute a line from the center of a (2 * radius + 1) square window to every cell within `radius`.
+
+    :return: (cells, valid): 2D arrays with one row per ray, holding the flat window index of each
+        step along the ray (excluding the center) and whether the step is part of the ray; short
+        rays are padded with the center cell
+    """
+    side = 2 * radius + 1
+    dy, dx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    inside = (dx * dx + dy * dy <= radius * radius) & ((dx != 0) | (dy != 0))
+    dx, dy = dx[inside], dy[inside]
+    lengths = np.maximum(np.abs(dx), np.abs(dy))
+
+    # Step k of a ray is the cell nearest to k / length of the way along it
+    steps = np.arange(1, radius + 1)
+    fraction = steps[np.newaxis, :] / lengths[:, np.newaxis]
+    xs = radius + np.rint(dx[:, np.newaxis] * fraction).astype(np.int64)
+    ys = radius + np.rint(dy[:, np.newaxis] * fraction).astype(np.int64)
+    valid = steps[np.newaxis, :] <= lengths[:, np.newaxis]
+    center = radius * side + radius
+    cells = np.where(valid, ys * side + xs, center)
+    return cells, valid
+
+
+def fog_tiles(terrain_tiles, brightness=0.45):
+    """
+    Darker copies of the terrain tiles, for tiles that were explored but are out of sight.
+
+    :param terrain_tiles: PIL tile image for each terrain type, see load_terrain_tiles
+    :param brightness: Factor the color channels are scaled by
+    :return: Dictionary terrain type -> PIL image
+    """
+    fogged = {}
+    for terrain_type, tile in terrain_tiles.items():
+        pixels = np.asarray(tile.convert('RGBA')).astype(np.float32)
+        pixels[..., :3] *= brightness
+        fogged[terrain_type] = Image.fromarray(pixels.astype(np.uint8), 'RGBA')
+    return fogged
+
+
+class Visibility:
+    """
+    Field of view of the character and the fog of war: which tiles are visible now and which have been explored.
+
+    Sight is blocked by mountains and high peaks. The field of view is computed within `radius`
+    tiles by casting precomputed rays through a window of the terrain, all at once with array
+    operations: a cell is visible when every cell before it on its ray is transparent, so the
+    blocking cells themselves are visible but hide what lies behind them. Explored tiles are kept
+    as one boolean mask per chunk, which stays around when the chunk is evicted.
+
+    `update` returns just the tiles whose state changed, so the renderer only has to touch those.
+    """
+    def __init__(self, chunk_manager, radius=12):
+        """
+        :param chunk_manager: Source of terrain
+        :param radius: How far the character sees, in tiles
+        """
+        self.chunk_manager = chunk_manager
+        self.radius = radius
+        self.rays, self.ray_valid = sight_rays(radius)
+        self.opaque_ids = np.array([TERRAIN_TYPES.index(terrain_type) for terrain_type in OPAQUE_TERRAIN])
+        self.explored = {} # (cx, cy) -> boolean mask of the chunk's explored tiles
+        self.visible = None # Boolean mask of the visible tiles in the window around the last position
+        self.origin = None # Grid coordinate of the window's top-left cell
+        self.position = None # Grid position the field of view was computed from
+
+    def terrain_window(self, x0, y0, width, height):
+        """
+        Terrain type IDs of a rectangle of the world, with tiles outside the world marked opaque.
+        """
+        manager = self.chunk_manager
+        size = manager.chunk_size
+        terrain = np.full((height, width), self.opaque_ids[0], dtype=np.uint8)
+        for cy in range(y0 // size, (y0 + height - 1) // size + 1):
+            for cx in range(x0 // size, (x0 + width - 1) // size + 1):
+                chunk = manager.chunk_at(cx * size, cy * size)
+                if chunk is None:
+                    continue
+                # Overlap of the chunk and the window, in grid coordinates
+                left, top = max(x0, chunk.x0), max(y0, chunk.y0)
+                right, bottom = min(x0 + width, chunk.x0 + chunk.width), min(y0 + height, chunk.y0 + chunk.height)
+                if left >= right or top >= bottom:
+                    continue
+                terrain[top - y0:bottom - y0, left - x0:right - x0] = classify_terrain(
+                    chunk.elevation[top - chunk.y0:bottom - chunk.y0, left - chunk.x0:right - chunk.x0])
+        return terrain
+
+    def field_of_view(self, x, y):
+        """
+        Compute the tiles visible from grid position (x, y).
+
+        :return: Boolean mask of the (2 * radius + 1) square window centered on (x, y)
+        """
+        side = 2 * self.radius + 1
+        terrain = self.terrain_window(x - self.radius, y - self.radius, side, side)
+        transparent = ~np.isin(terrain, self.opaque_ids).reshape(-1)
+        # The center never blocks, so the padding of short rays does not either
+        transparent[self.radius * side + self.radius] = True
+
+        # A step is seen when every step before it on the ray is transparent
+        clear = np.logical_and.accumulate(transparent[self.rays], axis=1)
+        seen = np.ones(self.rays.shape, dtype=bool)
+        seen[:, 1:] = clear[:, :-1]
+        visible = np.zeros(side * side, dtype=bool)
+        visible[self.rays[seen & self.ray_valid]] = True
+        visible[self.radius * side + self.radius] = True
+        return visible.reshape(side, side)
+
+    def update(self, x, y):
+        """
+        Recompute the field of view from grid position (x, y) and mark what is seen as explored.
+
+        :return: (xs, ys) arrays of the tiles whose state changed; empty if the position did not change
+        """
+        if self.position == (x, y):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        old_xs, old_ys = self.visible_tiles()
+        self.position = (x, y)
+        self.origin = (x - self.radius, y - self.radius)
+        self.visible = self.field_of_view(x, y)
+        new_xs, new_ys = self.visible_tiles()
+        self.mark_explored(new_xs, new_ys)
+
+        # Tiles that came into or went out of sight, compared as packed coordinates
+        changed = np.setxor1d(self._pack(old_xs, old_ys), self._pack(new_xs, new_ys))
+        return self._unpack(changed)
+
+    def invalidate(self):
+        """
+        Recompute the field of view on the next update even if the position is the same, e.g. after an edit.
+        """
+        self.position = None
+
+    def visible_tiles(self):
+        """
+        Grid coordinates (xs, ys) of the tiles visible now.
+        """
+        if self.visible is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        rows, cols = np.nonzero(self.visible)
+        return cols + self.origin[0], rows + self.origin[1]
+
+    def mark_explored(self, xs, ys):
+        """
+        Set the explored bits of the given tiles, chunk by chunk.
+        """
+        size = self.chunk_manager.chunk_size
+        keys = np.stack([xs // size, ys // size], axis=-1)
+        for cx, cy in np.unique(keys, axis=0).tolist():
+            mask = self.explored.get((cx, cy))
+            if mask is None:
+                mask = self.explored[(cx, cy)] = np.zeros((size, size), dtype=bool)
+            selected = (keys[:, 0] == cx) & (keys[:, 1] == cy)
+            mask[ys[selected] - cy * size, xs[selected] - cx * size] = True
+
+    def states_at(self, xs, ys):
+        """
+        Visibility states (UNEXPLORED, EXPLORED or VISIBLE) at arrays of grid coordinates.
+        """
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        states = np.full(xs.shape, UNEXPLORED, dtype=np.uint8)
+        size = self.chunk_manager.chunk_size
+        keys = np.stack([xs // size, ys // size], axis=-1)
+        for cx, cy in np.unique(keys.reshape(-1, 2), axis=0).tolist():
+            mask = self.explored.get((cx, cy))
+            if mask is None:
+                continue
+            selected = (keys[..., 0] == cx) & (keys[..., 1] == cy)
+            states[selected] = mask[ys[selected] - cy * size, xs[selected] - cx * size]
+
+        if self.visible is not None:
+            side = self.visible.shape[0]
+            cols = xs - self.origin[0]
+            rows = ys - self.origin[1]
+            inside = (cols >= 0) & (cols < side) & (rows >= 0) & (rows < side)
+            visible = np.zeros(xs.shape, dtype=bool)
+            visible[inside] = self.visible[rows[inside], cols[inside]]
+            states[visible] = VISIBLE
+        return states
+
+    def state(self, x, y):
+        return int(self.states_at([x], [y])[0])
+
+    def chunk_explored(self, cx, cy):
+        """
+        Check if any tile of a chunk has been explored, so renderers can skip unexplored chunks whole.
+        """
+        return (cx, cy) in self.explored
+
+    @staticmethod
+    def _pack(xs, ys):
+        return (xs.astype(np.int64) << 32) + (ys.astype(np.int64) & 0xFFFFFFFF)
+
+    @staticmethod
+    def _unpack(keys):
+        ys = keys & 0xFFFFFFFF
+        ys = np.where(ys >= 1 << 31, ys - (1 << 32), ys)
+        return keys >> 32, ys
@@ -0,0 +1,178 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class WorldLoader:
+    """
+    Stream the chunks around the player into a ChunkManager without blocking the UI.
+
+    Noise for missing chunks is computed on a worker thread; the finished chunks are installed on
+    the UI thread a few at a time from `after_idle` callbacks, since building their tiles touches
+    the tile index and the canvas. Chunks that are needed right away (visible ones, the tile the
+    character steps on) are still generated on demand by the ChunkManager, so the loader only ever
+    gets ahead of the player and never has to be waited for.
+    """
+    def __init__(self, widget, chunk_manager, batch_size=2, poll_interval=10, workers=1):
+        """
+        :param widget: Tk widget whose `after_idle` and `after` schedule the installing
+        :param chunk_manager: ChunkManager the chunks are added to
+        :param batch_size: Most chunks installed per idle callback
+        :param poll_interval: Milliseconds to wait before checking again while the worker is busy
+        :param workers: Number of worker threads computing noise
+        """
+        self.widget = widget
+        self.chunk_manager = chunk_manager
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='world-loader')
+        self.pending = OrderedDict() # (cx, cy) -> Future of the noise elevation, or None when read from storage
+        self.center = None # Chunk coordinates of the last request
+        self.radius = chunk_manager.load_radius
+        self.done = 0 # Chunks finished since the queue was last empty
+        self.total = 0 # Chunks queued since the queue was last empty
+        self.scheduled = False
+
+    @property
+    def busy(self):
+        return bool(self.pending)
+
+    def progress(self):
+        """
+        :return: (chunks finished, chunks queued) since the queue was last empty
+        """
+        return self.done, self.total
+
+    def request_around(self, x, y, radius=None):
+        """
+        Queue the missing chunks within `radius` chunks of grid coordinate (x, y), nearest first.
+        Queued chunks that are now out of range are dropped.
+        """
+        manager = self.chunk_manager
+        if radius is None:
+            radius = manager.load_radius
+        self.center = manager.chunk_coords(x, y)
+        self.radius = radius
+        for coords in [coords for coords in self.pending if not self.in_range(coords)]:
+            future = self.pending.pop(coords)
+            if future is not None:
+                future.cancel()
+            self.total -= 1
+
+        for cx, cy in manager.missing_around(x, y, radius):
+            if (cx, cy) in self.pending:
+                continue
+            if (cx, cy) in manager.edited or manager.storage is not None and manager.storage.has_chunk(cx, cy):
+                future = None
+            else:
+                x0, y0, width, height = manager.chunk_rect(cx, cy)
+                future = self.executor.submit(manager.noise_elevation, x0, y0, width, height)
+            self.pending[(cx, cy)] = future
+            self.total += 1
+        self._schedule()
+
+    def in_range(self, coords):
+        """
+        Check if chunk coordinates are still worth loading for the last request.
+        """
+        return max(abs(coords[0] - self.center[0]), abs(coords[1] - self.center[1])) <= self.radius
+
+    def _schedule(self, delay=None):
+        if self.scheduled or not self.pending:
+            return
+        self.scheduled = True
+        if delay is None:
+            self.widget.after_idle(self.pump)
+        else:
+            self.widget.after(delay, self.pump)
+
+    def pump(self):
+        """
+        Install up to batch_size finished chunks, then schedule the next batch.
+        """
+        self.scheduled = False
+        installed = 0
+        for coords, future in list(self.pending.items()):
+            if installed == self.batch_size:
+                break
+            if future is not None and not future.done():
+                continue
+            self._install(coords)
+            installed += 1
+
+        if not self.pending:
+            self.done = self.total = 0
+        elif installed:
+            self._schedule()
+        else:
+            self._schedule(self.poll_interval)
+
+    def _install(self, coords):
+        future = self.pending.pop(coords)
+        self.done += 1
+        manager = self.chunk_manager
+        if coords in manager.chunks:
+            # Generated on demand in the meantime
+            return
+        elevation = future.result() if future is not None else None
+        manager.add_chunk(manager.generate_chunk(*coords, elevation=elevation))
+
+    def finish(self):
+        """
+        Install every queued chunk now, waiting for the worker if needed.
+        """
+        while self.pending:
+            self._install(next(iter(self.pending)))
+        self.done = self.total = 0
+
+    def shutdown(self):
+        """
+        Drop the queue and stop the worker thread.
+        """
+        for future in self.pending.values():
+            if future is not None:
+                future.cancel()
+        self.pending.clear()
+        self.done = self.total = 0
+        self.executor.shutdown(wait=False)
+
+
+class LoadingIndicator:
+    """
+    Text in the bottom left corner of the view showing how far a WorldLoader is, hidden when it is idle.
+    """
+    def __init__(self, canvas, loader, margin=8, tag='loading'):
+        """
+        :param canvas: Canvas to draw on
+        :param loader: WorldLoader to show
+        :param margin: Distance from the corner of the view in pixels
+        :param tag: Canvas tag of the indicator item
+        """
+        self.canvas = canvas
+        self.loader = loader
+        self.margin = margin
+        self.tag = tag
+        self.item = None
+        self.text = None
+
+    def draw(self):
+        """
+        Keep the indicator pinned to the view and up to date. Called by the game loop.
+        """
+        if not self.loader.busy:
+            if self.item is not None:
+                self.canvas.delete(self.item)
+                self.item = None
+            return
+        done, total = self.loader.progress()
+        text = f"Loading world... {done}/{total} chunks"
+        x = self.canvas.canvasx(self.margin)
+        y = self.canvas.canvasy(self.canvas.winfo_height() - self.margin)
+        if self.item is None:
+            self.item = self.canvas.create_text(x, y, anchor='sw', text=text, fill='white', font=('Courier', 9), tags=self.tag)
+            self.text = text
+        else:
+            self.canvas.coords(self.item, x, y)
+            if text != self.text:
+                self.canvas.itemconfig(self.item, text=text)
+                self.text = text
+        self.canvas.tag_raise(self.item)
@@ -0,0 +1,218 @@
+import json
+import os
+import numpy as np
+from tile_map import classify_terrain
+
+FORMAT_VERSION = 1
+
+# Columns of the chunk index: chunk coordinates and the size of the chunk stored in the slot
+INDEX_COLUMNS = 4 # cx, cy, width, height
+
+
+class WorldSave:
+    """
+    A world on disk: terrain as raw arrays, player and inventory as JSON.
+
+    The directory holds
+        world.json     world parameters, player state, inventory and the number of stored chunks
+        index.bin      int32 (cx, cy, width, height) of every chunk slot
+        elevation.bin  float64 elevation of every slot, chunk_size x chunk_size
+        terrain.bin    uint8 terrain type IDs of every slot (see tile_map.TERRAIN_TYPES)
+
+    The binary files are opened with numpy.memmap, so opening a world reads only the small index;
+    chunk terrain is paged in from disk when the chunk is first used. Each chunk has a fixed slot,
+    so saving rewrites only the slots of chunks that are new or changed since the last save.
+    """
+    def __init__(self, directory):
+        """
+        :param directory: Directory of the world
+        """
+        self.directory = directory
+        self.metadata = None
+        self.slots = {} # (cx, cy) -> slot
+        self.saved_versions = {} # (cx, cy) -> chunk.version last written
+        self.capacity = 0
+        self.index = None
+        self.elevation = None
+        self.terrain = None
+        self.elevation_view = None # Copy-on-write map of elevation.bin handed out to chunks
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def exists(self):
+        return os.path.exists(self.path("world.json"))
+
+    def create(self, chunk_manager, capacity=64):
+        """
+        Start a new world with the parameters of a chunk manager.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self.metadata = {
+            'version': FORMAT_VERSION,
+            'chunk_size': chunk_manager.chunk_size,
+            'bounds': chunk_manager.bounds,
+            'noise_params': chunk_manager.noise_params,
+            'normalization': list(chunk_manager.normalization),
+            'chunk_count': 0,
+            'player': None,
+            'inventory': {}
+        }
+        for name in ("index.bin", "elevation.bin", "terrain.bin"):
+            open(self.path(name), 'wb').close()
+        self.slots = {}
+        self.saved_versions = {}
+        self._map(capacity)
+        self._write_metadata()
+
+    def open(self):
+        """
+        Open an existing world. Only the metadata and the chunk index are read.
+        """
+        with open(self.path("world.json")) as file:
+            self.metadata = json.load(file)
+        if self.metadata['version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported world format version {self.metadata['version']}")
+        capacity = os.path.getsize(self.path("index.bin")) // (4 * INDEX_COLUMNS)
+        self._map(max(capacity, 64))
+        count = self.metadata['chunk_count']
+        self.slots = {(int(cx), int(cy)): slot for slot, (cx, cy, width, height) in enumerate(self.index[:count].tolist())}
+        self.saved_versions = {}
+
+    def chunk_manager_params(self):
+        """
+        Keyword arguments for a ChunkManager that continues this world.
+        """
+        params = dict(self.metadata['noise_params'])
+        repeat = params.pop('repeatx')
+        params.pop('repeaty')
+        return dict(params,
+                    chunk_size=self.metadata['chunk_size'],
+                    bounds=self.metadata['bounds'],
+                    repeat=repeat,
+                    normalization=tuple(self.metadata['normalization']))
+
+    def _map(self, capacity):
+        """
+        (Re)open the memory maps, growing the files to hold `capacity` chunk slots.
+        """
+        size = self.metadata['chunk_size']
+        layouts = (("index.bin", np.int32, (INDEX_COLUMNS,)),
+                   ("elevation.bin", np.float64, (size, size)),
+                   ("terrain.bin", np.uint8, (size, size)))
+        maps = []
+        for name, dtype, shape in layouts:
+            nbytes = capacity * int(np.prod(shape)) * np.dtype(dtype).itemsize
+            with open(self.path(name), 'r+b') as file:
+                file.seek(0, os.SEEK_END)
+                if file.tell() < nbytes:
+                    file.truncate(nbytes)
+            maps.append(np.memmap(self.path(name), dtype=dtype, mode='r+', shape=(capacity,) + shape))
+        self.index, self.elevation, self.terrain = maps
+        self.elevation_view = np.memmap(self.path("elevation.bin"), dtype=np.float64, mode='c', shape=self.elevation.shape)
+        self.capacity = capacity
+
+    def _write_metadata(self):
+        # Write to a temporary file and swap it in, so a crash mid-save leaves the previous metadata intact
+        temp_path = self.path("world.json.tmp")
+        with open(temp_path, 'w') as file:
+            json.dump(self.metadata, file, indent=1)
+        os.replace(temp_path, self.path("world.json"))
+
+    def has_chunk(self, cx, cy):
+        return (cx, cy) in self.slots
+
+    def load_elevation(self, cx, cy):
+        """
+        Get a stored chunk's elevation, or None if the chunk was never saved.
+
+        The array is a copy-on-write view of the file: nothing is read until it is used,
+        and changes stay in memory until the chunk is saved.
+        """
+        slot = self.slots.get((cx, cy))
+        if slot is None:
+            return None
+        width, height = self.index[slot, 2:4].tolist()
+        # The chunk built from this starts at version 0, matching what is on disk
+        self.saved_versions[(cx, cy)] = 0
+        return self.elevation_view[slot, :height, :width]
+
+    def load_terrain(self, cx, cy):
+        """
+        Get a stored chunk's terrain type IDs, or None if the chunk was never saved.
+        """
+        slot = self.slots.get((cx, cy))
+        if slot is None:
+            return None
+        width, height = self.index[slot, 2:4].tolist()
+        return self.terrain[slot, :height, :width]
+
+    def save_chunk(self, chunk):
+        """
+        Write one chunk into its slot, allocating a slot for a chunk saved for the first time.
+        """
+        key = (chunk.cx, chunk.cy)
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = len(self.slots)
+            if slot >= self.capacity:
+                self._map(max(2 * self.capacity, 64))
+            self.slots[key] = slot
+            self.index[slot] = (chunk.cx, chunk.cy, chunk.width, chunk.height)
+        self.elevation[slot, :chunk.height, :chunk.width] = chunk.elevation
+        self.terrain[slot, :chunk.height, :chunk.width] = classify_terrain(chunk.elevation)
+        self.saved_versions[key] = chunk.version
+
+    def is_dirty(self, chunk):
+        """
+        Check if a chunk is new or changed since it was last saved.
+        """
+        return self.saved_versions.get((chunk.cx, chunk.cy)) != chunk.version
+
+    def dirty_chunks(self, chunk_manager):
+        """
+        Loaded chunks that are new or changed since they were last saved.
+        """
+        return [chunk for chunk in chunk_manager.chunks.values() if self.is_dirty(chunk)]
+
+    def save(self, chunk_manager, character=None, inventory=None):
+        """
+        Save the dirty chunks, the player and the inventory.
+
+        :return: Number of chunks written
+        """
+        dirty = self.dirty_chunks(chunk_manager)
+        for chunk in dirty:
+            self.save_chunk(chunk)
+        if dirty:
+            for array in (self.index, self.elevation, self.terrain):
+                array.flush()
+        self.metadata['chunk_count'] = len(self.slots)
+        if character is not None:
+            self.metadata['player'] = {
+                'x': character.character_x,
+                'y': character.character_y,
+                'direction': character.character_direction
+            }
+        if inventory is not None:
+            self.metadata['inventory'] = inventory.get_items()
+        self._write_metadata()
+        return len(dirty)
+
+    def restore_player(self, character):
+        """
+        Put the character back where it was saved. Returns False if no player state was saved.
+        """
+        player = self.metadata.get('player')
+        if not player:
+            return False
+        character.character_x = player['x']
+        character.character_y = player['y']
+        character.character_direction = player['direction']
+        return True
+
+    def restore_inventory(self, inventory):
+        """
+        Replace an inventory's contents with the saved ones.
+        """
+        inventory.set_items(self.metadata.get('inventory', {}))
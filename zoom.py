@@ -0,0 +1,339 @@
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+from tile_map import TERRAIN_TYPES, classify_terrain
+from viewport import ViewportRenderer
+
+# Zoom levels the game steps through; 1 is the native 32px tile scale
+ZOOM_LEVELS = (1.0, 0.5, 0.25, 0.125, 0.0625)
+
+# At or below this zoom terrain is drawn as one aggregated image per region instead of one item per tile
+AGGREGATE_ZOOM = 0.25
+
+
+def build_mipmaps(terrain_tiles, levels=ZOOM_LEVELS):
+    """
+    Precompute downscaled tile images for every zoom level, each level halved from the one above it.
+
+    :param terrain_tiles: PIL tile image for each terrain type, see load_terrain_tiles
+    :param levels: Zoom levels, largest first
+    :return: Dictionary zoom -> {terrain type -> PIL image}
+    """
+    mipmaps = {}
+    previous = terrain_tiles
+    for zoom in levels:
+        level = {}
+        for terrain_type, tile in terrain_tiles.items():
+            size = (max(1, round(tile.width * zoom)), max(1, round(tile.height * zoom)))
+            source = previous[terrain_type]
+            level[terrain_type] = source if source.size == size else source.resize(size, Image.BOX)
+        mipmaps[zoom] = level
+        previous = level
+    return mipmaps
+
+
+def terrain_colors(terrain_tiles):
+    """
+    Average color of each terrain type's tile, for the aggregated zoom levels.
+
+    :return: uint8 array with one RGBA row per terrain type ID
+    """
+    colors = np.zeros((len(TERRAIN_TYPES), 4), dtype=np.uint8)
+    for terrain_id, terrain_type in enumerate(TERRAIN_TYPES):
+        pixels = np.asarray(terrain_tiles[terrain_type].convert('RGBA')).reshape(-1, 4)
+        opaque = pixels[pixels[:, 3] > 0]
+        if len(opaque):
+            colors[terrain_id, :3] = opaque[:, :3].mean(axis=0).round()
+            colors[terrain_id, 3] = 255
+    return colors
+
+
+class RegionTerrain:
+    """
+    Terrain type IDs of large square regions of the world, for drawing it zoomed out.
+
+    Zoomed out, far more of the world is in view than the chunk cache holds, so regions are built
+    without loading chunks: loaded chunks supply their (possibly edited) elevation, chunks of a saved
+    world their stored terrain, and the rest comes straight from the noise. Regions are kept in an LRU cache.
+    """
+    def __init__(self, chunk_manager, region_size=64, max_regions=1024):
+        """
+        :param chunk_manager: Source of terrain
+        :param region_size: Width and height of a region in tiles, a multiple of the chunk size
+        :param max_regions: Number of regions kept
+        """
+        self.chunk_manager = chunk_manager
+        self.region_size = region_size
+        self.max_regions = max_regions
+        self.regions = OrderedDict() # (rx, ry) -> 2D uint8 terrain type IDs
+
+    def region_key(self, x, y):
+        return x // self.region_size, y // self.region_size
+
+    def terrain_ids(self, rx, ry):
+        """
+        Get the terrain type IDs of a region, building them if needed.
+
+        :return: region_size x region_size uint8 array; tiles outside a bounded world are water
+        """
+        key = (rx, ry)
+        ids = self.regions.get(key)
+        if ids is not None:
+            self.regions.move_to_end(key)
+            return ids
+
+        manager = self.chunk_manager
+        size = self.region_size
+        x0, y0 = rx * size, ry * size
+        width = height = size
+        if manager.bounds is not None:
+            width = max(0, min(size, manager.bounds - x0))
+            height = max(0, min(size, manager.bounds - y0))
+        ids = np.zeros((size, size), dtype=np.uint8)
+
+        # Take the chunks we already know about, and generate the noise only if some are missing
+        missing = False
+        known = []
+        for cy in range(y0 // manager.chunk_size, (y0 + height - 1) // manager.chunk_size + 1):
+            for cx in range(x0 // manager.chunk_size, (x0 + width - 1) // manager.chunk_size + 1):
+                chunk = manager.chunks.get((cx, cy))
+                if chunk is not None:
+                    known.append((chunk.x0, chunk.y0, classify_terrain(chunk.elevation)))
+                elif (cx, cy) in manager.edited:
+                    known.append((cx * manager.chunk_size, cy * manager.chunk_size, classify_terrain(manager.edited[(cx, cy)])))
+                elif manager.storage is not None and manager.storage.has_chunk(cx, cy):
+                    known.append((cx * manager.chunk_size, cy * manager.chunk_size, manager.storage.load_terrain(cx, cy)))
+                else:
+                    missing = True
+        if missing and width and height:
+            ids[:height, :width] = classify_terrain(manager.noise_elevation(x0, y0, width, height))
+        for chunk_x, chunk_y, chunk_ids in known:
+            ids[chunk_y - y0:chunk_y - y0 + chunk_ids.shape[0], chunk_x - x0:chunk_x - x0 + chunk_ids.shape[1]] = chunk_ids
+
+        self.regions[key] = ids
+        while len(self.regions) > self.max_regions:
+            self.regions.popitem(last=False)
+        return ids
+
+    def terrain_id(self, x, y):
+        rx, ry = self.region_key(x, y)
+        return int(self.terrain_ids(rx, ry)[y - ry * self.region_size, x - rx * self.region_size])
+
+    def invalidate(self, region):
+        """
+        Drop the regions overlapping grid region (x0, y0, x1, y1), e.g. after an edit.
+
+        :return: List of the (rx, ry) keys dropped
+        """
+        x0, y0, x1, y1 = region
+        dropped = []
+        for ry in range(y0 // self.region_size, (y1 - 1) // self.region_size + 1):
+            for rx in range(x0 // self.region_size, (x1 - 1) // self.region_size + 1):
+                if self.regions.pop((rx, ry), None) is not None:
+                    dropped.append((rx, ry))
+        return dropped
+
+
+class MipmapTiles:
+    """
+    Tile source for a ViewportRenderer drawing at a reduced zoom: the downscaled tile of each
+    grid coordinate at its scaled isometric position, looked up in a RegionTerrain.
+    """
+    def __init__(self, regions, photos, tile_width, tile_height):
+        """
+        :param regions: RegionTerrain the terrain types come from
+        :param photos: Downscaled tile image per terrain type ID
+        :param tile_width: Scaled tile width in pixels
+        :param tile_height: Scaled tile height in pixels
+        """
+        self.regions = regions
+        self.photos = photos
+        self.half_width = tile_width // 2
+        self.half_height = tile_height // 2
+
+    def tile_at_grid(self, x, y):
+        return {
+            'image': self.photos[self.regions.terrain_id(x, y)],
+            'x': (x - y) * self.half_width,
+            'y': (x + y) * self.half_height
+        }
+
+
+class ZoomedTerrain:
+    """
+    Draw the terrain zoomed out, in canvas coordinates scaled by `zoom`.
+
+    Above AGGREGATE_ZOOM every visible tile gets a pooled item showing its precomputed mipmap
+    (the ViewportRenderer machinery, fed by MipmapTiles). Below that, each region of the world is
+    one image colored per tile with the terrain's average color, built with array operations, so
+    the item count stays at a handful whatever the size of the world.
+    Offers the same render/retile/forget_chunk/clear/item_count interface as ViewportRenderer.
+    """
+    def __init__(self, canvas, chunk_manager, regions, mipmaps, colors, tile_width, tile_height, zoom, photo_factory=None):
+        """
+        :param canvas: Canvas to draw on
+        :param chunk_manager: Source of terrain, used for the world bounds
+        :param regions: RegionTerrain the terrain types come from
+        :param mipmaps: Downscaled tiles per zoom level, see build_mipmaps
+        :param colors: Average color per terrain type ID, see terrain_colors
+        :param tile_width: Native isometric tile width in pixels
+        :param tile_height: Native isometric tile height in pixels
+        :param zoom: Scale factor, one of the levels in mipmaps
+        :param photo_factory: Callable turning a PIL image into a canvas image, defaults to ImageTk.PhotoImage
+        """
+        self.canvas = canvas
+        self.chunk_manager = chunk_manager
+        self.regions = regions
+        self.colors = colors
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.zoom = zoom
+        if photo_factory is None:
+            from PIL import ImageTk
+            photo_factory = ImageTk.PhotoImage
+        self.photo_factory = photo_factory
+        self.aggregated = zoom <= AGGREGATE_ZOOM
+        self.tiles = None
+        if not self.aggregated:
+            photos = [photo_factory(mipmaps[zoom][terrain_type]) for terrain_type in TERRAIN_TYPES]
+            scaled_width = max(2, round(tile_width * zoom))
+            scaled_height = max(2, round(tile_height * zoom))
+            self.tiles = ViewportRenderer(canvas, chunk_manager, MipmapTiles(regions, photos, scaled_width, scaled_height),
+                                          scaled_width, scaled_height)
+        self.images = {} # (rx, ry) -> (PhotoImage, canvas item) of the aggregated regions drawn
+        self.view = None
+
+    def region_box(self, rx, ry):
+        """
+        Scaled canvas bounding box (left, top, right, bottom) of a region's isometric footprint.
+        """
+        size = self.regions.region_size
+        x0, y0 = rx * size, ry * size
+        half_width = self.tile_width / 2 * self.zoom
+        half_height = self.tile_height / 2 * self.zoom
+        left = (x0 - (y0 + size - 1)) * half_width
+        top = (x0 + y0) * half_height
+        right = (x0 + size - 1 - y0) * half_width + self.tile_width * self.zoom
+        bottom = (x0 + y0 + 2 * size - 2) * half_height + self.tile_height * self.zoom
+        return int(np.floor(left)), int(np.floor(top)), int(np.ceil(right)), int(np.ceil(bottom))
+
+    def bake_region(self, rx, ry):
+        """
+        Build a region's aggregated image: every pixel takes the color of the tile under it.
+
+        :return: PIL RGBA image covering region_box
+        """
+        left, top, right, bottom = self.region_box(rx, ry)
+        size = self.regions.region_size
+        ids = self.regions.terrain_ids(rx, ry)
+
+        # Invert the isometric projection per pixel, the way TileIndex.grid_at_point does for a single point
+        px = (left + np.arange(right - left) + 0.5) / self.zoom
+        py = (top + np.arange(bottom - top) + 0.5) / self.zoom
+        u = (px[np.newaxis, :] - self.tile_width / 2) / (self.tile_width / 2)
+        v = (py[:, np.newaxis] - self.tile_height / 2) / (self.tile_height / 2)
+        xs = np.rint((u + v) / 2).astype(np.int64) - rx * size
+        ys = np.rint((v - u) / 2).astype(np.int64) - ry * size
+
+        inside = (xs >= 0) & (xs < size) & (ys >= 0) & (ys < size)
+        if self.chunk_manager.bounds is not None:
+            bounds = self.chunk_manager.bounds
+            inside &= (xs + rx * size < bounds) & (ys + ry * size < bounds)
+        pixels = np.zeros(xs.shape + (4,), dtype=np.uint8)
+        pixels[inside] = self.colors[ids[ys[inside], xs[inside]]]
+        return Image.fromarray(pixels, 'RGBA')
+
+    def visible_regions(self, left, top, right, bottom):
+        """
+        Keys of the regions whose footprint intersects the given scaled canvas region.
+        """
+        size = self.regions.region_size
+        # Corners of the view in grid coordinates bound the regions to check
+        corners = [((x / self.zoom) / (self.tile_width / 2), (y / self.zoom) / (self.tile_height / 2))
+                   for x, y in ((left, top), (right, top), (left, bottom), (right, bottom))]
+        grid_xs = [(u + v) / 2 for u, v in corners]
+        grid_ys = [(v - u) / 2 for u, v in corners]
+        keys = []
+        for ry in range(int(np.floor(min(grid_ys) / size)) - 1, int(np.floor(max(grid_ys) / size)) + 1):
+            for rx in range(int(np.floor(min(grid_xs) / size)) - 1, int(np.floor(max(grid_xs) / size)) + 1):
+                if self.chunk_manager.bounds is not None and not (
+                        0 <= rx * size < self.chunk_manager.bounds and 0 <= ry * size < self.chunk_manager.bounds):
+                    continue
+                box = self.region_box(rx, ry)
+                if box[0] < right and box[2] > left and box[1] < bottom and box[3] > top:
+                    keys.append((rx, ry))
+        return keys
+
+    def render(self, force=False):
+        """
+        Bring the items in line with the current view.
+        """
+        if self.tiles is not None:
+            self.tiles.render(force)
+            return
+
+        view = (self.canvas.canvasx(0), self.canvas.canvasy(0),
+                self.canvas.canvasx(self.canvas.winfo_width()), self.canvas.canvasy(self.canvas.winfo_height()))
+        if view == self.view and not force:
+            return
+        self.view = view
+
+        visible = self.visible_regions(*view)
+        visible_set = set(visible)
+        for key in [key for key in self.images if key not in visible_set]:
+            self.canvas.delete(self.images.pop(key)[1])
+        added = False
+        for key in visible:
+            if key in self.images:
+                continue
+            left, top, _, _ = self.region_box(*key)
+            photo = self.photo_factory(self.bake_region(*key))
+            self.images[key] = (photo, self.canvas.create_image(left, top, anchor='nw', image=photo, tags='terrain'))
+            added = True
+        if added:
+            # Back to front, like the tiles inside each region
+            for key in sorted(self.images, key=lambda key: (key[0] + key[1], key[1])):
+                self.canvas.tag_raise(self.images[key][1])
+
+    def retile(self, chunk, coords):
+        """
+        Redraw tiles whose terrain changed. The caller has already dropped the edited regions from the RegionTerrain.
+        """
+        if self.tiles is not None:
+            for x, y in coords:
+                item = self.tiles.items.get((x, y))
+                if item is not None:
+                    self.canvas.itemconfig(item, image=self.tiles.tile_index.tile_at_grid(x, y)['image'])
+            return
+        for key in {self.regions.region_key(x, y) for x, y in coords}:
+            entry = self.images.pop(key, None)
+            if entry is not None:
+                self.canvas.delete(entry[1])
+        self.render(force=True)
+
+    def forget_chunk(self, chunk):
+        # An evicted chunk without edits regenerates identically, so only edited ones need their regions rebuilt
+        if chunk.version:
+            self.regions.invalidate((chunk.x0, chunk.y0, chunk.x0 + chunk.width, chunk.y0 + chunk.height))
+
+    def clear(self):
+        """
+        Remove every item, e.g. when switching to another zoom level.
+        """
+        if self.tiles is not None:
+            self.tiles.clear()
+            for item in self.tiles.free_items:
+                self.canvas.delete(item)
+            self.tiles.free_items = []
+        for _, item in self.images.values():
+            self.canvas.delete(item)
+        self.images = {}
+        self.view = None
+
+    def item_count(self):
+        """
+        Number of canvas items owned by the renderer.
+        """
+        if self.tiles is not None:
+            return self.tiles.item_count()
+        return len(self.images)